@@ -44,6 +44,7 @@ INSTALLED_APPS = (
 CRISPY_TEMPLATE_PACK = 'bootstrap3'
 
 MIDDLEWARE_CLASSES = (
+    'records.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,7 +60,8 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # the django backend timing template rendering for the profiling middleware
+        'BACKEND': 'records.profiling.ProfiledDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, "templates"), ],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,6 +88,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/1.8/topics/cache/
+# the permission closures of records are kept here, use a shared backend such as memcached
+# when the site runs in several processes so every process sees the invalidations
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
@@ -106,4 +119,37 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-LOGIN_URL = '/login'
\ No newline at end of file
+LOGIN_URL = '/login'
+
+# the url name the site root redirects to, 'profile_view' to land on the profile instead
+LANDING_VIEW = 'today_view'
+
+# the profiling middleware profiles the given share of requests and logs the ones slower than this
+# many milliseconds, so a page that is slow all day doesn't flood the log. with server timing on it
+# profiles every request and sends its timings back in a Server-Timing header, for development only
+PROFILING_SLOW_REQUEST_MS = 500
+PROFILING_SAMPLE_RATE = 0.1
+PROFILING_SERVER_TIMING = DEBUG
+
+# zones, programs, schedules and sessions with more attendance rows below them than the limit are
+# deleted by a deletion job, in chunks of the given number of rows. the jobs run in a thread of the
+# process handling the request, turn it off to leave them to the run_deletion_jobs command
+DELETION_INLINE_LIMIT = 1000
+DELETION_CHUNK_SIZE = 1000
+DELETION_JOBS_IN_THREAD = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'records.profiling': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
@@ -13,6 +13,7 @@ Including another URLconf
     1. Add an import:  from blog import urls as blog_urls
     2. Add a URL to urlpatterns:  url(r'^blog/', include(blog_urls))
 """
+from django.conf import settings
 from django.conf.urls import include, url
 from django.contrib import admin
 from django.views.generic import RedirectView
@@ -20,7 +21,7 @@ from django.views.generic import RedirectView
 
 
 urlpatterns = [
-    url(r'^$', RedirectView.as_view(pattern_name='profile_view'), name='site_url'),
+    url(r'^$', RedirectView.as_view(pattern_name=settings.LANDING_VIEW, permanent=False), name='site_url'),
     url('', include('django.contrib.auth.urls')),
     url(r'^records/', include('records.urls')),
     url(r'^admin/', include(admin.site.urls)),
@@ -47,12 +47,14 @@ class UserPermForm(forms.ModelForm):
         self.helper.form_method = 'POST'
         self.helper.form_action = ''
         self.helper.add_input(Submit('add_perm', 'Add Permission'))
-        # Assign queryset for multi choice field when creating form
-        self.fields['zone_permission'] = forms.ModelMultipleChoiceField(queryset=zone_set, required=False)
-        self.fields['program_permission'] = forms.ModelMultipleChoiceField(queryset=program_set, required=False)
-        self.fields['schedule_permission'] = forms.ModelMultipleChoiceField(queryset=schedule_set, required=False)
+        # the zones, programs and schedules are picked in the permission tree of the page, which adds
+        # the ids checked and unchecked as hidden inputs. they are limited to the records the user
+        # is able to grant by the queryset of each level
+        for level, query_set in (('zone', zone_set), ('program', program_set), ('schedule', schedule_set)):
+            for change in ('added', 'removed'):
+                self.fields['%s_permission_%s' % (level, change)] = forms.ModelMultipleChoiceField(
+                    queryset=query_set, required=False, widget=forms.MultipleHiddenInput)
 
     class Meta:
         model = UserProfile
-        fields = ['user', 'zone_permission', 'program_permission', 'schedule_permission', 'session_permission',
-                  'school_permission', 'student_permission', 'partner_permission', ]
+        fields = ['user', 'session_permission', 'school_permission', 'student_permission', 'partner_permission', ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('address', models.TextField(blank=True)),
+                ('phone_number', models.CharField(max_length=20, blank=True)),
+                ('session_permission', models.BooleanField(default=False)),
+                ('school_permission', models.BooleanField(default=False)),
+                ('student_permission', models.BooleanField(default=False)),
+                ('partner_permission', models.BooleanField(default=False)),
+                ('program_permission', models.ManyToManyField(blank=True, to='records.Program')),
+                ('schedule_permission', models.ManyToManyField(blank=True, to='records.Schedule')),
+                ('user', models.OneToOneField(related_name='profile', to=settings.AUTH_USER_MODEL)),
+                ('zone_permission', models.ManyToManyField(blank=True, to='records.Zone')),
+            ],
+        ),
+    ]
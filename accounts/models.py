@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.signals import m2m_changed
 from django.contrib.auth.models import User
+from records.bulk import MAX_QUERY_PARAMS, raw_delete
 from records.models import Zone, Program, Schedule
 
 
@@ -26,5 +28,38 @@ class UserProfile(models.Model):
 def get_user_profile(user):
     # if user's profile doesn't exist create a new one
     # this function should be used for every access to user's porfile
-    profile = UserProfile.objects.get_or_create(user=user)
-    return profile[0]
+    # the profile is kept on the user object, so a request only fetches it once
+    if not hasattr(user, '_user_profile'):
+        user._user_profile = UserProfile.objects.get_or_create(user=user)[0]
+    return user._user_profile
+
+
+def send_permission_changed(profile, manager, action, ids):
+    m2m_changed.send(sender=manager.through, action=action, instance=profile, reverse=False, model=manager.model,
+                     pk_set=ids, using=router.db_for_write(manager.through, instance=profile))
+
+
+def update_level_permissions(profile, changes):
+    # changes maps zone, program and schedule to the (added, removed) ids of the level. only the
+    # through rows of the ids added and not granted yet and of the ids removed and granted are
+    # written, in one transaction, instead of clearing and inserting every permission of the level.
+    # the m2m_changed signals of add and remove are sent for the ids written
+    with transaction.atomic():
+        for level, (added, removed) in sorted(changes.items()):
+            manager = getattr(profile, level + '_permission')
+            through = manager.through
+            column = level + '_id'
+            granted = set(through.objects.filter(userprofile_id=profile.id).values_list(column, flat=True))
+            added = set(added) - granted
+            removed = sorted(set(removed) & granted)
+            if added:
+                send_permission_changed(profile, manager, 'pre_add', added)
+                through.objects.bulk_create([through(userprofile_id=profile.id, **{column: obj_id})
+                                             for obj_id in sorted(added)])
+                send_permission_changed(profile, manager, 'post_add', added)
+            if removed:
+                send_permission_changed(profile, manager, 'pre_remove', set(removed))
+                for start in range(0, len(removed), MAX_QUERY_PARAMS):
+                    raw_delete(through.objects.filter(userprofile_id=profile.id,
+                                                      **{column + '__in': removed[start:start + MAX_QUERY_PARAMS]}))
+                send_permission_changed(profile, manager, 'post_remove', set(removed))
@@ -0,0 +1,36 @@
+from records.models import Zone, Program, Schedule
+from records.permissions import get_permission_closure
+
+# the edit permission page shows the zones, programs and schedules as a tree loaded one level at a
+# time, the zones first and the programs or schedules of a node when it is expanded. every node
+# says if the target user has its permission and if the user editing is able to grant it, the
+# page sends back the ids checked and unchecked only, see UserPermForm
+
+TREE_COLUMNS = ['id', 'name', 'granted', 'grantable']
+
+
+def get_tree_level(user, target_profile, zone_id=None, program_id=None):
+    # (level, rows) of the zones, of the programs of a zone or of the schedules of a program the
+    # user is able to see, in the order of TREE_COLUMNS
+    closure = get_permission_closure(user)
+    if program_id is not None:
+        level = 'schedule'
+        nodes = [(schedule, schedule.session.name) for schedule in
+                 Schedule.objects.filter(program_id=program_id).select_related('session').order_by('session__name')
+                 if closure.can_see('schedule', schedule.id)]
+        granted = target_profile.schedule_permission.filter(program_id=program_id)
+        grantable = closure.can_edit('program', program_id)
+    elif zone_id is not None:
+        level = 'program'
+        nodes = [(program, program.name) for program in Program.objects.filter(zone_id=zone_id).order_by('name')
+                 if closure.can_see('program', program.id)]
+        granted = target_profile.program_permission.filter(zone_id=zone_id)
+        grantable = closure.can_edit('zone', zone_id)
+    else:
+        level = 'zone'
+        nodes = [(zone, zone.name) for zone in Zone.objects.order_by('name') if closure.can_see('zone', zone.id)]
+        granted = target_profile.zone_permission.all()
+        grantable = closure.is_superuser
+    # the nodes of a level are all grantable or not, it depends on the permission of their parent
+    granted_ids = set(granted.values_list('id', flat=True)) if nodes else set()
+    return level, [[obj.id, name, obj.id in granted_ids, grantable] for obj, name in nodes]
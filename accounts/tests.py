@@ -1,3 +1,144 @@
+import datetime
+import json
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from records.models import Zone, Program, Session, Schedule
+from records.permissions import get_permission_closure
+from records.testing import QueryBudgetMixin
+from .models import get_user_profile
 
-# Create your tests here.
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    # the account pages are requested by a superuser and by a user with the permission of one zone,
+    # see QueryBudgetMixin
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.coordinator = User.objects.create_user('coordinator', 'coordinator@example.com', 'password')
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        cls.session = Session.objects.create(name='Fall 2015', start_date=datetime.date(2015, 9, 1),
+                                             end_date=datetime.date(2015, 12, 15))
+
+    def setUp(self):
+        cache.clear()
+        self.scale = 0
+
+    def grow(self, scale):
+        # every step adds a zone of two programs with a schedule each, and a program with a
+        # schedule to the zone of the coordinator
+        if self.scale == 0:
+            self.zone = Zone.objects.create(name='Zone 0')
+            get_user_profile(self.coordinator).zone_permission.add(self.zone)
+        for index in range(self.scale, scale):
+            zone = Zone.objects.create(name='Zone %d' % (index + 1))
+            for program_zone, name in ((zone, 'Program 0'), (zone, 'Program 1'), (self.zone, 'Program %d' % index)):
+                program = Program.objects.create(name=name, zone=program_zone)
+                schedule = Schedule.objects.create(program=program, session=self.session, teacher=self.teacher,
+                                                   address='Nashville', meeting_day=['Mon', 'Wed'])
+                get_user_profile(self.teacher).schedule_permission.add(schedule)
+            User.objects.create_user('user%d' % index, 'user%d@example.com' % index, 'password')
+        self.scale = scale
+
+    def get_budgets(self):
+        # (url, queries as superuser, queries as coordinator)
+        program_id = Program.objects.filter(zone=self.zone).order_by('id').values_list('id', flat=True)[0]
+        return [
+            ('/accounts/profile/', 3, 3),
+            ('/accounts/add_user/', 2, 2),
+            ('/accounts/add_user_permission/', 4, 4),
+            ('/accounts/get_user_permission/?user=%d' % self.teacher.id, 6, 6),
+            ('/accounts/permission_tree/?user=%d' % self.teacher.id, 6, 6),
+            ('/accounts/permission_tree/?user=%d&zone=%d' % (self.teacher.id, self.zone.id), 6, 6),
+            ('/accounts/permission_tree/?user=%d&program=%d' % (self.teacher.id, program_id), 6, 6),
+        ]
+
+
+class PermissionTreeTest(TestCase):
+    # a coordinator with the permission of zone A grants the programs and schedules below it
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = User.objects.create_user('coordinator', 'coordinator@example.com', 'password')
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        session = Session.objects.create(name='Fall 2015', start_date=datetime.date(2015, 9, 1),
+                                         end_date=datetime.date(2015, 12, 15))
+        cls.zone = Zone.objects.create(name='Zone A')
+        cls.other_zone = Zone.objects.create(name='Zone B')
+        cls.program = Program.objects.create(name='Program 1', zone=cls.zone)
+        cls.other_program = Program.objects.create(name='Program 2', zone=cls.other_zone)
+        cls.schedule = Schedule.objects.create(program=cls.program, session=session, teacher=cls.teacher,
+                                               address='Nashville', meeting_day=['Mon'])
+        cls.other_schedule = Schedule.objects.create(program=cls.other_program, session=session,
+                                                     teacher=cls.teacher, address='Nashville', meeting_day=['Mon'])
+        get_user_profile(cls.coordinator).zone_permission.add(cls.zone)
+        get_user_profile(cls.teacher).schedule_permission.add(cls.other_schedule)
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='coordinator', password='password')
+
+    def get_level(self, **params):
+        params['user'] = self.teacher.id
+        data = json.loads(self.client.get('/accounts/permission_tree/', params).content.decode())
+        return data['level'], [dict(zip(data['columns'], row)) for row in data['rows']]
+
+    def test_tree_levels(self):
+        self.assertEqual(self.get_level(), ('zone', [{'id': self.zone.id, 'name': 'Zone A', 'granted': False,
+                                                      'grantable': False}]))
+        self.assertEqual(self.get_level(zone=self.zone.id),
+                         ('program', [{'id': self.program.id, 'name': 'Program 1', 'granted': False,
+                                       'grantable': True}]))
+        get_user_profile(self.teacher).schedule_permission.add(self.schedule)
+        self.assertEqual(self.get_level(program=self.program.id),
+                         ('schedule', [{'id': self.schedule.id, 'name': 'Fall 2015', 'granted': True,
+                                        'grantable': True}]))
+        # nothing of a zone the coordinator doesn't see
+        self.assertEqual(self.get_level(zone=self.other_zone.id), ('program', []))
+
+    def test_invalid_parameters(self):
+        for params in ({'user': 'abc'}, {}, {'user': self.teacher.id, 'zone': 'abc'}):
+            self.assertEqual(self.client.get('/accounts/permission_tree/', params).status_code, 400)
+        self.assertEqual(self.client.get('/accounts/permission_tree/', {'user': 0}).status_code, 404)
+
+    def test_changes_are_applied(self):
+        profile = get_user_profile(self.teacher)
+        response = self.client.post('/accounts/add_user_permission/', {
+            'user': self.teacher.id, 'program_permission_added': [self.program.id],
+            'schedule_permission_added': [self.schedule.id]})
+        self.assertTrue(response.context['success'])
+        self.assertEqual(set(profile.program_permission.all()), {self.program})
+        # the schedule the coordinator isn't able to grant stays
+        self.assertEqual(set(profile.schedule_permission.all()), {self.schedule, self.other_schedule})
+        self.client.post('/accounts/add_user_permission/', {
+            'user': self.teacher.id, 'schedule_permission_removed': [self.schedule.id]})
+        self.assertEqual(set(profile.schedule_permission.all()), {self.other_schedule})
+        # a record outside of the coordinator's zone is refused
+        response = self.client.post('/accounts/add_user_permission/', {
+            'user': self.teacher.id, 'schedule_permission_removed': [self.other_schedule.id]})
+        self.assertNotIn('success', response.context)
+        self.assertEqual(set(profile.schedule_permission.all()), {self.other_schedule})
+
+    def test_only_changes_are_written(self):
+        profile = get_user_profile(self.teacher)
+        profile.schedule_permission.add(self.schedule)
+        get_permission_closure(self.teacher)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post('/accounts/add_user_permission/', {
+                'user': self.teacher.id, 'program_permission_added': [self.program.id],
+                'schedule_permission_added': [self.schedule.id]})
+        writes = [query['sql'] for query in captured if 'INSERT' in query['sql'] or 'DELETE' in query['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('accounts_userprofile_program_permission', writes[0])
+        # the closure of the teacher follows the new permission
+        self.assertTrue(get_permission_closure(User.objects.get(id=self.teacher.id)).can_edit('program',
+                                                                                               self.program.id))
+        with CaptureQueriesContext(connection) as captured:
+            self.client.post('/accounts/add_user_permission/', {
+                'user': self.teacher.id, 'program_permission_removed': [self.program.id]})
+        writes = [query['sql'] for query in captured if 'DELETE' in query['sql']]
+        self.assertEqual(len(writes), 1)
+        self.assertFalse(profile.program_permission.exists())
@@ -3,12 +3,14 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from .forms import ProfileForm
 from records.models import Zone, Program, Schedule
+from django.db import transaction
 from django.db.models import Q
 from .forms import AddUserForm, UserPermForm
-from .models import get_user_profile, UserProfile
+from .models import get_user_profile, update_level_permissions, UserProfile
+from .permission_tree import TREE_COLUMNS, get_tree_level
 import json
 from django.core.context_processors import csrf
-from crispy_forms.utils import render_crispy_form
+from records.profiling import render_crispy_form
 from django.contrib.auth.models import User
 
 
@@ -128,18 +130,10 @@ def add_user_perm_view(request):
             # we first get the object the form will save to, but dont save it
             form_obj = add_user_perm_form.save(commit=False)
             # then we manually adjust the target user's permission or profile, then save it
-            form_obj.zone_permission = \
-                Zone.objects.filter(Q(id__in=add_user_perm_form.cleaned_data['zone_permission']) |
-                                    Q(id__in=target_profile.zone_permission.exclude(id__in=perm_set['zone_set'].
-                                                                                    values('id'))))
-            form_obj.program_permission = \
-                Program.objects.filter(Q(id__in=add_user_perm_form.cleaned_data['program_permission']) |
-                                       Q(id__in=target_profile.program_permission.exclude
-                                       (id__in=perm_set['program_set'].values('id'))))
-            form_obj.schedule_permission = \
-                Schedule.objects.filter(Q(id__in=add_user_perm_form.cleaned_data['schedule_permission']) |
-                                        Q(id__in=target_profile.schedule_permission.exclude
-                                        (id__in=perm_set['schedule_set'].values('id'))))
+            # the tree sends the records checked and unchecked, the other permissions stay as they are
+            changes = {level: ({obj.id for obj in add_user_perm_form.cleaned_data[level + '_permission_added']},
+                               {obj.id for obj in add_user_perm_form.cleaned_data[level + '_permission_removed']})
+                       for level in ('zone', 'program', 'schedule')}
             if not perm_set['session_perm']:
                 form_obj.session_permission = session_permission
             if not perm_set['school_perm']:
@@ -148,9 +142,29 @@ def add_user_perm_view(request):
                 form_obj.student_permission = student_permission
             if not perm_set['partner_perm']:
                 form_obj.partner_permission = partner_permission
-            form_obj.save()
+            with transaction.atomic():
+                form_obj.save()
+                update_level_permissions(form_obj, changes)
             add_user_perm_form = UserPermForm(instance=target_profile, **perm_set)
             return render(request, "accounts_add_user_perm.html", {'add_user_perm_form': add_user_perm_form,
                                                                    'success': True})
         else:
             return render(request, "accounts_add_user_perm.html", {'add_user_perm_form': add_user_perm_form})
+
+
+@require_http_methods(["GET"])
+@login_required
+def permission_tree_view(request):
+    # this view is for ajax to load a level of the permission tree, the zones or the children of the
+    # zone or program given, with the permissions of the target user
+    try:
+        user_id = int(request.GET.get('user', ''))
+        zone_id = int(request.GET['zone']) if request.GET.get('zone') else None
+        program_id = int(request.GET['program']) if request.GET.get('program') else None
+    except ValueError:
+        return HttpResponse(json.dumps({'success': False}), content_type='application/json', status=400)
+    target_profile = get_user_profile(get_object_or_404(User, id=user_id))
+    level, rows = get_tree_level(request.user, target_profile, zone_id, program_id)
+    return HttpResponse(json.dumps({'success': True, 'level': level, 'leaf': level == 'schedule',
+                                    'columns': TREE_COLUMNS, 'rows': rows}),
+                        content_type='application/json')
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from records.models import School, Student, Zone, Program, Session, Schedule, \
-    Partner, CanceledDate, Enrollment, Attendance
+    Partner, CanceledDate, Enrollment, Attendance, AttendanceRollup, DeletionJob
 
 admin.site.register(School)
 admin.site.register(Student)
@@ -12,3 +12,5 @@ admin.site.register(Partner)
 admin.site.register(CanceledDate)
 admin.site.register(Enrollment)
 admin.site.register(Attendance)
+admin.site.register(AttendanceRollup)
+admin.site.register(DeletionJob)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class RecordsConfig(AppConfig):
+    name = 'records'
+
+    def ready(self):
+        # connect the signal receivers keeping the caches of records up to date
+        from . import permissions, search, rollup, meeting_calendar, fragments
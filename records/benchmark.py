@@ -0,0 +1,161 @@
+import math
+import threading
+import time
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.http import urlquote
+from .meeting_calendar import get_calendar
+from .models import Schedule, Enrollment, School, Session, Partner
+
+# the benchmark drives the pages of the site through the test client against whatever database
+# the settings point to, normally one filled by the generate_data command. every endpoint is
+# requested a number of times by concurrent workers, each with its own client logged in as the
+# user, after one warm up request per worker. the result is a list of dicts with stable keys so
+# the json of two runs can be compared endpoint by endpoint
+
+
+def get_endpoints():
+    # (name, url) of the pages of the first schedule of the first program, and of the lists
+    schedule = Schedule.objects.select_related('program__zone', 'session').order_by('id').first()
+    if schedule is None:
+        return []
+    zone_url = '/records/zones/%s/' % urlquote(schedule.program.zone.name)
+    program_url = zone_url + 'programs/%s/' % urlquote(schedule.program.name)
+    schedule_url = program_url + 'schedules/%s/' % urlquote(schedule.session.name)
+    enrollment_url = schedule_url + 'enrollments/'
+    student_id = Enrollment.objects.filter(schedule=schedule).order_by('id').values_list('student_id', flat=True)[0]
+    meeting_dates = get_calendar(schedule).meeting_dates()
+    middle_date = meeting_dates[len(meeting_dates) // 2]
+    return [
+        ('zone_list', '/records/zones/'),
+        ('program_list', zone_url + 'programs/'),
+        ('schedule_list', program_url + 'schedules/'),
+        ('schedule_edit', schedule_url + 'edit/'),
+        ('enrollment_list', enrollment_url),
+        ('enrollment_add', enrollment_url + 'add/'),
+        ('enrollment_edit', enrollment_url + '%d/edit/' % student_id),
+        ('attendance_first', enrollment_url + '%s/' % meeting_dates[0].isoformat()),
+        ('attendance_middle', enrollment_url + '%s/' % middle_date.isoformat()),
+        ('attendance_json', enrollment_url + '%s/json/' % middle_date.isoformat()),
+        ('canceled_date_list', schedule_url + 'canceled_dates/'),
+        ('student_list', '/records/students/'),
+        ('student_search', '/records/students/search/?q=last1'),
+        ('student_edit', '/records/students/%d/edit/' % student_id),
+        ('school_list', '/records/schools/'),
+        ('school_edit', '/records/schools/%d/edit/' % School.objects.order_by('id').values_list('id', flat=True)[0]),
+        ('session_list', '/records/sessions/'),
+        ('session_edit', '/records/sessions/%d/edit/' % Session.objects.order_by('id').values_list('id', flat=True)[0]),
+        ('partner_list', '/records/partners/'),
+        ('partner_search', '/records/partners/search/?q=%s' % urlquote(
+            Partner.objects.order_by('id').values_list('name', flat=True)[0])),
+        ('hierarchy', '/records/hierarchy/'),
+        ('today', '/records/today/?date=%s' % middle_date.isoformat()),
+        ('export', '/records/export/?zone=%s&start_date=%s&end_date=%s' % (
+            urlquote(schedule.program.zone.name), meeting_dates[0].isoformat(), middle_date.isoformat())),
+        ('profile', '/accounts/profile/'),
+        ('get_user_permission', '/accounts/get_user_permission/?user=%d' % User.objects.filter(
+            is_superuser=False).order_by('id').values_list('id', flat=True)[0]),
+    ]
+
+
+def percentile(values, percent):
+    # nearest rank percentile of a sorted list
+    if not values:
+        return 0
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class Worker(threading.Thread):
+
+    def __init__(self, username, password, url, count):
+        super(Worker, self).__init__()
+        self.username = username
+        self.password = password
+        self.url = url
+        self.count = count
+        self.timings = []
+        self.queries = []
+        self.errors = 0
+
+    def get(self, client):
+        # a page raising an error counts as a failed request instead of stopping the worker
+        try:
+            response = client.get(self.url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        except Exception:
+            return None
+        return response
+
+    def run(self):
+        # every thread has its own database connection, closed when it is done
+        try:
+            client = Client()
+            if not client.login(username=self.username, password=self.password):
+                self.errors = self.count
+                return
+            self.get(client)
+            for index in range(self.count):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.time()
+                    response = self.get(client)
+                    self.timings.append(time.time() - start)
+                self.queries.append(len(captured))
+                if response is None or response.status_code != 200:
+                    self.errors += 1
+        finally:
+            connection.close()
+
+
+def measure(username, password, name, url, requests=20, workers=4):
+    # requests are split between the workers, so every worker makes at least one
+    counts = [requests // workers + (1 if index < requests % workers else 0) for index in range(workers)]
+    threads = [Worker(username, password, url, count) for count in counts if count]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    timings = sorted(timing for thread in threads for timing in thread.timings)
+    queries = [count for thread in threads for count in thread.queries]
+    return {
+        'name': name,
+        'url': url,
+        'user': username,
+        'requests': len(timings),
+        'errors': sum(thread.errors for thread in threads),
+        'p50_ms': round(percentile(timings, 50) * 1000, 2),
+        'p95_ms': round(percentile(timings, 95) * 1000, 2),
+        'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2) if timings else 0,
+        'queries_per_request': round(float(sum(queries)) / len(queries), 2) if queries else 0,
+        'throughput_rps': round(len(timings) / elapsed, 2) if elapsed else 0,
+    }
+
+
+def run_benchmark(usernames, password, requests=20, workers=4, progress=None):
+    results = []
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for name, url in get_endpoints():
+            for username in usernames:
+                result = measure(username, password, name, url, requests=requests, workers=workers)
+                if progress is not None:
+                    progress(result)
+                results.append(result)
+    return results
+
+
+def compare_results(baseline, results):
+    # (name, user, baseline p95, p95, baseline queries, queries) of the endpoints in both runs
+    baseline = {(result['name'], result['user']): result for result in baseline}
+    rows = []
+    for result in results:
+        before = baseline.get((result['name'], result['user']))
+        if before is not None:
+            rows.append((result['name'], result['user'], before['p95_ms'], result['p95_ms'],
+                         before['queries_per_request'], result['queries_per_request']))
+    return rows
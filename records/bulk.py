@@ -0,0 +1,35 @@
+from django.db import connection, transaction
+from django.db.models import Case, When, Value
+
+# sqlite refuses queries with more than 999 parameters, bulk writes are batched below it
+MAX_QUERY_PARAMS = 900
+
+
+def bulk_update_fields(model, objs, fields, **updates):
+    # write the given fields of the objects with one CASE update per batch of rows, every row
+    # takes two parameters per field and one for its id. updates are set on every row as they
+    # are, i.e. version=F('version') + 1
+    objs = list(objs)
+    batch_size = max(1, MAX_QUERY_PARAMS // (2 * len(fields) + 1))
+    with transaction.atomic():
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            values = dict(updates)
+            for name in fields:
+                field = model._meta.get_field(name)
+                whens = [When(pk=obj.pk, then=Value(getattr(obj, field.attname))) for obj in batch]
+                values[name] = Case(*whens, output_field=field)
+            model.objects.filter(pk__in=[obj.pk for obj in batch]).update(**values)
+    return len(objs)
+
+
+def raw_delete(query_set):
+    # delete the rows of the queryset with one DELETE statement, without loading them or sending
+    # the delete signals the way queryset.delete() does, returns the number of rows deleted
+    sql, params = query_set.order_by().values('pk').query.sql_with_params()
+    table = connection.ops.quote_name(query_set.model._meta.db_table)
+    pk = connection.ops.quote_name(query_set.model._meta.pk.column)
+    cursor = connection.cursor()
+    # the ids are selected through a derived table as mysql doesn't delete from a table it selects from
+    cursor.execute('DELETE FROM %s WHERE %s IN (SELECT * FROM (%s) AS selected)' % (table, pk, sql), params)
+    return cursor.rowcount
@@ -0,0 +1,46 @@
+from django.db.models import Count
+from .models import Schedule, Enrollment, AttendanceRollup
+from .meeting_calendar import weekday_name
+
+# the dashboard lists the schedules a teacher has class in at a date with the size of their roster
+# and how much of it is marked already. it takes three queries whatever the number of schedules:
+# the schedules meeting at the date, the active enrollments counted per schedule, and the
+# attendance rollups of the date
+
+
+class TodaysClass(object):
+
+    def __init__(self, schedule, enrollment_count, rollup):
+        self.schedule = schedule
+        self.enrollment_count = enrollment_count
+        self.marked_count = rollup.present + rollup.excused + rollup.absent if rollup else 0
+        self.present_count = rollup.present if rollup else 0
+
+    @property
+    def unmarked_count(self):
+        return max(self.enrollment_count - self.marked_count, 0)
+
+
+def get_meeting_schedules(date, **filters):
+    # the schedules with a meeting day at the date inside their session and not canceled
+    return Schedule.objects.filter(meeting_day__includes=weekday_name(date),
+                                   session__start_date__lte=date,
+                                   session__end_date__gte=date,
+                                   **filters). \
+        exclude(canceleddate__date=date). \
+        select_related('program__zone', 'session')
+
+
+def get_todays_classes(user, date):
+    schedules = list(get_meeting_schedules(date, teacher=user).order_by('program__zone__name', 'program__name'))
+    if not schedules:
+        return []
+    schedule_ids = [schedule.id for schedule in schedules]
+    enrollment_counts = dict(Enrollment.objects.filter(schedule__in=schedule_ids).
+                             exclude(start_date__gt=date).
+                             exclude(end_date__lt=date).
+                             values_list('schedule_id').annotate(Count('id')).order_by())
+    rollups = {rollup.schedule_id: rollup
+               for rollup in AttendanceRollup.objects.filter(schedule__in=schedule_ids, date=date)}
+    return [TodaysClass(schedule, enrollment_counts.get(schedule.id, 0), rollups.get(schedule.id))
+            for schedule in schedules]
@@ -0,0 +1,155 @@
+import datetime
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from accounts.models import UserProfile
+from .bulk import raw_delete
+from .fragments import bump_generations
+from .models import Zone, Program, Schedule, Session, CanceledDate, Enrollment, Attendance, AttendanceRollup, \
+    DeletionJob
+from .permissions import bump_hierarchy_version
+
+# deleting a zone, program, schedule or session with obj.delete() makes the deletion collector
+# load every row below it, which a zone with years of attendance doesn't fit in. a record with more
+# than DELETION_INLINE_LIMIT attendance rows below it is deleted by a deletion job instead: its
+# subtree is flagged as deleting right away, which hides it from the site (see RecordManager), and
+# the job deletes it bottom up, attendance first, in chunks of DELETION_CHUNK_SIZE rows. a chunk is
+# the rows up to the id DELETION_CHUNK_SIZE rows on, deleted by one DELETE statement in its own
+# transaction, so the job never holds more than a chunk in a transaction and is able to resume
+# where it stopped. jobs run in a thread of the process that started them, run_deletion_jobs
+# resumes the ones that failed or whose process ended before they were done. a job is claimed by
+# the process running it with a conditional update, and a running job that made no progress for
+# STALE_AFTER is taken to have lost its process
+
+INLINE_LIMIT = 1000
+CHUNK_SIZE = 1000
+STALE_AFTER = datetime.timedelta(minutes=10)
+
+deletion_model_dict = {
+    'zone': Zone,
+    'program': Program,
+    'schedule': Schedule,
+    'session': Session,
+}
+
+
+def get_subtree(model_name, object_id):
+    # (programs, schedules) querysets of the subtree of the record, deleting ones included
+    if model_name == 'zone':
+        programs = Program.all_objects.filter(zone_id=object_id)
+        return programs, Schedule.all_objects.filter(program__zone_id=object_id)
+    if model_name == 'program':
+        return Program.all_objects.filter(id=object_id), Schedule.all_objects.filter(program_id=object_id)
+    if model_name == 'schedule':
+        return Program.all_objects.none(), Schedule.all_objects.filter(id=object_id)
+    return Program.all_objects.none(), Schedule.all_objects.filter(session_id=object_id)
+
+
+def get_deletion_steps(model_name, object_id):
+    # the querysets of the rows of the subtree in the order they are deleted, every row before the
+    # rows it refers to
+    programs, schedules = get_subtree(model_name, object_id)
+    schedule_ids = schedules.values('id')
+    program_ids = programs.values('id')
+    steps = [
+        Attendance.objects.filter(enrollment__schedule__in=schedule_ids),
+        AttendanceRollup.objects.filter(schedule__in=schedule_ids),
+        CanceledDate.objects.filter(schedule__in=schedule_ids),
+        Enrollment.objects.filter(schedule__in=schedule_ids),
+        UserProfile.schedule_permission.through.objects.filter(schedule__in=schedule_ids),
+        Schedule.all_objects.filter(id__in=schedule_ids),
+        UserProfile.program_permission.through.objects.filter(program__in=program_ids),
+        Program.all_objects.filter(id__in=program_ids),
+    ]
+    if model_name == 'zone':
+        steps.append(UserProfile.zone_permission.through.objects.filter(zone_id=object_id))
+    if model_name in ('zone', 'session'):
+        steps.append(deletion_model_dict[model_name].all_objects.filter(id=object_id))
+    return steps
+
+
+def delete_chunk(query_set, chunk_size):
+    # delete the first chunk_size rows of the queryset by id, returns the number deleted
+    last_ids = list(query_set.order_by('id').values_list('id', flat=True)[chunk_size - 1:chunk_size])
+    if last_ids:
+        query_set = query_set.filter(id__lte=last_ids[0])
+    with transaction.atomic():
+        return raw_delete(query_set)
+
+
+def is_large(model_name, obj):
+    inline_limit = getattr(settings, 'DELETION_INLINE_LIMIT', INLINE_LIMIT)
+    programs, schedules = get_subtree(model_name, obj.id)
+    return Attendance.objects.filter(enrollment__schedule__in=schedules.values('id'))[:inline_limit + 1]. \
+        count() > inline_limit
+
+
+def records_changed():
+    # raw statements send no signal, the caches keyed by the records are invalidated here
+    bump_generations(['zone', 'program', 'schedule', 'session', 'enrollment', 'canceled_date'])
+    bump_hierarchy_version()
+
+
+def start_deletion_job(model_name, obj, user=None):
+    # hide the subtree of the record and create the job deleting it
+    programs, schedules = get_subtree(model_name, obj.id)
+    with transaction.atomic():
+        deletion_model_dict[model_name].all_objects.filter(id=obj.id).update(deleting=True)
+        programs.update(deleting=True)
+        schedules.update(deleting=True)
+        job = DeletionJob.objects.create(model_name=model_name, object_id=obj.id, object_name=str(obj)[:200],
+                                         requested_by=user)
+    records_changed()
+    if getattr(settings, 'DELETION_JOBS_IN_THREAD', True):
+        threading.Thread(target=run_deletion_job_in_thread, args=(job.id,), daemon=True).start()
+    return job
+
+
+def run_deletion_job_in_thread(job_id):
+    # a thread has its own database connection, closed when it is done
+    try:
+        run_deletion_job(job_id)
+    finally:
+        connection.close()
+
+
+def get_runnable_jobs():
+    # the jobs no process is running
+    return DeletionJob.objects.filter(Q(status__in=['pending', 'failed']) |
+                                      Q(status='running', updated_at__lt=timezone.now() - STALE_AFTER))
+
+
+def claim_job(job):
+    # mark the job as running, False if another process claimed it since it was read
+    return get_runnable_jobs().filter(id=job.id, status=job.status, updated_at=job.updated_at). \
+        update(status='running', updated_at=timezone.now()) == 1
+
+
+def run_deletion_job(job_id):
+    # run the job unless it is done or another process runs it, returns the job as it is then
+    job = DeletionJob.objects.get(id=job_id)
+    if not claim_job(job):
+        return DeletionJob.objects.get(id=job_id)
+    steps = get_deletion_steps(job.model_name, job.object_id)
+    chunk_size = getattr(settings, 'DELETION_CHUNK_SIZE', CHUNK_SIZE)
+    try:
+        # a job resumed after a failure or the end of its process keeps the total it counted
+        if job.status == 'pending':
+            DeletionJob.objects.filter(id=job.id).update(total=sum(query_set.count() for query_set in steps))
+        for query_set in steps:
+            while True:
+                deleted = delete_chunk(query_set, chunk_size)
+                if deleted:
+                    DeletionJob.objects.filter(id=job.id).update(deleted=F('deleted') + deleted,
+                                                                 updated_at=timezone.now())
+                if deleted < chunk_size:
+                    break
+    except Exception as e:
+        DeletionJob.objects.filter(id=job.id).update(status='failed', error=str(e), updated_at=timezone.now())
+        raise
+    finally:
+        records_changed()
+    DeletionJob.objects.filter(id=job.id).update(status='done', updated_at=timezone.now())
+    return DeletionJob.objects.get(id=job.id)
@@ -0,0 +1,104 @@
+import csv
+import json
+import zlib
+from .models import Attendance
+
+# attendance is exported for the data warehouse as csv or json lines, one row per attendance with
+# the keys the warehouse links on. rows are read in chunks of ascending id with values_list and
+# written out as they come, so memory stays flat whatever the size of the export. chunks are
+# read by id rather than through .iterator() since sqlite doesn't support chunked reads
+
+CHUNK_SIZE = 2000
+# the output is buffered up to this size before it is yielded or compressed
+BUFFER_SIZE = 64 * 1024
+
+EXPORT_FIELDS = (
+    ('date', 'date'),
+    ('status', 'attendance_status'),
+    ('comment', 'attendance_comment'),
+    ('partner', 'partner__name'),
+    ('local_id', 'enrollment__student__local_id'),
+    ('school_code', 'enrollment__student__school__school_code'),
+    ('district_id', 'enrollment__student__school__district_id'),
+    ('program', 'enrollment__schedule__program__name'),
+    ('zone', 'enrollment__schedule__program__zone__name'),
+    ('session', 'enrollment__schedule__session__name'),
+)
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+def get_export_query_set(start_date=None, end_date=None, zones=None):
+    # zones is a list of zone names, every zone by default
+    # the attendance of schedules being deleted is left out along with them
+    query_set = Attendance.objects.filter(enrollment__schedule__deleting=False)
+    if start_date is not None:
+        query_set = query_set.filter(date__gte=start_date)
+    if end_date is not None:
+        query_set = query_set.filter(date__lte=end_date)
+    if zones is not None:
+        query_set = query_set.filter(enrollment__schedule__program__zone__name__in=zones)
+    return query_set
+
+
+def iter_export_rows(query_set):
+    paths = ['id'] + [path for name, path in EXPORT_FIELDS]
+    last_id = 0
+    while True:
+        chunk = list(query_set.filter(id__gt=last_id).order_by('id').values_list(*paths)[:CHUNK_SIZE])
+        for row in chunk:
+            yield row[1:]
+        if len(chunk) < CHUNK_SIZE:
+            return
+        last_id = chunk[-1][0]
+
+
+class LineBuffer(object):
+    # the file csv.writer writes to, it hands back what it was given
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow([name for name, path in EXPORT_FIELDS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows):
+    names = [name for name, path in EXPORT_FIELDS]
+    for row in rows:
+        values = dict(zip(names, row))
+        values['date'] = values['date'].isoformat()
+        yield json.dumps(values) + '\n'
+
+
+def iter_chunks(lines, compress=False):
+    # join the lines into chunks of about BUFFER_SIZE bytes, gzipped on the fly if compress is set
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            data = ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = ''.join(buffer).encode('utf-8')
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_attendance(export_format, start_date=None, end_date=None, zones=None, compress=False):
+    # return an iterator of the bytes of the export
+    rows = iter_export_rows(get_export_query_set(start_date, end_date, zones))
+    lines = iter_csv(rows) if export_format == 'csv' else iter_jsonl(rows)
+    return iter_chunks(lines, compress)
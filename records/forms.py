@@ -1,5 +1,25 @@
 from django import forms
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.validators import EMPTY_VALUES
+from django.utils.encoding import force_text
+from django.forms import modelformset_factory, BaseModelFormSet
 from crispy_forms.helper import FormHelper
+from django.middleware.csrf import get_token
+from .models import Program, Schedule, Enrollment, Student, Attendance
+from .roster import bulk_update_attendance
+from .fragments import FRAGMENT_TIMEOUT, get_generations
+from .profiling import render_crispy_form
+
+
+# the relations the labels of the choices of a model use, see the __str__ of the models,
+# they are joined into the choice queries so the options are rendered without a query each
+label_related_dict = {
+    Program: ('zone',),
+    Schedule: ('program__zone', 'session'),
+    Enrollment: ('student__school', 'schedule__program__zone', 'schedule__session'),
+    Student: ('school',),
+}
 
 
 class CrispyRecordForm(forms.ModelForm):
@@ -11,17 +31,60 @@ class CrispyRecordForm(forms.ModelForm):
         self.helper.form_method = 'post'
         for disabled in self.disabled_fields:
             self.fields[disabled].widget.attrs['disabled'] = True
+        for field in self.fields.values():
+            if isinstance(field, forms.ModelChoiceField) and field.queryset.model in label_related_dict:
+                field.queryset = field.queryset.select_related(*label_related_dict[field.queryset.model])
 
     class Meta:
         pass
 
 
+# the form classes made by crispy_form_factory, by their arguments. the widgets are the ones of
+# widgets_dict in views.py, which live as long as the process
+form_class_dict = {}
+
+
 def crispy_form_factory(model, widgets, disabled, exclude, form=CrispyRecordForm):
     # this factory is able to create a crispy bootstrap form for ajax request
-    parent = (form, object)
-    Meta = type(str('Meta'), parent, {"model": model, 'exclude': exclude, 'widgets': widgets})
-    class_name = model.__name__ + "CrispyForm"
-    return type(class_name, parent, {"Meta": Meta, 'disabled_fields': disabled})
+    key = (model, tuple(sorted(widgets.items())), tuple(disabled), tuple(exclude), form)
+    if key not in form_class_dict:
+        parent = (form, object)
+        Meta = type(str('Meta'), parent, {"model": model, 'exclude': exclude, 'widgets': widgets})
+        class_name = model.__name__ + "CrispyForm"
+        form_class_dict[key] = type(class_name, parent, {"Meta": Meta, 'disabled_fields': disabled})
+    return form_class_dict[key]
+
+
+# the empty add forms are rendered once and cached with this in place of the csrf token, which
+# differs between users, until a record their choices list changes
+ADD_FORM_KEY = 'add_form:%s:%s:%s'
+CSRF_PLACEHOLDER = 'csrf-token-placeholder'
+
+# the models listed by the choices of an add form, with the models their labels show
+add_form_dependency_dict = {
+    'zone': (),
+    'program': ('zone',),
+    'schedule': ('zone', 'program', 'session', 'user'),
+    'enrollment': ('zone', 'program', 'schedule', 'session'),
+    'canceled_date': ('zone', 'program', 'schedule', 'session'),
+    'session': (),
+    'student': ('school',),
+    'school': (),
+    'partner': (),
+}
+
+
+def render_add_form(request, model_name, form_class, parent_name=None, parent=None):
+    # the html of the empty add form of model_name under parent, parent_name is its field
+    generations = get_generations(add_form_dependency_dict[model_name])
+    key = ADD_FORM_KEY % (model_name, parent.id if parent is not None else '',
+                          ':'.join(str(generation) for generation in generations))
+    form_html = cache.get(key)
+    if form_html is None:
+        add_form = form_class(initial={parent_name: parent} if parent_name else None)
+        form_html = render_crispy_form(add_form, context={'csrf_token': CSRF_PLACEHOLDER})
+        cache.set(key, form_html, FRAGMENT_TIMEOUT)
+    return form_html.replace(CSRF_PLACEHOLDER, get_token(request))
 
 
 class DeleteForm(forms.Form):
@@ -31,3 +94,97 @@ class DeleteForm(forms.Form):
         self.helper = FormHelper(self)
         self.helper.form_id = 'record_form'
         self.helper.form_method = 'post'
+
+
+class AjaxSelect(forms.Select):
+    # a select of a model choice field rendering only its selected option, the other options
+    # are loaded page by page by select2 from the url in its data-ajax-url attribute
+
+    def render_options(self, choices, selected_choices):
+        selected_choices = [force_text(value) for value in selected_choices if value not in EMPTY_VALUES]
+        options = [self.render_option(selected_choices, '', self.choices.field.empty_label or '')]
+        for obj in self.choices.queryset.filter(pk__in=selected_choices):
+            options.append(self.render_option(selected_choices, obj.pk, self.choices.field.label_from_instance(obj)))
+        return '\n'.join(options)
+
+
+class SharedModelChoiceField(forms.ModelChoiceField):
+    # a model choice field whose choices and objects are loaded once by a formset and shared by
+    # all of its forms, so neither rendering nor cleaning a row runs a query
+
+    def __init__(self, objects, choices, *args, **kwargs):
+        super(SharedModelChoiceField, self).__init__(*args, **kwargs)
+        self.objects = objects
+        self.choices = choices
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objects[self.queryset.model._meta.pk.to_python(value)]
+        except (KeyError, ValidationError):
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+
+class AttendanceGridForm(forms.ModelForm):
+    # a row of the attendance grid, its enrollment and date are fixed by the formset queryset
+    # so they are neither rendered nor accepted from the post data
+
+    class Meta:
+        model = Attendance
+        fields = ['attendance_status', 'partner', 'attendance_comment']
+
+    def _get_validation_exclusions(self):
+        # the partner was already resolved from the partners the formset preloaded,
+        # checking its existence again would cost a query per row
+        exclude = super(AttendanceGridForm, self)._get_validation_exclusions()
+        exclude.append('partner')
+        return exclude
+
+    def _post_clean(self):
+        super(AttendanceGridForm, self)._post_clean()
+        # excluded fields are not copied to the instance, so the partner is assigned here
+        if 'partner' in self.cleaned_data:
+            self.instance.partner = self.cleaned_data['partner']
+
+
+class BaseAttendanceGridFormSet(BaseModelFormSet):
+
+    def __init__(self, *args, **kwargs):
+        super(BaseAttendanceGridFormSet, self).__init__(*args, **kwargs)
+        # partners are loaded once for the whole grid instead of once per row
+        partner_field = self.form.base_fields['partner']
+        partners = list(partner_field.queryset)
+        self.partner_objects = {partner.pk: partner for partner in partners}
+        self.partner_choices = [('', partner_field.empty_label)] + \
+            [(partner.pk, partner_field.label_from_instance(partner)) for partner in partners]
+
+    def get_existing_objects(self):
+        # the objects of the formset queryset by pk, the rows are matched against them
+        if not hasattr(self, '_object_dict'):
+            self._object_dict = {obj.pk: obj for obj in self.get_queryset()}
+        return self._object_dict
+
+    def add_fields(self, form, index):
+        super(BaseAttendanceGridFormSet, self).add_fields(form, index)
+        pk_name = self._pk_field.name
+        pk_field = form.fields[pk_name]
+        form.fields[pk_name] = SharedModelChoiceField(self.get_existing_objects(), [],
+                                                      queryset=pk_field.queryset,
+                                                      initial=pk_field.initial,
+                                                      required=False,
+                                                      widget=pk_field.widget)
+        partner_field = form.fields['partner']
+        form.fields['partner'] = SharedModelChoiceField(self.partner_objects, self.partner_choices,
+                                                        queryset=partner_field.queryset,
+                                                        required=partner_field.required)
+
+    def save_changed(self):
+        # only the rows whose submitted status, comment or partner differ from the stored ones
+        # are written, in one transaction, and the number of written rows is returned
+        changed = [form.instance for form in self.initial_forms if form.has_changed()]
+        return bulk_update_attendance(changed, fields=self.form._meta.fields)
+
+
+AttendanceGridFormSet = modelformset_factory(Attendance, form=AttendanceGridForm,
+                                             formset=BaseAttendanceGridFormSet, max_num=0)
@@ -0,0 +1,91 @@
+import hashlib
+import time
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from .models import Zone, Program, Schedule, Enrollment, CanceledDate, Session, Student, School, Partner
+
+# the rendered table of a list page is cached under a key made of the list, its parent record,
+# the permission of the user and the generations of the models the table shows. a generation is
+# a counter per model bumped whenever one of its rows is saved or deleted, so an edit changes the
+# key of every table showing the model and is visible right away, and the old fragments expire.
+# writes that skip the model signals, like the bulk writes of the roster import, call
+# bump_generations themselves
+
+GENERATION_KEY = 'fragment_generation:%s'
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+generation_model_dict = {
+    Zone: 'zone',
+    Program: 'program',
+    Schedule: 'schedule',
+    Enrollment: 'enrollment',
+    CanceledDate: 'canceled_date',
+    Session: 'session',
+    Student: 'student',
+    School: 'school',
+    Partner: 'partner',
+    User: 'user',
+}
+
+# the models whose rows show up in the table of each list, the parent's model included for its
+# name in the links of the rows
+fragment_dependency_dict = {
+    'zone': ('zone',),
+    'program': ('zone', 'program'),
+    'schedule': ('zone', 'program', 'schedule', 'session', 'user'),
+    'enrollment': ('zone', 'program', 'schedule', 'session', 'enrollment', 'student'),
+    'canceled_date': ('zone', 'program', 'schedule', 'session', 'canceled_date'),
+    'session': ('session',),
+    'student': ('student', 'school'),
+    'school': ('school',),
+    'partner': ('partner',),
+}
+
+
+def get_generations(model_names):
+    keys = [GENERATION_KEY % model_name for model_name in model_names]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # start from the clock so a generation lost by the cache never repeats an older one
+            generations[key] = int(time.time() * 1000)
+            cache.add(key, generations[key], None)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(model_names):
+    for model_name in model_names:
+        try:
+            cache.incr(GENERATION_KEY % model_name)
+        except ValueError:
+            get_generations([model_name])
+
+
+def get_ids_digest(ids):
+    return hashlib.md5(','.join(str(obj_id) for obj_id in sorted(ids)).encode()).hexdigest()
+
+
+def get_fragment_key(model_name, perm, parent=None, visible_ids=None, params=()):
+    # visible_ids are the ids a user without the permission sees in a leveled list, params the
+    # search, sort and page of a listing
+    parts = [model_name, parent.id if parent is not None else '', int(bool(perm))]
+    if not perm and visible_ids is not None:
+        parts.append(get_ids_digest(visible_ids))
+    parts.extend(params)
+    parts.extend(get_generations(fragment_dependency_dict[model_name]))
+    return ':'.join(str(part) for part in parts)
+
+
+def record_changed(sender, update_fields=None, **kwargs):
+    # a login saves the user's last_login only, the tables show the names of teachers
+    if sender is User and update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    bump_generations([generation_model_dict[sender]])
+
+
+# connected to the models of the tables only, a receiver without a sender would make every delete
+# collect its rows one by one instead of deleting them in one query
+for model in generation_model_dict:
+    post_save.connect(record_changed, sender=model)
+    post_delete.connect(record_changed, sender=model)
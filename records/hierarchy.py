@@ -0,0 +1,69 @@
+import hashlib
+from django.core.cache import cache
+from django.db.models import Count, Prefetch
+from .fragments import FRAGMENT_TIMEOUT, get_generations
+from .models import Zone, Program, Schedule
+from .permissions import LEVELS, get_permission_closure
+
+# the records browser loads the zones, programs and schedules the user is able to see in one
+# payload and moves between the levels without going back to the server. the tree is read with
+# three queries, the zones and the programs and schedules prefetched with the enrollment count of
+# every schedule, whatever its size. it is cached per user under the generations of the models it
+# shows and a digest of the user's permission closure, so an edit or a permission change builds it
+# again. a node is a list in the order of the columns of its level, the last column holding the
+# nodes of the next level
+
+HIERARCHY_KEY = 'hierarchy:%d:%s'
+HIERARCHY_DEPENDENCIES = ('zone', 'program', 'schedule', 'session', 'enrollment')
+HIERARCHY_COLUMNS = {
+    'zone': ['id', 'name', 'editable', 'enrollment_count', 'programs'],
+    'program': ['id', 'name', 'editable', 'enrollment_count', 'schedules'],
+    'schedule': ['id', 'session', 'editable', 'enrollment_count'],
+}
+
+
+def get_closure_digest(closure):
+    # a digest of the ids the user sees and edits, superusers see and edit everything
+    if closure.is_superuser:
+        return 'superuser'
+    ids = [(sorted(closure.visible[level]), sorted(closure.editable[level])) for level in LEVELS]
+    return hashlib.md5(repr(ids).encode()).hexdigest()
+
+
+def get_hierarchy_key(user, closure):
+    parts = [get_closure_digest(closure)] + get_generations(HIERARCHY_DEPENDENCIES)
+    return HIERARCHY_KEY % (user.id, ':'.join(str(part) for part in parts))
+
+
+def build_hierarchy(closure):
+    schedules = Schedule.objects.select_related('session').annotate(enrollment_count=Count('enrollment')). \
+        order_by('session__name')
+    zones = Zone.objects.order_by('name').prefetch_related(
+        Prefetch('program_set', queryset=Program.objects.order_by('name')),
+        Prefetch('program_set__schedule_set', queryset=schedules))
+    if not closure.is_superuser:
+        zones = zones.filter(id__in=closure.visible['zone'])
+    zone_nodes = []
+    for zone in zones:
+        program_nodes = []
+        for program in zone.program_set.all():
+            if not closure.can_see('program', program.id):
+                continue
+            schedule_nodes = [[schedule.id, schedule.session.name, closure.can_edit('schedule', schedule.id),
+                               schedule.enrollment_count] for schedule in program.schedule_set.all()
+                              if closure.can_see('schedule', schedule.id)]
+            program_nodes.append([program.id, program.name, closure.can_edit('program', program.id),
+                                  sum(node[3] for node in schedule_nodes), schedule_nodes])
+        zone_nodes.append([zone.id, zone.name, closure.can_edit('zone', zone.id),
+                           sum(node[3] for node in program_nodes), program_nodes])
+    return zone_nodes
+
+
+def get_hierarchy(user):
+    closure = get_permission_closure(user)
+    key = get_hierarchy_key(user, closure)
+    zone_nodes = cache.get(key)
+    if zone_nodes is None:
+        zone_nodes = build_hierarchy(closure)
+        cache.set(key, zone_nodes, FRAGMENT_TIMEOUT)
+    return zone_nodes
@@ -0,0 +1,239 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .bulk import bulk_update_fields
+from .fragments import bump_generations, generation_model_dict
+from .models import School, Student, Schedule, Enrollment
+from .search import index_students
+
+# rosters sent by the districts are imported from csv files with a header row. every row is
+# matched to an existing record by its natural key and either updates it or creates a new one.
+# foreign keys are resolved from dictionaries loaded once at the start, the file is read and
+# written a batch at a time, each batch in its own transaction, and rows failing validation are
+# reported with their line number instead of stopping the import
+
+BATCH_SIZE = 400
+
+
+class ImportReport(object):
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.updated = 0
+        # a list of (line number, column, message)
+        self.errors = []
+
+    def __str__(self):
+        return '%d rows read, %d created, %d updated, %d errors' % (self.read, self.created, self.updated,
+                                                                     len(self.errors))
+
+
+class RowError(Exception):
+
+    def __init__(self, column, message):
+        super(RowError, self).__init__(message)
+        self.column = column
+        self.message = message
+
+
+class RosterImporter(object):
+    model = None
+    # the fields identifying a record, as attnames of the model
+    natural_key = ()
+    # the columns copied to model fields of the same name
+    columns = ()
+    # the columns that are part of the natural key, they are never updated
+    key_columns = ()
+    # columns every file has to have besides the ones of the natural key
+    required_columns = ()
+
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+
+    def preload(self):
+        # load the dictionaries resolving the foreign keys of the rows
+        pass
+
+    def resolve(self, row):
+        # return the foreign key values of the row, raise RowError if one doesn't exist
+        return {}
+
+    def after_write(self, ids):
+        pass
+
+    def get_key(self, values):
+        return tuple(values[name] for name in self.natural_key)
+
+    def clean(self, row, line):
+        values = {}
+        errors = []
+        for name in self.present_columns:
+            field = self.model._meta.get_field(name)
+            raw = get_column(row, name)
+            if raw == '':
+                raw = None if field.null else ''
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as e:
+                errors.append((line, name, ' '.join(e.messages)))
+        try:
+            values.update(self.resolve(row))
+        except RowError as e:
+            errors.append((line, e.column, e.message))
+        return values, errors
+
+    def lookup_ids(self, keys):
+        # the ids of the existing records with the given natural keys, the in filters of every key
+        # field may match more rows than asked for so the result is narrowed down by key
+        if not keys:
+            return {}
+        lookups = {name + '__in': {key[index] for key in keys} for index, name in enumerate(self.natural_key)}
+        found = {}
+        for row in self.model.objects.filter(**lookups).values_list('id', *self.natural_key):
+            if row[1:] in keys:
+                found[row[1:]] = row[0]
+        return found
+
+    def write_batch(self, batch, report):
+        # batch is a list of dicts of field values, a key repeated in the batch keeps its last row
+        rows = {}
+        for values in batch:
+            rows[self.get_key(values)] = values
+        existing = self.lookup_ids(set(rows))
+        creates = []
+        updates = []
+        for key, values in rows.items():
+            obj = self.model(**values)
+            if key in existing:
+                obj.id = existing[key]
+                updates.append(obj)
+            else:
+                creates.append(obj)
+        if self.dry_run:
+            report.created += len(creates)
+            report.updated += len(updates)
+            return
+        with transaction.atomic():
+            self.model.objects.bulk_create(creates)
+            if self.update_columns:
+                bulk_update_fields(self.model, updates, self.update_columns)
+            created = self.lookup_ids({key for key in rows if key not in existing})
+            self.after_write(list(created.values()) + [obj.id for obj in updates])
+        # bulk writes don't send the signals bumping the generation of the cached list pages
+        bump_generations([generation_model_dict[self.model]])
+        report.created += len(creates)
+        report.updated += len(updates)
+
+    def run(self, reader, progress=None):
+        # reader is a csv.DictReader, progress is called with the report after every batch
+        report = ImportReport()
+        header = set(reader.fieldnames or [])
+        missing = [name for name in self.required_columns if name not in header]
+        if missing:
+            report.errors.append((1, ', '.join(missing), 'Missing columns'))
+            return report
+        self.present_columns = [name for name in self.columns if name in header]
+        self.update_columns = [name for name in self.present_columns if name not in self.key_columns]
+        self.preload()
+        batch = []
+        for row in reader:
+            report.read += 1
+            values, errors = self.clean(row, reader.line_num)
+            if errors:
+                report.errors.extend(errors)
+            else:
+                batch.append(values)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch, report)
+                batch = []
+                if progress is not None:
+                    progress(report)
+        if batch:
+            self.write_batch(batch, report)
+        if progress is not None:
+            progress(report)
+        return report
+
+
+def get_column(row, name):
+    # a column a short row doesn't reach is None in a csv.DictReader row
+    return (row.get(name) or '').strip()
+
+
+def get_school_ids():
+    return {(district_id, school_code): school_id for school_id, district_id, school_code
+            in School.objects.values_list('id', 'district_id', 'school_code')}
+
+
+class SchoolImporter(RosterImporter):
+    model = School
+    natural_key = ('district_id', 'school_code')
+    columns = ('district_id', 'school_code', 'name', 'address')
+    key_columns = ('district_id', 'school_code')
+    required_columns = ('district_id', 'school_code', 'name')
+
+    def after_write(self, ids):
+        # bulk writes don't send the signal renaming the school of its students in the search
+        index_students(list(Student.objects.filter(school_id__in=ids).values_list('id', flat=True)))
+
+
+class StudentImporter(RosterImporter):
+    # the school of a student is given by its district_id and school_code columns
+    model = Student
+    natural_key = ('school_id', 'local_id')
+    columns = ('local_id', 'last_name', 'first_name', 'middle_name', 'dob', 'gender', 'address', 'phone_number')
+    key_columns = ('local_id',)
+    required_columns = ('district_id', 'school_code', 'local_id', 'last_name', 'first_name', 'dob')
+
+    def preload(self):
+        self.school_ids = get_school_ids()
+
+    def resolve(self, row):
+        try:
+            key = (int(get_column(row, 'district_id')), int(get_column(row, 'school_code')))
+        except (TypeError, ValueError):
+            raise RowError('school_code', 'District id and school code have to be numbers')
+        if key not in self.school_ids:
+            raise RowError('school_code', 'School %d in district %d does not exist' % (key[1], key[0]))
+        return {'school_id': self.school_ids[key]}
+
+    def after_write(self, ids):
+        # bulk writes don't send the signals keeping the student search up to date
+        index_students(ids)
+
+
+class EnrollmentImporter(RosterImporter):
+    # the schedule of an enrollment is given by its zone, program and session columns
+    # and the student by its district_id, school_code and local_id columns
+    model = Enrollment
+    natural_key = ('schedule_id', 'student_id')
+    columns = ('start_date', 'end_date')
+    required_columns = ('zone', 'program', 'session', 'district_id', 'school_code', 'local_id')
+
+    def preload(self):
+        self.schedule_ids = {key[:3]: key[3] for key in Schedule.objects.values_list(
+            'program__zone__name', 'program__name', 'session__name', 'id')}
+        self.student_ids = {key[:3]: key[3] for key in Student.objects.values_list(
+            'school__district_id', 'school__school_code', 'local_id', 'id')}
+
+    def resolve(self, row):
+        schedule_key = (get_column(row, 'zone'), get_column(row, 'program'), get_column(row, 'session'))
+        if schedule_key not in self.schedule_ids:
+            raise RowError('session', 'Schedule of %s %s in %s does not exist' % schedule_key)
+        try:
+            student_key = (int(get_column(row, 'district_id')), int(get_column(row, 'school_code')),
+                           int(get_column(row, 'local_id')))
+        except (TypeError, ValueError):
+            raise RowError('local_id', 'District id, school code and local id have to be numbers')
+        if student_key not in self.student_ids:
+            raise RowError('local_id', 'Student %d of school %d in district %d does not exist' %
+                           (student_key[2], student_key[1], student_key[0]))
+        return {'schedule_id': self.schedule_ids[schedule_key], 'student_id': self.student_ids[student_key]}
+
+
+importer_dict = {
+    'school': SchoolImporter,
+    'student': StudentImporter,
+    'enrollment': EnrollmentImporter,
+}
@@ -0,0 +1,174 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.http import urlencode
+from .models import Student, School, Session, Partner
+
+# the non-leveled models are listed a page at a time with keyset pagination, a page starts
+# right after the sort key of the last row of the previous page so deep pages cost the same
+# as the first one. the sort fields always end with id to make the key unique
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+listing_dict = {
+    'student': {
+        'queryset': lambda: Student.objects.select_related('school'),
+        'sorts': {'name': ('last_name', 'first_name', 'id'),
+                  'local_id': ('local_id', 'id'),
+                  'school': ('school__name', 'last_name', 'first_name', 'id')},
+        'default_sort': 'name',
+        'search_fields': ('last_name__istartswith', 'first_name__istartswith', 'school__name__istartswith'),
+        'number_fields': ('local_id',),
+    },
+    'school': {
+        'queryset': lambda: School.objects.all(),
+        'sorts': {'name': ('name', 'id'),
+                  'code': ('district_id', 'school_code', 'id')},
+        'default_sort': 'name',
+        'search_fields': ('name__istartswith',),
+        'number_fields': ('school_code', 'district_id'),
+    },
+    'session': {
+        'queryset': lambda: Session.objects.all(),
+        'sorts': {'name': ('name', 'id'),
+                  'start_date': ('start_date', 'id')},
+        'default_sort': '-start_date',
+        'search_fields': ('name__icontains',),
+        'number_fields': (),
+    },
+    'partner': {
+        'queryset': lambda: Partner.objects.all(),
+        'sorts': {'name': ('name', 'id')},
+        'default_sort': 'name',
+        'search_fields': ('name__icontains',),
+        'number_fields': (),
+    },
+}
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def get_path_value(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def get_sort_fields(listing, sort):
+    # a sort starting with - is descending, it reverses every field of the key
+    fields = listing['sorts'].get(sort.lstrip('-'))
+    if fields is None:
+        return None
+    if sort.startswith('-'):
+        return tuple('-' + field for field in fields)
+    return fields
+
+
+def keyset_filter(fields, values):
+    # the rows after the key in the order of fields, i.e. for (a, b, id) the rows with
+    # a after x, or a equal to x and b after y, or a and b equal to x and y and id after z
+    query = Q()
+    for index, field in enumerate(fields):
+        lookup = field.lstrip('-') + ('__lt' if field.startswith('-') else '__gt')
+        term = Q(**{lookup: values[index]})
+        for previous_field, previous_value in zip(fields[:index], values[:index]):
+            term &= Q(**{previous_field.lstrip('-'): previous_value})
+        query |= term
+    return query
+
+
+def search_filter(listing, q):
+    # every word of the search has to match one of the search fields, or a number field exactly
+    query = Q()
+    for word in q.split():
+        term = Q()
+        for lookup in listing['search_fields']:
+            term |= Q(**{lookup: word})
+        if word.isdigit():
+            for field in listing['number_fields']:
+                term |= Q(**{field: int(word)})
+        query &= term
+    return query
+
+
+class ListingPage(object):
+
+    def __init__(self, model_name, params):
+        listing = listing_dict[model_name]
+        self.q = params.get('q', '').strip()
+        self.sort = params.get('sort', listing['default_sort'])
+        fields = get_sort_fields(listing, self.sort)
+        if fields is None:
+            self.sort = listing['default_sort']
+            fields = get_sort_fields(listing, self.sort)
+        try:
+            size = max(1, min(int(params.get('size', PAGE_SIZE)), MAX_PAGE_SIZE))
+        except ValueError:
+            size = PAGE_SIZE
+        self.after = params.get('after', '')
+        self.sort_choices = []
+        for key in sorted(listing['sorts']):
+            self.sort_choices.append((key, key.replace('_', ' ')))
+            self.sort_choices.append(('-' + key, key.replace('_', ' ') + ' (descending)'))
+
+        query_set = listing['queryset']()
+        if self.q:
+            query_set = query_set.filter(search_filter(listing, self.q))
+        values = decode_cursor(self.after) if self.after else None
+        if values is not None and len(values) == len(fields):
+            # a cursor made up or of another sort may not fit the fields, it starts at the first page
+            try:
+                query_set = query_set.filter(keyset_filter(fields, values))
+            except (ValueError, TypeError, ValidationError):
+                pass
+        self.fields = fields
+        self.size = size
+        self.query_set = query_set.order_by(*fields)
+        self._items = None
+
+    def load(self):
+        # the page is only read when it is used, a list page with its table cached never reads it
+        if self._items is None:
+            # one row more than the page tells if there is a next page
+            self._items = list(self.query_set[:self.size + 1])
+            self._next_cursor = None
+            if len(self._items) > self.size:
+                self._items = self._items[:self.size]
+                self._next_cursor = encode_cursor([get_path_value(self._items[-1], field.lstrip('-'))
+                                                   for field in self.fields])
+
+    @property
+    def items(self):
+        self.load()
+        return self._items
+
+    @property
+    def next_cursor(self):
+        self.load()
+        return self._next_cursor
+
+    @property
+    def params(self):
+        # what the page depends on besides the rows
+        return self.q, self.sort, self.after, self.size
+
+    @property
+    def next_query(self):
+        return urlencode({'q': self.q, 'sort': self.sort, 'after': self.next_cursor})
+
+    @property
+    def first_query(self):
+        return urlencode({'q': self.q, 'sort': self.sort})
@@ -0,0 +1,44 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from records.benchmark import run_benchmark, compare_results
+from records.synthetic import PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Request every page of the site with concurrent workers and report the latency percentiles, ' \
+           'queries per request and throughput of each, as json that can be compared between runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users',
+                            help='user to request the pages as, can be repeated, admin and coordinator1 by default')
+        parser.add_argument('--password', default=PASSWORD)
+        parser.add_argument('--requests', type=int, default=20, help='requests per page and user')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--output', help='json file to write the results to')
+        parser.add_argument('--compare', help='json file of an earlier run to compare the results with')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['workers'] < 1:
+            raise CommandError('The number of requests and workers has to be at least 1')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (IOError, ValueError) as e:
+                raise CommandError(str(e))
+        results = run_benchmark(options['users'] or ['admin', 'coordinator1'], options['password'],
+                                requests=options['requests'], workers=options['workers'],
+                                progress=lambda result: self.stdout.write(
+                                    '%(name)s as %(user)s: p50 %(p50_ms)sms, p95 %(p95_ms)sms, p99 %(p99_ms)sms, '
+                                    '%(queries_per_request)s queries, %(throughput_rps)s req/s, '
+                                    '%(errors)s errors' % result))
+        if not results:
+            raise CommandError('There is no schedule to request, fill the database with generate_data first')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if baseline is not None:
+            for name, user, before_p95, p95, before_queries, queries in compare_results(baseline, results):
+                self.stdout.write('%s as %s: p95 %sms -> %sms, queries %s -> %s' % (
+                    name, user, before_p95, p95, before_queries, queries))
@@ -0,0 +1,38 @@
+import datetime
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from records.export import EXPORT_FORMATS, export_attendance
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError("Date '%s' is not in yyyy-mm-dd format" % value)
+
+
+class Command(BaseCommand):
+    help = 'Export the attendance for the data warehouse as csv or json lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--start-date', help='first date to export, yyyy-mm-dd')
+        parser.add_argument('--end-date', help='last date to export, yyyy-mm-dd')
+        parser.add_argument('--zone', action='append', help='name of a zone to export, can be repeated, '
+                                                            'all zones by default')
+        parser.add_argument('--gzip', action='store_true', help='compress the export with gzip')
+        parser.add_argument('--output', help='file to write the export to, stdout by default')
+
+    def handle(self, *args, **options):
+        start_date = parse_date(options['start_date']) if options['start_date'] else None
+        end_date = parse_date(options['end_date']) if options['end_date'] else None
+        chunks = export_attendance(options['format'], start_date, end_date, options['zone'], options['gzip'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from records.models import Zone, Student
+from records.synthetic import DatasetGenerator, PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Fill an empty database with a synthetic dataset shaped like production, scale 1 is a fiftieth ' \
+           'of production and the same seed and scale always give the same data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--start-year', type=int, default=2015, help='year of the first fall session')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 1:
+            raise CommandError('The scale has to be at least 1')
+        if Zone.objects.exists() or Student.objects.exists():
+            raise CommandError('The database already has records, generate the data into an empty database')
+        generator = DatasetGenerator(scale=options['scale'], seed=options['seed'], start_year=options['start_year'],
+                                     progress=self.stdout.write)
+        existing = sorted(User.objects.filter(username__in=generator.get_usernames()).values_list('username',
+                                                                                                flat=True))
+        if existing:
+            raise CommandError('The database already has users named %s, generate the data into an empty '
+                               'database' % ', '.join(existing[:5] + (['...'] if len(existing) > 5 else [])))
+        generator.generate()
+        self.stdout.write("Done, every user's password is '%s', the superuser is admin" % PASSWORD)
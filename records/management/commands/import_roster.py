@@ -0,0 +1,35 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from records.importer import BATCH_SIZE, importer_dict
+
+
+class Command(BaseCommand):
+    help = 'Import schools, students or enrollments from a csv file, records are matched on their natural key ' \
+           'and updated, or created if they do not exist yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_name', choices=sorted(importer_dict))
+        parser.add_argument('path', help='csv file with a header row')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='validate the file without writing anything')
+        parser.add_argument('--errors', help='csv file to write the rows that failed validation to')
+
+    def handle(self, *args, **options):
+        importer = importer_dict[options['model_name']](batch_size=options['batch_size'],
+                                                        dry_run=options['dry_run'])
+        try:
+            roster = open(options['path'], newline='', encoding='utf-8-sig')
+        except IOError as e:
+            raise CommandError(str(e))
+        with roster:
+            report = importer.run(csv.DictReader(roster), progress=lambda report: self.stdout.write(str(report)))
+        if options['errors']:
+            with open(options['errors'], 'w', newline='') as error_file:
+                writer = csv.writer(error_file)
+                writer.writerow(['line', 'column', 'message'])
+                writer.writerows(report.errors)
+        else:
+            for line, column, message in report.errors:
+                self.stderr.write('line %d, %s: %s' % (line, column, message))
+        if options['dry_run']:
+            self.stdout.write('Dry run, nothing was written')
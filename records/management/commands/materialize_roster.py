@@ -0,0 +1,38 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from records.models import Schedule
+from records.roster import materialize_schedule
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError("Date '%s' is not in yyyy-mm-dd format" % value)
+
+
+class Command(BaseCommand):
+    help = 'Create the attendance rows of every meeting date of the given schedules or sessions ahead of time, ' \
+           'so opening the attendance page does not write to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', type=int, action='append', default=[],
+                            help='id of a schedule to materialize, can be repeated')
+        parser.add_argument('--session', action='append', default=[],
+                            help='name of a session whose schedules are materialized, can be repeated')
+        parser.add_argument('--start-date', help='first date to materialize, yyyy-mm-dd')
+        parser.add_argument('--end-date', help='last date to materialize, yyyy-mm-dd')
+
+    def handle(self, *args, **options):
+        if not options['schedule'] and not options['session']:
+            raise CommandError('Give at least one --schedule or --session')
+        start_date = parse_date(options['start_date']) if options['start_date'] else None
+        end_date = parse_date(options['end_date']) if options['end_date'] else None
+        schedules = Schedule.objects.filter(id__in=options['schedule']) | \
+            Schedule.objects.filter(session__name__in=options['session'])
+        total = 0
+        for schedule in schedules.select_related('program__zone', 'session'):
+            created = materialize_schedule(schedule, start_date, end_date)
+            total += created
+            self.stdout.write('%s: %d attendance rows created' % (schedule, created))
+        self.stdout.write('%d attendance rows created in total' % total)
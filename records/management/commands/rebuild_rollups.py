@@ -0,0 +1,27 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from records.models import Schedule
+from records.rollup import rebuild_rollups
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError("Date '%s' is not in yyyy-mm-dd format" % value)
+
+
+class Command(BaseCommand):
+    help = 'Count the daily attendance rollups again from the attendance table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', type=int, action='append', default=[],
+                            help='id of a schedule to rebuild, can be repeated, all schedules by default')
+        parser.add_argument('--start-date', help='first date to rebuild, yyyy-mm-dd')
+        parser.add_argument('--end-date', help='last date to rebuild, yyyy-mm-dd')
+
+    def handle(self, *args, **options):
+        schedules = Schedule.objects.filter(id__in=options['schedule']) if options['schedule'] else None
+        start_date = parse_date(options['start_date']) if options['start_date'] else None
+        end_date = parse_date(options['end_date']) if options['end_date'] else None
+        self.stdout.write('%d rollups rebuilt' % rebuild_rollups(schedules, start_date, end_date))
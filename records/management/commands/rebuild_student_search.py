@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand, CommandError
+from records.search import search_available, rebuild_search_table
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full text index of students used by the student autocomplete'
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('Full text search needs sqlite built with fts5')
+        self.stdout.write('%d students indexed' % rebuild_search_table())
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from records.deletion import run_deletion_job, get_runnable_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the deletion jobs no process is running, the pending ones and the ones that failed or whose ' \
+           'process ended before they were done'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, action='append', default=[],
+                            help='id of a job to run, can be repeated, every job no process is running by default')
+
+    def handle(self, *args, **options):
+        jobs = get_runnable_jobs().order_by('id')
+        if options['job']:
+            jobs = jobs.filter(id__in=options['job'])
+        for job_id in jobs.values_list('id', flat=True):
+            job = run_deletion_job(job_id)
+            self.stdout.write('%s: %d of %d rows deleted' % (job, job.deleted, job.total))
@@ -0,0 +1,131 @@
+import datetime
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Session, Schedule, CanceledDate
+
+# the calendar of a schedule holds its meeting dates as a bitmap, bit i is set if the i-th day of
+# the session is a meeting day that is not canceled. it answers if a date is valid, which meeting
+# comes next or before, and how many meetings a range has without touching the database.
+# calendars are cached per schedule and dropped when the schedule, its session or one of its
+# canceled dates changes
+
+CACHE_KEY = 'session_calendar:%d'
+
+# weekdays are counted from sunday to match the datepicker's daysOfWeekDisabled option
+WEEK_DAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+
+
+def weekday_name(date):
+    # python counts weekdays from monday, so shift it to the sunday based list
+    return WEEK_DAYS[date.isoweekday() % 7]
+
+
+class SessionCalendar(object):
+
+    def __init__(self, start_date, end_date, meeting_days, canceled_dates):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.meeting_days = list(meeting_days)
+        self.bits = 0
+        # the canceled dates falling on a meeting day, the only ones the datepicker has to disable
+        self.canceled_dates = []
+        canceled_dates = set(canceled_dates)
+        date = start_date
+        index = 0
+        while date <= end_date:
+            if weekday_name(date) in self.meeting_days:
+                if date in canceled_dates:
+                    self.canceled_dates.append(date)
+                else:
+                    self.bits |= 1 << index
+            date += datetime.timedelta(days=1)
+            index += 1
+        # the weekdays the datepicker disables, as sunday based indexes
+        self.week_disabled = ''.join(str(index) for index, weekday in enumerate(WEEK_DAYS)
+                                     if weekday not in self.meeting_days)
+
+    def get_index(self, date):
+        return (date - self.start_date).days
+
+    def get_date(self, index):
+        return self.start_date + datetime.timedelta(days=index)
+
+    def is_meeting_date(self, date):
+        if date < self.start_date or date > self.end_date:
+            return False
+        return bool(self.bits >> self.get_index(date) & 1)
+
+    def next_meeting_date(self, date):
+        # the first meeting strictly after date, None if there is none left in the session
+        index = max(self.get_index(date) + 1, 0)
+        later = self.bits >> index
+        if not later:
+            return None
+        # later & -later keeps the lowest set bit only
+        return self.get_date(index + (later & -later).bit_length() - 1)
+
+    def previous_meeting_date(self, date):
+        # the last meeting strictly before date, None if the session didn't meet yet
+        index = self.get_index(date)
+        if index <= 0:
+            return None
+        earlier = self.bits & ((1 << index) - 1)
+        if not earlier:
+            return None
+        return self.get_date(earlier.bit_length() - 1)
+
+    def get_range(self, start_date, end_date):
+        # the indexes of start_date and end_date clipped to the session, the whole session by default
+        start = max(self.get_index(start_date or self.start_date), 0)
+        end = self.get_index(min(end_date or self.end_date, self.end_date))
+        return start, end
+
+    def count_meetings(self, start_date=None, end_date=None):
+        # the number of meetings from start_date to end_date inclusive, the denominator of attendance rates
+        start, end = self.get_range(start_date, end_date)
+        if end < start:
+            return 0
+        return bin(self.bits >> start & ((1 << (end - start + 1)) - 1)).count('1')
+
+    def meeting_dates(self, start_date=None, end_date=None):
+        start, end = self.get_range(start_date, end_date)
+        return [self.get_date(index) for index in range(start, end + 1) if self.bits >> index & 1]
+
+
+def build_calendar(schedule):
+    return SessionCalendar(schedule.session.start_date, schedule.session.end_date, schedule.meeting_day,
+                           CanceledDate.objects.filter(schedule=schedule).values_list('date', flat=True))
+
+
+def get_calendar(schedule):
+    # the calendar is kept on the schedule for the rest of the request as well
+    if getattr(schedule, '_calendar', None) is None:
+        key = CACHE_KEY % schedule.id
+        schedule._calendar = cache.get(key)
+        if schedule._calendar is None:
+            schedule._calendar = build_calendar(schedule)
+            cache.set(key, schedule._calendar, None)
+    return schedule._calendar
+
+
+def drop_calendars(schedule_ids):
+    cache.delete_many([CACHE_KEY % schedule_id for schedule_id in schedule_ids])
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+def schedule_changed(sender, instance, **kwargs):
+    instance._calendar = None
+    drop_calendars([instance.id])
+
+
+@receiver(post_save, sender=Session)
+def session_changed(sender, instance, **kwargs):
+    drop_calendars(Schedule.objects.filter(session=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=CanceledDate)
+@receiver(post_delete, sender=CanceledDate)
+def canceled_date_changed(sender, instance, **kwargs):
+    drop_calendars([instance.schedule_id])
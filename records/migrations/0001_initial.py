@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.conf import settings
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('attendance_status', models.CharField(max_length=10, blank=True, choices=[('P', 'Present'), ('E', 'Excused'), ('A', 'Absent')])),
+                ('attendance_comment', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CanceledDate',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('comment', models.TextField(max_length=200, blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Partner',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('description', models.CharField(max_length=200, blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Program',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50)),
+                ('program_description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Schedule',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('address', models.TextField()),
+                # the comma separated weekdays the tables were created with, see 0002
+                ('meeting_day', models.TextField()),
+                ('program', models.ForeignKey(to='records.Program')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='School',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('school_code', models.IntegerField()),
+                ('district_id', models.IntegerField()),
+                ('name', models.CharField(max_length=50)),
+                ('address', models.TextField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Session',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Student',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('local_id', models.IntegerField()),
+                ('last_name', models.CharField(max_length=50)),
+                ('first_name', models.CharField(max_length=50)),
+                ('middle_name', models.CharField(max_length=50, blank=True)),
+                ('dob', models.DateField()),
+                ('gender', models.CharField(max_length=1, blank=True)),
+                ('address', models.TextField(blank=True)),
+                ('phone_number', models.CharField(max_length=20, blank=True)),
+                ('school', models.ForeignKey(to='records.School')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Zone',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('zone_description', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='school',
+            unique_together=set([('district_id', 'school_code')]),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='session',
+            field=models.ForeignKey(to='records.Session'),
+        ),
+        migrations.AddField(
+            model_name='schedule',
+            name='teacher',
+            field=models.ForeignKey(to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='zone',
+            field=models.ForeignKey(to='records.Zone'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='schedule',
+            field=models.ForeignKey(to='records.Schedule'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='student',
+            field=models.ForeignKey(to='records.Student'),
+        ),
+        migrations.AddField(
+            model_name='canceleddate',
+            name='schedule',
+            field=models.ForeignKey(to='records.Schedule'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='enrollment',
+            field=models.ForeignKey(to='records.Enrollment'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='partner',
+            field=models.ForeignKey(blank=True, null=True, to='records.Partner'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='student',
+            unique_together=set([('school', 'local_id')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='schedule',
+            unique_together=set([('session', 'program')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='program',
+            unique_together=set([('name', 'zone')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='enrollment',
+            unique_together=set([('schedule', 'student')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='canceleddate',
+            unique_together=set([('schedule', 'date')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together=set([('enrollment', 'date')]),
+        ),
+    ]
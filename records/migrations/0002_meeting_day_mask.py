@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import records.models
+
+# meeting_day was stored as comma separated weekdays like "Mon,Wed,", it is moved to a
+# bitmask column with one bit per weekday, see records.models.MultipleWeekdaysField. the bits are
+# copied here so the migration keeps converting the rows the same way whatever the model becomes
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def text_to_mask(apps, schema_editor):
+    Schedule = apps.get_model('records', 'Schedule')
+    for schedule in Schedule.objects.all():
+        mask = 0
+        for weekday in schedule.meeting_day.split(','):
+            if weekday in WEEKDAYS:
+                mask |= 1 << WEEKDAYS.index(weekday)
+        Schedule.objects.filter(id=schedule.id).update(meeting_day_mask=mask)
+
+
+def mask_to_text(apps, schema_editor):
+    Schedule = apps.get_model('records', 'Schedule')
+    for schedule in Schedule.objects.all():
+        weekdays = [weekday for index, weekday in enumerate(WEEKDAYS) if schedule.meeting_day_mask & 1 << index]
+        Schedule.objects.filter(id=schedule.id).update(meeting_day=','.join(weekdays) + ',')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='meeting_day_mask',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='schedule',
+            name='meeting_day',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(text_to_mask, mask_to_text),
+        migrations.RemoveField(
+            model_name='schedule',
+            name='meeting_day',
+        ),
+        migrations.RenameField(
+            model_name='schedule',
+            old_name='meeting_day_mask',
+            new_name='meeting_day',
+        ),
+        migrations.AlterField(
+            model_name='schedule',
+            name='meeting_day',
+            field=records.models.MultipleWeekdaysField(),
+        ),
+    ]
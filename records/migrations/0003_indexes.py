@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0002_meeting_day_mask'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='canceleddate',
+            name='date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='school',
+            name='name',
+            field=models.CharField(max_length=50, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='start_date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='local_id',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='enrollment',
+            index_together=set([('schedule', 'start_date', 'end_date')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='program',
+            index_together=set([('zone', 'name')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='student',
+            index_together=set([('school', 'last_name', 'first_name'), ('last_name', 'first_name')]),
+        ),
+    ]
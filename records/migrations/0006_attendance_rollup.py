@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0005_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceRollup',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('present', models.IntegerField(default=0)),
+                ('excused', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('unmarked', models.IntegerField(default=0)),
+                ('schedule', models.ForeignKey(to='records.Schedule')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancerollup',
+            unique_together=set([('schedule', 'date')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count
+
+# the rollups of the attendance taken before the rollup table existed are counted from the
+# attendance table, the same way as records.rollup.rebuild_rollups
+
+STATUS_COUNTS = {'P': 'present', 'E': 'excused', 'A': 'absent', '': 'unmarked'}
+
+
+def count_rollups(apps, schema_editor):
+    Attendance = apps.get_model('records', 'Attendance')
+    AttendanceRollup = apps.get_model('records', 'AttendanceRollup')
+    counts = {}
+    for schedule_id, date, status, number in Attendance.objects. \
+            values_list('enrollment__schedule_id', 'date', 'attendance_status'). \
+            annotate(Count('id')).order_by():
+        rollup = counts.setdefault((schedule_id, date), AttendanceRollup(schedule_id=schedule_id, date=date))
+        name = STATUS_COUNTS.get(status or '', 'unmarked')
+        setattr(rollup, name, getattr(rollup, name) + number)
+    AttendanceRollup.objects.all().delete()
+    AttendanceRollup.objects.bulk_create(counts.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0006_attendance_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_rollups, migrations.RunPython.noop),
+    ]
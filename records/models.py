@@ -15,12 +15,25 @@ from django.core.exceptions import ValidationError
 #          \--enrollment  canceled_data
 #                 |
 #               attendance    partner
+#
+# attendance_rollup holds daily counts of the attendance of each schedule for reports
+
+
+class RecordManager(models.Manager):
+    # the manager of the zones, programs, schedules and sessions shown on the site, the records
+    # whose subtree a deletion job is deleting are left out, see deletion.py. the plain manager
+    # stays the default one so unique checks and the job itself still see them, the foreign keys
+    # to them limit their choices instead
+
+    def get_queryset(self):
+        return super(RecordManager, self).get_queryset().filter(deleting=False)
+
 
 class School(models.Model):
     id = models.AutoField(primary_key=True)
     school_code = models.IntegerField()
     district_id = models.IntegerField()
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, db_index=True)
     address = models.TextField()
 
     class Meta:
@@ -32,7 +45,7 @@ class School(models.Model):
 
 class Student(models.Model):
     id = models.AutoField(primary_key=True)
-    local_id = models.IntegerField()
+    local_id = models.IntegerField(db_index=True)
     school = models.ForeignKey(School)
     last_name = models.CharField(max_length=50)
     first_name = models.CharField(max_length=50)
@@ -44,6 +57,8 @@ class Student(models.Model):
 
     class Meta:
         unique_together = ('school', 'local_id')
+        # the name and school sorts of the student list
+        index_together = [('last_name', 'first_name'), ('school', 'last_name', 'first_name')]
 
     def __str__(self):
         return self.last_name + ' ' + self.first_name + ' ' + self.school.name + ' ' + self.local_id.__str__()
@@ -53,6 +68,10 @@ class Zone(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(unique=True, max_length=50)
     zone_description = models.TextField(blank=True)
+    deleting = models.BooleanField(default=False, editable=False)
+
+    all_objects = models.Manager()
+    objects = RecordManager()
 
     def __str__(self):
         return self.name
@@ -61,11 +80,17 @@ class Zone(models.Model):
 class Program(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=50)
-    zone = models.ForeignKey(Zone)
+    zone = models.ForeignKey(Zone, limit_choices_to={'deleting': False})
     program_description = models.TextField(blank=True)
+    deleting = models.BooleanField(default=False, editable=False)
+
+    all_objects = models.Manager()
+    objects = RecordManager()
 
     class Meta:
         unique_together = ('name', 'zone')
+        # the programs of a zone in order of name
+        index_together = [('zone', 'name')]
 
     def __str__(self):
         return self.zone.name + ' ' + self.name
@@ -75,8 +100,12 @@ class Session(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(unique=True, max_length=50)
     description = models.TextField(blank=True)
-    start_date = models.DateField()
+    start_date = models.DateField(db_index=True)
     end_date = models.DateField()
+    deleting = models.BooleanField(default=False, editable=False)
+
+    all_objects = models.Manager()
+    objects = RecordManager()
 
     def __str__(self):
         return self.name
@@ -92,27 +121,59 @@ WEEKDAYS_CHOICES = (
 )
 
 
+# every weekday is one bit of the mask a MultipleWeekdaysField is stored as, in the order of the choices
+WEEKDAY_BITS = {weekday: 1 << index for index, (weekday, label) in enumerate(WEEKDAYS_CHOICES)}
+
+
+def get_weekday_mask(weekdays):
+    # weekdays is a list of weekday names, or one name
+    if isinstance(weekdays, str):
+        weekdays = [weekdays]
+    mask = 0
+    for weekday in weekdays:
+        if weekday not in WEEKDAY_BITS:
+            raise ValidationError('%(value)s is not a weekday', code='invalid_weekday', params={'value': weekday})
+        mask |= WEEKDAY_BITS[weekday]
+    return mask
+
+
+def get_weekday_list(mask):
+    return [weekday for weekday, label in WEEKDAYS_CHOICES if mask & WEEKDAY_BITS[weekday]]
+
+
 class MultipleWeekdaysField(models.Field):
-    description = "Comma separated weekdays field"
+    description = "Weekdays field stored as a bitmask"
 
+    # the value is a list of weekday names in python and an integer with one bit per weekday
+    # in the database, so schedules can be filtered by weekday with meeting_day__includes
 
     def get_internal_type(self):
-        return 'TextField'
+        return 'PositiveSmallIntegerField'
 
     def from_db_value(self, value, expression, connection, context):
         if value is None:
             return value
-        return value[:-1].split(',')
+        return get_weekday_list(value)
 
     def to_python(self, value):
         if not value:
             return []
+        elif isinstance(value, int):
+            return get_weekday_list(value)
+        elif isinstance(value, str):
+            # the comma separated form of value_to_string
+            return [val for val in value.split(',') if val]
         elif not isinstance(value, (list, tuple)):
-            raise ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+            raise ValidationError('Enter a list of weekdays', code='invalid_list')
         return [smart_text(val) for val in value]
 
     def get_prep_value(self, value):
-        return ','.join(value)+','
+        if value is None or isinstance(value, int):
+            return value
+        return get_weekday_mask(value)
+
+    def value_to_string(self, obj):
+        return ','.join(self._get_val_from_obj(obj) or [])
 
     def formfield(self, **kwargs):
         defaults = {'form_class': forms.MultipleChoiceField}
@@ -121,15 +182,34 @@ class MultipleWeekdaysField(models.Field):
         return super(MultipleWeekdaysField, self).formfield(**defaults)
 
 
+@MultipleWeekdaysField.register_lookup
+class WeekdaysIncludes(models.Lookup):
+    # meeting_day__includes='Tue' matches the schedules meeting on tuesday,
+    # and meeting_day__includes=['Mon', 'Wed'] the ones meeting on both days
+    lookup_name = 'includes'
+
+    def get_prep_lookup(self):
+        return get_weekday_mask(self.rhs)
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '(%s & %s) = %s' % (lhs, rhs, rhs), lhs_params + rhs_params + rhs_params
+
+
 class Schedule(models.Model):
     id = models.AutoField(primary_key=True)
-    program = models.ForeignKey(Program)
-    session = models.ForeignKey(Session)
+    program = models.ForeignKey(Program, limit_choices_to={'deleting': False})
+    session = models.ForeignKey(Session, limit_choices_to={'deleting': False})
     teacher = models.ForeignKey(User)
     address = models.TextField()
     # this is a field of list of available weekdays for this schedule,
     # it will be reflected in take_attendance page
     meeting_day = MultipleWeekdaysField()
+    deleting = models.BooleanField(default=False, editable=False)
+
+    all_objects = models.Manager()
+    objects = RecordManager()
 
     class Meta:
         unique_together = ('session', 'program')
@@ -140,8 +220,9 @@ class Schedule(models.Model):
 
 class CanceledDate(models.Model):
     id = models.AutoField(primary_key=True)
-    schedule = models.ForeignKey(Schedule)
-    date = models.DateField()
+    schedule = models.ForeignKey(Schedule, limit_choices_to={'deleting': False})
+    # the dashboard looks up the schedules canceled at a date
+    date = models.DateField(db_index=True)
     comment = models.TextField(max_length=200, blank=True)
 
     class Meta:
@@ -153,7 +234,7 @@ class CanceledDate(models.Model):
 
 class Enrollment(models.Model):
     id = models.AutoField(primary_key=True)
-    schedule = models.ForeignKey(Schedule)
+    schedule = models.ForeignKey(Schedule, limit_choices_to={'deleting': False})
     student = models.ForeignKey(Student)
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
@@ -162,6 +243,8 @@ class Enrollment(models.Model):
         # every student only have one session a year but may have
         # multiple session schedules if he change classes
         unique_together = ('schedule', 'student')
+        # the active enrollments of a schedule are read from the index alone
+        index_together = [('schedule', 'start_date', 'end_date')]
 
     def __str__(self):
         return self.student.__str__() + ' in ' + self.schedule.__str__()
@@ -184,14 +267,66 @@ class Attendance(models.Model):
         ('A', 'Absent')
     )
     enrollment = models.ForeignKey(Enrollment)
-    date = models.DateField()
+    # attendance is filtered by date alone by exports and reports
+    date = models.DateField(db_index=True)
     attendance_status = models.CharField(max_length=10, choices=STATUS_TYPE, blank=True)
     attendance_comment = models.TextField(blank=True)
     partner = models.ForeignKey(Partner, null=True, blank=True)
+    # every write moves the version on and stamps updated_at, the offline sync detects conflicts
+    # with the version and sends the rows changed since the last sync of a device by updated_at
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('enrollment', 'date')
 
+    def save(self, *args, **kwargs):
+        self.version += 1
+        super(Attendance, self).save(*args, **kwargs)
+
     def __str__(self):
         return self.enrollment.student.__str__() + ' in ' + self.enrollment.schedule.__str__() + \
             ' on date ' + self.date.__str__()
+
+
+class AttendanceRollup(models.Model):
+    # the number of present, excused, absent and unmarked attendance of a schedule at a date,
+    # it is kept up to date by rollup.py whenever attendance is written
+    id = models.AutoField(primary_key=True)
+    schedule = models.ForeignKey(Schedule)
+    date = models.DateField()
+    present = models.IntegerField(default=0)
+    excused = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    unmarked = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('schedule', 'date')
+
+    def __str__(self):
+        return self.schedule.__str__() + ' rollup on date ' + self.date.__str__()
+
+
+class DeletionJob(models.Model):
+    # a zone, program, schedule or session deleted in the background with its subtree, see deletion.py
+    STATUS_TYPE = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    )
+    id = models.AutoField(primary_key=True)
+    model_name = models.CharField(max_length=20)
+    object_id = models.IntegerField()
+    object_name = models.CharField(max_length=200)
+    requested_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(max_length=10, choices=STATUS_TYPE, default='pending')
+    # the number of rows of the subtree, counted when the job starts, and of those deleted so far
+    total = models.IntegerField(default=0)
+    deleted = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Deletion of ' + self.model_name + ' ' + self.object_name
@@ -0,0 +1,121 @@
+import time
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import UserProfile, get_user_profile
+from .models import Zone, Program, Schedule
+
+# the permission closure of a user holds the ids of the zones, programs and schedules the user is
+# able to edit or to see. given zone1-program1-schedule1, a permission of program1 lets the user edit
+# program1 and schedule1 and see zone1, see get_objs_and_perm.
+# closures are cached under the hierarchy version, which is bumped whenever a zone, program or
+# schedule is saved or deleted, and dropped when one of the user's permission fields changes
+
+HIERARCHY_VERSION_KEY = 'permission_closure_version'
+LEVELS = ('zone', 'program', 'schedule')
+
+
+class PermissionClosure(object):
+
+    def __init__(self, is_superuser, editable=None, visible=None):
+        self.is_superuser = is_superuser
+        self.editable = editable or {level: frozenset() for level in LEVELS}
+        self.visible = visible or {level: frozenset() for level in LEVELS}
+
+    def can_edit(self, level, obj_id):
+        return self.is_superuser or obj_id in self.editable[level]
+
+    def can_see(self, level, obj_id):
+        return self.is_superuser or obj_id in self.visible[level]
+
+
+def build_permission_closure(user):
+    # superusers are able to edit everything so their closure doesn't need any id
+    if user.is_superuser:
+        return PermissionClosure(True)
+    profile = get_user_profile(user)
+    zone_ids = profile.zone_permission.values('id')
+    program_ids = profile.program_permission.values('id')
+    schedule_ids = profile.schedule_permission.values('id')
+
+    editable_zones = set(zone_ids.values_list('id', flat=True))
+    editable_programs = set()
+    visible_zones = set(editable_zones)
+    for program_id, zone_id in Program.objects.filter(Q(zone__in=zone_ids) | Q(id__in=program_ids)). \
+            values_list('id', 'zone_id'):
+        editable_programs.add(program_id)
+        visible_zones.add(zone_id)
+    editable_schedules = set()
+    visible_programs = set(editable_programs)
+    for schedule_id, program_id, zone_id in Schedule.objects.filter(Q(program__zone__in=zone_ids) |
+                                                                    Q(program__in=program_ids) |
+                                                                    Q(id__in=schedule_ids)). \
+            values_list('id', 'program_id', 'program__zone_id'):
+        editable_schedules.add(schedule_id)
+        visible_programs.add(program_id)
+        visible_zones.add(zone_id)
+
+    return PermissionClosure(False,
+                             editable={'zone': frozenset(editable_zones),
+                                       'program': frozenset(editable_programs),
+                                       'schedule': frozenset(editable_schedules)},
+                             visible={'zone': frozenset(visible_zones),
+                                      'program': frozenset(visible_programs),
+                                      'schedule': frozenset(editable_schedules)})
+
+
+def get_hierarchy_version():
+    version = cache.get(HIERARCHY_VERSION_KEY)
+    if version is None:
+        # start from the clock so a version lost by the cache never repeats an older one
+        version = int(time.time() * 1000)
+        cache.set(HIERARCHY_VERSION_KEY, version, None)
+    return version
+
+
+def get_closure_key(user_id):
+    return 'permission_closure:%d:%d' % (get_hierarchy_version(), user_id)
+
+
+def get_permission_closure(user):
+    # the closure is kept on the user object for the rest of the request
+    if not hasattr(user, '_permission_closure'):
+        key = get_closure_key(user.id)
+        closure = cache.get(key)
+        if closure is None or closure.is_superuser != user.is_superuser:
+            closure = build_permission_closure(user)
+            cache.set(key, closure, None)
+        user._permission_closure = closure
+    return user._permission_closure
+
+
+def bump_hierarchy_version():
+    try:
+        cache.incr(HIERARCHY_VERSION_KEY)
+    except ValueError:
+        get_hierarchy_version()
+
+
+@receiver(post_save, sender=Zone)
+@receiver(post_save, sender=Program)
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Zone)
+@receiver(post_delete, sender=Program)
+@receiver(post_delete, sender=Schedule)
+def hierarchy_changed(sender, **kwargs):
+    # a new or removed record changes the closure of everyone having a permission above it
+    bump_hierarchy_version()
+
+
+@receiver(m2m_changed, sender=UserProfile.zone_permission.through)
+@receiver(m2m_changed, sender=UserProfile.program_permission.through)
+@receiver(m2m_changed, sender=UserProfile.schedule_permission.through)
+def permission_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # the permission was changed from the zone, program or schedule side for many users
+        bump_hierarchy_version()
+    else:
+        cache.delete(get_closure_key(instance.user_id))
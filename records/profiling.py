@@ -0,0 +1,153 @@
+import json
+import logging
+import random
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+from crispy_forms import utils as crispy_utils
+
+# the profiling middleware records for every request how many queries it made and how long they
+# took, the time spent rendering crispy forms and the time spent rendering templates, and sends
+# them back as Server-Timing headers so they show up in the network tab of the browser, when
+# PROFILING_SERVER_TIMING is on. slow requests are logged as json to the records.profiling logger,
+# a sample of them only so a slow page hit all day doesn't flood the log. queries are timed by the
+# debug cursor django uses when DEBUG is on, which keeps every statement, so a request is profiled
+# only if it sends the headers or is in the sample, decided when it starts. the other sections are
+# timed by wrappers around render_crispy_form and the template backend of the TEMPLATES setting
+
+logger = logging.getLogger('records.profiling')
+
+# requests taking longer than PROFILING_SLOW_REQUEST_MS are slow, the ones among the
+# PROFILING_SAMPLE_RATE of requests profiled for the log are logged
+SLOW_REQUEST_MS = 500
+SAMPLE_RATE = 0.1
+# the timings go out to anyone who loads a page, they are for development
+SERVER_TIMING = False
+# the number of statements listed in the log of a slow request
+SLOWEST_QUERIES = 3
+
+_local = threading.local()
+
+
+class RequestProfile(object):
+
+    def __init__(self, sampled, server_timing):
+        self.start = time.time()
+        self.sampled = sampled
+        self.server_timing = server_timing
+        self.sections = {'crispy': 0.0, 'template': 0.0}
+        # the section being timed, the time of sections nested inside it belongs to it
+        self.current = None
+        self.query_start = len(connection.queries_log)
+        self.force_debug_cursor = connection.force_debug_cursor
+
+
+def get_profile():
+    return getattr(_local, 'profile', None)
+
+
+class section(object):
+    # times the block into the section of the current request, if a request is being profiled
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = None
+
+    def __enter__(self):
+        profile = get_profile()
+        if profile is not None and profile.current is None:
+            self.profile = profile
+            profile.current = self.name
+            self.start = time.time()
+
+    def __exit__(self, *args):
+        if self.profile is not None:
+            self.profile.sections[self.name] += time.time() - self.start
+            self.profile.current = None
+
+
+def render_crispy_form(form, helper=None, context=None):
+    with section('crispy'):
+        return crispy_utils.render_crispy_form(form, helper=helper, context=context)
+
+
+class ProfiledTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with section('template'):
+            return super(ProfiledTemplate, self).render(context, request)
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    # the django template backend timing the templates it renders
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code))
+
+    def get_template(self, template_name, *args, **kwargs):
+        return ProfiledTemplate(self.engine.get_template(template_name, *args, **kwargs))
+
+
+def get_view_name(request):
+    # the name of the view function, with the model for the views shared by several models
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    name = getattr(match.func, '__name__', match.url_name)
+    if 'model_name' in match.kwargs:
+        name = '%s[%s]' % (name, match.kwargs['model_name'])
+    return name
+
+
+def server_timing(name, duration, description=None):
+    timing = '%s;dur=%.1f' % (name, duration * 1000)
+    if description is not None:
+        timing += ';desc="%s"' % description
+    return timing
+
+
+class ProfilingMiddleware(object):
+    # goes first in MIDDLEWARE_CLASSES so the total covers the other middleware as well
+
+    def process_request(self, request):
+        sampled = random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', SAMPLE_RATE)
+        server_timing = getattr(settings, 'PROFILING_SERVER_TIMING', SERVER_TIMING)
+        if sampled or server_timing:
+            _local.profile = RequestProfile(sampled, server_timing)
+            connection.force_debug_cursor = True
+
+    def process_response(self, request, response):
+        profile = get_profile()
+        if profile is None:
+            return response
+        _local.profile = None
+        connection.force_debug_cursor = profile.force_debug_cursor
+        total = time.time() - profile.start
+        queries = list(connection.queries_log)[profile.query_start:]
+        sql_time = sum(float(query['time']) for query in queries)
+        if profile.server_timing:
+            response['Server-Timing'] = ', '.join([
+                server_timing('sql', sql_time, '%d queries' % len(queries)),
+                server_timing('crispy', profile.sections['crispy']),
+                server_timing('template', profile.sections['template']),
+                server_timing('total', total),
+            ])
+        slow_request_ms = getattr(settings, 'PROFILING_SLOW_REQUEST_MS', SLOW_REQUEST_MS)
+        if profile.sampled and total * 1000 >= slow_request_ms:
+            slowest = sorted(queries, key=lambda query: float(query['time']), reverse=True)[:SLOWEST_QUERIES]
+            logger.warning(json.dumps({
+                'view': get_view_name(request),
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'query_count': len(queries),
+                'sql_ms': round(sql_time * 1000, 1),
+                'crispy_ms': round(profile.sections['crispy'] * 1000, 1),
+                'template_ms': round(profile.sections['template'] * 1000, 1),
+                'slowest_queries': [{'sql': query['sql'], 'ms': round(float(query['time']) * 1000, 1)}
+                                    for query in slowest],
+            }))
+        return response
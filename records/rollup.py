@@ -0,0 +1,168 @@
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum, Count
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Enrollment, Attendance, AttendanceRollup
+
+# the attendance rollup of a schedule at a date is counted again from the attendance rows whenever
+# one of them is saved, updated or deleted. every attendance remembers the state it was loaded
+# with, so a write knows which rollups it changes, the one it was counted in and the one it is
+# counted in now. the counts aren't patched with the difference from that state: two requests
+# writing from copies of the same row loaded before either wrote would both count the change. the
+# rollups are locked before they are counted, so of two writes the last one counts both. new rows
+# are added to the rollup as unmarked, see bulk_create_attendance. writes that skip the model
+# signals (bulk_create, update) have to call add_to_rollup or refresh_rollups themselves, after the
+# write, see roster.py. a rollup that doesn't exist yet is counted from the attendance rows
+
+STATUS_COUNTS = {'P': 'present', 'E': 'excused', 'A': 'absent', '': 'unmarked'}
+COUNTS = ('present', 'excused', 'absent', 'unmarked')
+
+
+def get_count_name(status):
+    return STATUS_COUNTS.get(status or '', 'unmarked')
+
+
+def count_attendance(schedule_id, date):
+    # count the attendance of a schedule at a date from the attendance table
+    counts = dict.fromkeys(COUNTS, 0)
+    for status, number in Attendance.objects.filter(enrollment__schedule_id=schedule_id, date=date). \
+            values_list('attendance_status').annotate(Count('id')).order_by():
+        counts[get_count_name(status)] += number
+    return counts
+
+
+def add_to_rollup(deltas):
+    # deltas is a counter of (schedule_id, date, count name) to the number to add to the count
+    grouped = {}
+    for (schedule_id, date, name), number in deltas.items():
+        if number:
+            grouped.setdefault((schedule_id, date), {})[name] = number
+    with transaction.atomic():
+        for (schedule_id, date), numbers in grouped.items():
+            changes = {name: F(name) + number for name, number in numbers.items()}
+            if AttendanceRollup.objects.filter(schedule_id=schedule_id, date=date).update(**changes):
+                continue
+            counts = count_attendance(schedule_id, date)
+            if not any(counts.values()):
+                # the attendance is gone along with its schedule or enrollment
+                continue
+            try:
+                with transaction.atomic():
+                    AttendanceRollup.objects.create(schedule_id=schedule_id, date=date, **counts)
+            except IntegrityError:
+                # another request created the rollup meanwhile, it didn't count our change yet
+                AttendanceRollup.objects.filter(schedule_id=schedule_id, date=date).update(**changes)
+
+
+def count_rollups(pairs):
+    # the counts of the (schedule_id, date) pairs from the attendance table, by pair
+    counts = {pair: dict.fromkeys(COUNTS, 0) for pair in pairs}
+    for schedule_id, date, status, number in Attendance.objects. \
+            filter(enrollment__schedule_id__in={schedule_id for schedule_id, date in pairs},
+                   date__in={date for schedule_id, date in pairs}). \
+            values_list('enrollment__schedule_id', 'date', 'attendance_status').annotate(Count('id')).order_by():
+        if (schedule_id, date) in counts:
+            counts[(schedule_id, date)][get_count_name(status)] += number
+    return counts
+
+
+def refresh_rollups(pairs):
+    # count the rollups of the (schedule_id, date) pairs again, once their attendance is written
+    pairs = {(schedule_id, date) for schedule_id, date in pairs if schedule_id is not None}
+    if not pairs:
+        return
+    with transaction.atomic():
+        # a write committed while the rollups are locked is seen by the count that follows
+        existing = {(schedule_id, date) for schedule_id, date in AttendanceRollup.objects.select_for_update().
+                    filter(schedule_id__in={schedule_id for schedule_id, date in pairs},
+                           date__in={date for schedule_id, date in pairs}).values_list('schedule_id', 'date')}
+        for (schedule_id, date), counts in count_rollups(pairs).items():
+            if (schedule_id, date) in existing:
+                AttendanceRollup.objects.filter(schedule_id=schedule_id, date=date).update(**counts)
+            elif any(counts.values()):
+                try:
+                    with transaction.atomic():
+                        AttendanceRollup.objects.create(schedule_id=schedule_id, date=date, **counts)
+                except IntegrityError:
+                    AttendanceRollup.objects.filter(schedule_id=schedule_id, date=date).update(**counts)
+
+
+def get_schedule_id(attendance, enrollment_id):
+    enrollment = getattr(attendance, '_enrollment_cache', None)
+    if enrollment is not None and enrollment.id == enrollment_id:
+        return enrollment.schedule_id
+    return Enrollment.objects.filter(id=enrollment_id).values_list('schedule_id', flat=True).first()
+
+
+def remember_state(attendance):
+    attendance._rollup_state = (attendance.enrollment_id, attendance.date, attendance.attendance_status)
+
+
+def get_rollup_pairs(attendances):
+    # the (schedule_id, date) of the rollups the attendances change since they were loaded or last
+    # written
+    pairs = set()
+    for attendance in attendances:
+        enrollment_id, date, status = getattr(attendance, '_rollup_state', (None, None, None))
+        new_state = (attendance.enrollment_id, attendance.date, attendance.attendance_status)
+        if enrollment_id is not None and (enrollment_id, date, status) != new_state:
+            pairs.add((get_schedule_id(attendance, enrollment_id), date))
+        if enrollment_id is None or (enrollment_id, date, status) != new_state:
+            pairs.add((get_schedule_id(attendance, attendance.enrollment_id), attendance.date))
+        remember_state(attendance)
+    return pairs
+
+
+def rebuild_rollups(schedules=None, start_date=None, end_date=None):
+    # count the rollups again from the attendance table, optionally for some schedules or dates
+    attendances = Attendance.objects.all()
+    rollups = AttendanceRollup.objects.all()
+    if schedules is not None:
+        attendances = attendances.filter(enrollment__schedule__in=schedules)
+        rollups = rollups.filter(schedule__in=schedules)
+    if start_date is not None:
+        attendances = attendances.filter(date__gte=start_date)
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date is not None:
+        attendances = attendances.filter(date__lte=end_date)
+        rollups = rollups.filter(date__lte=end_date)
+    counts = {}
+    for schedule_id, date, status, number in attendances. \
+            values_list('enrollment__schedule_id', 'date', 'attendance_status'). \
+            annotate(Count('id')).order_by():
+        rollup = counts.setdefault((schedule_id, date), AttendanceRollup(schedule_id=schedule_id, date=date))
+        name = get_count_name(status)
+        setattr(rollup, name, getattr(rollup, name) + number)
+    with transaction.atomic():
+        rollups.delete()
+        AttendanceRollup.objects.bulk_create(counts.values(), batch_size=500)
+    return len(counts)
+
+
+def get_rollup_summary(rollups):
+    # totals of a queryset of rollups, i.e. AttendanceRollup.objects.filter(schedule__program__zone=zone)
+    summary = rollups.aggregate(**{name: Sum(name) for name in COUNTS})
+    summary = {name: summary[name] or 0 for name in COUNTS}
+    marked = summary['present'] + summary['excused'] + summary['absent']
+    summary['attendance_rate'] = float(summary['present']) / marked if marked else None
+    return summary
+
+
+@receiver(post_init, sender=Attendance)
+def attendance_loaded(sender, instance, **kwargs):
+    # a new attendance has no state yet, it counts as a whole when it is first saved
+    if instance.pk is not None:
+        remember_state(instance)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_rollups(get_rollup_pairs([instance]))
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, **kwargs):
+    enrollment_id, date, status = getattr(instance, '_rollup_state', (instance.enrollment_id, instance.date,
+                                                                      instance.attendance_status))
+    refresh_rollups([(get_schedule_id(instance, enrollment_id), date)])
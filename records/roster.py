@@ -0,0 +1,151 @@
+from collections import Counter
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from .models import Enrollment, Attendance, Partner
+from .meeting_calendar import get_calendar
+from .rollup import add_to_rollup, get_rollup_pairs, refresh_rollups
+from .bulk import bulk_update_fields
+
+# the roster of a schedule at a date is the list of attendance rows of its active enrollments,
+# these rows are materialized in bulk instead of one get_or_create per student
+
+def get_active_enrollments(schedule, date):
+    # an enrollment is active if the date is inside its optional start and end date
+    return Enrollment.objects.filter(schedule=schedule). \
+        exclude(start_date__gt=date). \
+        exclude(end_date__lt=date)
+
+
+def get_roster(schedule, date):
+    # the attendance rows of the active enrollments with their students joined in,
+    # so rendering the grid doesn't load each student on its own
+    return Attendance.objects.filter(enrollment__in=get_active_enrollments(schedule, date), date=date). \
+        select_related('enrollment__student')
+
+
+def get_meeting_dates(schedule, start_date=None, end_date=None):
+    # return every date of the schedule's session that is a meeting day and not canceled,
+    # optionally narrowed to the range of start_date and end_date
+    return get_calendar(schedule).meeting_dates(start_date, end_date)
+
+
+def bulk_create_attendance(schedule, missing):
+    # missing is a list of (enrollment_id, date) pairs of the schedule, if another request created
+    # some of the same rows meanwhile the batch is rolled back and we fall back to get_or_create
+    objs = [Attendance(enrollment_id=enrollment_id, date=date) for enrollment_id, date in missing]
+    if not objs:
+        return 0
+    try:
+        with transaction.atomic():
+            Attendance.objects.bulk_create(objs, batch_size=500)
+            # bulk_create doesn't send post_save, so the new unmarked rows are counted here
+            add_to_rollup(Counter((schedule.id, date, 'unmarked') for enrollment_id, date in missing))
+    except IntegrityError:
+        created = 0
+        for enrollment_id, date in missing:
+            created += Attendance.objects.get_or_create(enrollment_id=enrollment_id, date=date)[1]
+        return created
+    return len(objs)
+
+
+def materialize_roster(schedule, date):
+    # find the active enrollments without an attendance row at this date with one anti-join
+    # and create them with one insert, a roster that is already materialized costs one select
+    missing_ids = get_active_enrollments(schedule, date). \
+        exclude(attendance__date=date). \
+        values_list('id', flat=True)
+    return bulk_create_attendance(schedule, [(enrollment_id, date) for enrollment_id in missing_ids])
+
+
+def materialize_schedule(schedule, start_date=None, end_date=None):
+    # materialize the roster of every meeting date of a schedule at once, the enrollments and
+    # the existing attendance of the whole range are read in one query each
+    meeting_dates = get_meeting_dates(schedule, start_date, end_date)
+    if not meeting_dates:
+        return 0
+    enrollments = Enrollment.objects.filter(schedule=schedule).values_list('id', 'start_date', 'end_date')
+    existing = set(Attendance.objects.filter(enrollment__schedule=schedule,
+                                             date__range=(meeting_dates[0], meeting_dates[-1])).
+                   values_list('enrollment_id', 'date'))
+    missing = []
+    for enrollment_id, enroll_start, enroll_end in enrollments:
+        for date in meeting_dates:
+            if enroll_start is not None and enroll_start > date:
+                continue
+            if enroll_end is not None and enroll_end < date:
+                continue
+            if (enrollment_id, date) not in existing:
+                missing.append((enrollment_id, date))
+    return bulk_create_attendance(schedule, missing)
+
+
+def bulk_update_attendance(objs, fields=('attendance_status', 'attendance_comment', 'partner')):
+    # write the given fields of the attendance objects with batched CASE updates
+    objs = list(objs)
+    now = timezone.now()
+    for obj in objs:
+        obj.version += 1
+        obj.updated_at = now
+    pairs = get_rollup_pairs(objs)
+    with transaction.atomic():
+        # update doesn't move the version on and stamp the rows, see Attendance
+        updated = bulk_update_fields(Attendance, objs, fields, version=F('version') + 1, updated_at=now)
+        # nor does it send post_save, so the rollups of the changed rows are counted here
+        refresh_rollups(pairs)
+    return updated
+
+
+ATTENDANCE_STATUSES = {status for status, label in Attendance.STATUS_TYPE} | {''}
+
+
+def get_change_error(change, partner_ids):
+    # the problem with the status, partner_id and comment of a change, None if they are valid
+    if 'status' in change and (not isinstance(change['status'], str) or change['status'] not in ATTENDANCE_STATUSES):
+        return 'Status is invalid'
+    if change.get('partner_id') is not None and (not isinstance(change['partner_id'], int) or
+                                                 change['partner_id'] not in partner_ids):
+        return 'Partner does not exist'
+    if 'comment' in change and not isinstance(change['comment'], str):
+        return 'Comment has to be text'
+    return None
+
+
+def apply_change(attendance, change):
+    # set the values of the change on the attendance, a missing key leaves the value as it is,
+    # returns if anything changed
+    values = (change.get('status', attendance.attendance_status),
+              change.get('partner_id', attendance.partner_id),
+              change.get('comment', attendance.attendance_comment))
+    if values == (attendance.attendance_status, attendance.partner_id, attendance.attendance_comment):
+        return False
+    attendance.attendance_status, attendance.partner_id, attendance.attendance_comment = values
+    return True
+
+
+def apply_attendance_batch(schedule, date, changes):
+    # changes is a list of dicts with an enrollment_id and the status, partner_id and comment to
+    # set, a missing key leaves the value as it is. the batch is checked as a whole before anything
+    # is written, the changed rows are written in one transaction and (changed count, errors) is
+    # returned, errors being a list of (index of the change, message)
+    errors = []
+    with transaction.atomic():
+        materialize_roster(schedule, date)
+        roster = {attendance.enrollment_id: attendance for attendance in get_roster(schedule, date)}
+        partner_ids = set(Partner.objects.values_list('id', flat=True))
+        changed = {}
+        for index, change in enumerate(changes):
+            if not isinstance(change, dict) or not isinstance(change.get('enrollment_id'), int) or \
+                    change['enrollment_id'] not in roster:
+                errors.append((index, 'Enrollment is not on the roster'))
+                continue
+            error = get_change_error(change, partner_ids)
+            if error is not None:
+                errors.append((index, error))
+                continue
+            attendance = roster[change['enrollment_id']]
+            if apply_change(attendance, change):
+                changed[attendance.id] = attendance
+        if errors:
+            return 0, errors
+        return bulk_update_attendance(changed.values()), errors
@@ -0,0 +1,158 @@
+import re
+from django.db import connection, transaction, OperationalError
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .models import Student, School
+
+# students are searched through a sqlite fts5 table holding their name, local id and school name,
+# the rowid of a row is the id of its student. the table is created after migrate and kept in sync
+# by the signals below, bulk writes that skip signals have to call index_students themselves.
+# on other databases, or if sqlite was built without fts5, search_available() is false and the
+# callers fall back to the plain listing search
+
+SEARCH_TABLE = 'records_student_search'
+VOCAB_TABLE = 'records_student_search_vocab'
+# bm25 weights of the name, local_id and school columns
+RANK = 'bm25(%s, 10.0, 5.0, 1.0)' % SEARCH_TABLE
+
+_available = None
+
+
+def search_available():
+    global _available
+    if _available is None:
+        _available = connection.vendor == 'sqlite' and create_search_table()
+    return _available
+
+
+def create_search_table():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(name, local_id, school, "
+                           "tokenize='unicode61 remove_diacritics 1', prefix='2 3')" % SEARCH_TABLE)
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5vocab(%s, 'row')" %
+                           (VOCAB_TABLE, SEARCH_TABLE))
+    except OperationalError:
+        return False
+    return True
+
+
+def rebuild_search_table():
+    # refill the whole table from the student table with one statement
+    if not search_available():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("DELETE FROM %s" % SEARCH_TABLE)
+        cursor.execute("INSERT INTO %s(rowid, name, local_id, school) "
+                       "SELECT student.id, student.first_name || ' ' || student.middle_name || ' ' || "
+                       "student.last_name, student.local_id, school.name "
+                       "FROM records_student student JOIN records_school school ON school.id = student.school_id"
+                       % SEARCH_TABLE)
+        cursor.execute("SELECT count(*) FROM %s" % SEARCH_TABLE)
+        return cursor.fetchone()[0]
+
+
+def index_students(student_ids):
+    # (re)index the given students, used by the signals and by bulk imports
+    if not search_available() or not student_ids:
+        return
+    student_ids = list(student_ids)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(student_ids), 500):
+            batch = student_ids[start:start + 500]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute("DELETE FROM %s WHERE rowid IN (%s)" % (SEARCH_TABLE, placeholders), batch)
+            cursor.execute("INSERT INTO %s(rowid, name, local_id, school) "
+                           "SELECT student.id, student.first_name || ' ' || student.middle_name || ' ' || "
+                           "student.last_name, student.local_id, school.name "
+                           "FROM records_student student JOIN records_school school "
+                           "ON school.id = student.school_id WHERE student.id IN (%s)"
+                           % (SEARCH_TABLE, placeholders), batch)
+
+
+def edit_distance(a, b, limit):
+    # levenshtein distance of a and b, anything above limit is reported as limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def get_similar_terms(cursor, word, limit=5):
+    # indexed terms one typo away from the word, or two for long words. candidates share the
+    # first letter of the word, typos in the first letter are rare and it keeps the scan short
+    distance = 1 if len(word) < 8 else 2
+    cursor.execute("SELECT term FROM %s WHERE term >= %%s AND term < %%s AND length(term) BETWEEN %%s AND %%s"
+                   % VOCAB_TABLE, [word[0], word[0] + '\uffff', len(word) - distance, len(word) + distance])
+    scored = []
+    for (term,) in cursor.fetchall():
+        score = edit_distance(word, term, distance)
+        if score <= distance:
+            scored.append((score, term))
+    return [term for score, term in sorted(scored)[:limit]]
+
+
+def build_match_query(cursor, q):
+    # every word matches as a prefix, a word of four letters or more that is not the prefix of any
+    # indexed term is replaced by the terms it is most likely a typo of
+    terms = []
+    for word in re.findall(r'\w+', q.lower()):
+        cursor.execute("SELECT 1 FROM %s WHERE term >= %%s AND term < %%s LIMIT 1" % VOCAB_TABLE,
+                       [word, word + '\uffff'])
+        if cursor.fetchone() is None and len(word) >= 4:
+            similar = get_similar_terms(cursor, word)
+            if similar:
+                terms.append('(' + ' OR '.join('"%s"' % term for term in similar) + ')')
+                continue
+        terms.append('"%s"*' % word)
+    return ' '.join(terms)
+
+
+def search_students(q, offset=0, limit=20):
+    # return the students matching q ordered by rank, with their schools
+    with connection.cursor() as cursor:
+        match = build_match_query(cursor, q)
+        if not match:
+            return []
+        cursor.execute("SELECT rowid FROM %s WHERE %s MATCH %%s ORDER BY %s LIMIT %%s OFFSET %%s"
+                       % (SEARCH_TABLE, SEARCH_TABLE, RANK), [match, limit, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+    students = Student.objects.select_related('school').in_bulk(ids)
+    return [students[student_id] for student_id in ids if student_id in students]
+
+
+@receiver(post_migrate)
+def create_search_table_after_migrate(sender, **kwargs):
+    global _available
+    if sender.name == 'records' and connection.vendor == 'sqlite':
+        _available = create_search_table()
+        if _available:
+            rebuild_search_table()
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, **kwargs):
+    index_students([instance.id])
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    if search_available():
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s WHERE rowid = %%s" % SEARCH_TABLE, [instance.id])
+
+
+@receiver(post_save, sender=School)
+def school_saved(sender, instance, created, **kwargs):
+    if not created and search_available():
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE %s SET school = %%s WHERE rowid IN "
+                           "(SELECT id FROM records_student WHERE school_id = %%s)" % SEARCH_TABLE,
+                           [instance.name, instance.id])
@@ -0,0 +1,132 @@
+import datetime
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .listing import encode_cursor, decode_cursor
+from .meeting_calendar import get_calendar
+from .models import Enrollment, Attendance, Partner
+from .permissions import get_permission_closure
+from .roster import bulk_create_attendance, bulk_update_attendance, get_change_error, apply_change
+
+# devices taking attendance offline queue their changes and send them in one sync request with
+# the schedules they follow and the cursor of their last sync. a change names its row by
+# enrollment_id and date, which may not exist yet, and carries the version of the row the device
+# last saw. a change made on an older version than the stored one is a conflict, it is not
+# applied and the stored row is sent back instead. the response holds every row of the followed
+# schedules changed since the cursor and the cursor of the next sync. the cursor lags behind the
+# clock by SYNC_OVERLAP so a row written by a transaction still open at the time of the sync is
+# sent by the next one, devices ignore the rows they already have in the same version
+
+SYNC_OVERLAP = datetime.timedelta(seconds=60)
+# the most changes and schedules a sync takes, more have to be split over several syncs
+MAX_SYNC_CHANGES = 500
+MAX_SYNC_SCHEDULES = 100
+SYNC_COLUMNS = ['enrollment_id', 'schedule_id', 'date', 'status', 'partner_id', 'comment', 'version']
+
+
+def get_sync_cursor():
+    return encode_cursor([timezone.now() - SYNC_OVERLAP])
+
+
+def parse_sync_cursor(cursor):
+    # the time of a cursor, None for a first sync or a cursor that isn't one
+    values = decode_cursor(cursor) if isinstance(cursor, str) and cursor else None
+    if not values or not isinstance(values[0], str):
+        return None
+    return parse_datetime(values[0])
+
+
+def get_row(attendance, schedule_id):
+    return [attendance.enrollment_id, schedule_id, attendance.date.isoformat(), attendance.attendance_status,
+            attendance.partner_id, attendance.attendance_comment, attendance.version]
+
+
+def parse_change(change):
+    # the (enrollment_id, date) of a change, raises ValueError if they or its version are invalid
+    if not isinstance(change, dict) or not isinstance(change.get('enrollment_id'), int) or \
+            not isinstance(change.get('version'), int):
+        raise ValueError('A change needs an enrollment_id, a date and a version')
+    date = parse_date(change.get('date')) if isinstance(change.get('date'), str) else None
+    if date is None:
+        raise ValueError('Date is invalid')
+    return change['enrollment_id'], date
+
+
+def apply_sync_changes(user, changes):
+    # apply the changes the user is able to make, returns (applied count, conflicting rows, errors)
+    # with errors a list of (index of the change, message)
+    closure = get_permission_closure(user)
+    errors = []
+    keys = {}
+    for index, change in enumerate(changes):
+        try:
+            keys[index] = parse_change(change)
+        except ValueError as e:
+            errors.append((index, str(e)))
+    enrollments = Enrollment.objects.select_related('schedule__session'). \
+        in_bulk({enrollment_id for enrollment_id, date in keys.values()})
+    partner_ids = set(Partner.objects.values_list('id', flat=True))
+    valid = []
+    for index in sorted(keys):
+        enrollment_id, date = keys[index]
+        enrollment = enrollments.get(enrollment_id)
+        if enrollment is None or not closure.can_edit('schedule', enrollment.schedule_id):
+            errors.append((index, "You don't have permission"))
+        elif not get_calendar(enrollment.schedule).is_meeting_date(date) or \
+                (enrollment.start_date is not None and enrollment.start_date > date) or \
+                (enrollment.end_date is not None and enrollment.end_date < date):
+            errors.append((index, 'Selected date is invalid'))
+        else:
+            error = get_change_error(changes[index], partner_ids)
+            if error is not None:
+                errors.append((index, error))
+            else:
+                valid.append(index)
+    if not valid:
+        return 0, [], sorted(errors)
+
+    with transaction.atomic():
+        rows = get_rows({keys[index] for index in valid})
+        missing = defaultdict(list)
+        for index in valid:
+            if keys[index] not in rows:
+                missing[enrollments[keys[index][0]].schedule].append(keys[index])
+        if missing:
+            for schedule, pairs in missing.items():
+                bulk_create_attendance(schedule, sorted(set(pairs)))
+            rows = get_rows({keys[index] for index in valid})
+        changed = {}
+        conflicts = {}
+        for index in valid:
+            attendance = rows[keys[index]]
+            if changes[index]['version'] != attendance.version:
+                conflicts[attendance.id] = attendance
+            elif apply_change(attendance, changes[index]):
+                changed[attendance.id] = attendance
+        applied = bulk_update_attendance(changed.values())
+    return applied, [get_row(attendance, attendance.enrollment.schedule_id)
+                     for attendance in conflicts.values()], sorted(errors)
+
+
+def get_rows(keys):
+    # the attendance rows of the (enrollment_id, date) pairs by pair, locked until the end of the
+    # transaction where the database supports it
+    rows = Attendance.objects.select_for_update().select_related('enrollment'). \
+        filter(enrollment_id__in={enrollment_id for enrollment_id, date in keys},
+               date__in={date for enrollment_id, date in keys})
+    return {(attendance.enrollment_id, attendance.date): attendance for attendance in rows
+            if (attendance.enrollment_id, attendance.date) in keys}
+
+
+def get_changed_rows(user, schedule_ids, since=None):
+    # the rows of the schedules the user is able to edit written since the time since
+    closure = get_permission_closure(user)
+    schedule_ids = [schedule_id for schedule_id in schedule_ids if closure.can_edit('schedule', schedule_id)]
+    rows = Attendance.objects.filter(enrollment__schedule__in=schedule_ids)
+    if since is not None:
+        rows = rows.filter(updated_at__gte=since)
+    return [[enrollment_id, schedule_id, date.isoformat(), status, partner_id, comment, version]
+            for enrollment_id, schedule_id, date, status, partner_id, comment, version in rows.order_by('id').
+            values_list('enrollment_id', 'enrollment__schedule_id', 'date', 'attendance_status', 'partner_id',
+                        'attendance_comment', 'version')]
@@ -0,0 +1,201 @@
+import datetime
+import random
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from accounts.models import UserProfile
+from .models import School, Student, Zone, Program, Session, Schedule, CanceledDate, Enrollment, Partner, \
+    Attendance, WEEKDAYS_CHOICES
+from .fragments import bump_generations, generation_model_dict
+from .meeting_calendar import SessionCalendar
+from .permissions import bump_hierarchy_version
+from .rollup import rebuild_rollups
+from .search import rebuild_search_table
+
+# a synthetic dataset shaped like the production one, for measuring the site at its size locally.
+# scale 1 is a fiftieth of production: one zone of ten programs, four sessions, forty schedules of
+# twenty five students each, a thousand students and around thirty thousand attendance rows, so
+# scale 50 gives the 50 zones, 500 programs, 2000 schedules and 50k students of production.
+# the same seed and scale always give the same data. rows are written with bulk_create, which
+# skips the signals, so the search index, the rollups, the permission closures and the cached
+# list pages are rebuilt at the end
+
+SCALE_UNIT = {
+    'zones': 1,
+    'programs_per_zone': 10,
+    'sessions': 4,
+    'schools': 20,
+    'students': 1000,
+    'students_per_schedule': 25,
+    'canceled_dates_per_schedule': 2,
+    'partners': 5,
+}
+# the counts growing with the scale, the others are per zone or per schedule
+SCALED_COUNTS = ('zones', 'schools', 'students', 'partners')
+# the attendance statuses drawn for the rows with their weights, '' is unmarked
+STATUS_WEIGHTS = (('P', 85), ('A', 8), ('E', 5), ('', 2))
+# the password of every generated user
+PASSWORD = 'password'
+BATCH_SIZE = 500
+
+
+def get_sessions(count, start_year):
+    # fall and spring sessions in turn, starting with the fall of start_year
+    sessions = []
+    for index in range(count):
+        year = start_year + (index + 1) // 2
+        if index % 2 == 0:
+            sessions.append(Session(name='Fall %d' % year, start_date=datetime.date(year, 9, 1),
+                                    end_date=datetime.date(year, 12, 15)))
+        else:
+            sessions.append(Session(name='Spring %d' % year, start_date=datetime.date(year, 1, 10),
+                                    end_date=datetime.date(year, 5, 15)))
+    return sessions
+
+
+def create_all(model, objs):
+    # bulk_create doesn't set the ids of the rows on sqlite, they are read back in order of creation
+    last_id = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    model.objects.bulk_create(objs, batch_size=BATCH_SIZE)
+    return list(model.objects.filter(id__gt=last_id).order_by('id'))
+
+
+class DatasetGenerator(object):
+
+    def __init__(self, scale=1, seed=0, start_year=2015, progress=None):
+        self.counts = {name: value * scale if name in SCALED_COUNTS else value for name, value in SCALE_UNIT.items()}
+        self.random = random.Random(seed)
+        self.start_year = start_year
+        self.progress = progress or (lambda message: None)
+
+    def weighted_status(self):
+        number = self.random.randrange(sum(weight for status, weight in STATUS_WEIGHTS))
+        for status, weight in STATUS_WEIGHTS:
+            if number < weight:
+                return status
+            number -= weight
+
+    def generate(self):
+        with transaction.atomic():
+            self.create_hierarchy()
+            self.create_users()
+            self.create_schedules()
+            self.create_enrollments()
+            self.create_attendance()
+        self.progress('%d students indexed for search' % rebuild_search_table())
+        self.progress('%d rollups counted' % rebuild_rollups())
+        bump_hierarchy_version()
+        bump_generations(generation_model_dict.values())
+
+    def create_hierarchy(self):
+        self.schools = create_all(School, [
+            School(school_code=index + 1, district_id=index % 5 + 1, name='School %d' % (index + 1),
+                   address='%d Main Street' % (index + 1))
+            for index in range(self.counts['schools'])])
+        self.students = create_all(Student, [
+            Student(local_id=100000 + index, school=self.random.choice(self.schools),
+                    last_name='Last%d' % index, first_name='First%d' % self.random.randrange(2000),
+                    dob=datetime.date(2003, 1, 1) + datetime.timedelta(days=self.random.randrange(2500)),
+                    gender=self.random.choice('MF'))
+            for index in range(self.counts['students'])])
+        self.zones = create_all(Zone, [Zone(name='Zone %d' % (index + 1)) for index in range(self.counts['zones'])])
+        self.programs = create_all(Program, [
+            Program(name='Program %d' % (index + 1), zone=zone)
+            for zone in self.zones for index in range(self.counts['programs_per_zone'])])
+        self.sessions = create_all(Session, get_sessions(self.counts['sessions'], self.start_year))
+        self.partners = create_all(Partner, [Partner(name='Partner %d' % (index + 1))
+                                             for index in range(self.counts['partners'])])
+        self.progress('%d schools, %d students, %d zones, %d programs, %d sessions' % (
+            len(self.schools), len(self.students), len(self.zones), len(self.programs), len(self.sessions)))
+
+    def get_usernames(self):
+        # per zone a coordinator and two managers, and a teacher for every two programs. the first
+        # user is the superuser
+        usernames = ['admin']
+        for zone_index in range(self.counts['zones']):
+            usernames.append('coordinator%d' % (zone_index + 1))
+            usernames.extend('manager%d' % (zone_index * 2 + index + 1) for index in range(2))
+        programs = self.counts['zones'] * self.counts['programs_per_zone']
+        usernames.extend('teacher%d' % (index + 1) for index in range(programs // 2))
+        return usernames
+
+    def create_users(self):
+        # the coordinator of a zone has the permission of the zone, a manager the permission of a
+        # program and a teacher the permission of the schedules they teach
+        password = make_password(PASSWORD)
+        users = create_all(User, [User(username=username, password=password, is_superuser=username == 'admin',
+                                       is_staff=username == 'admin') for username in self.get_usernames()])
+        self.profiles = {profile.user_id: profile for profile in create_all(
+            UserProfile, [UserProfile(user=user, student_permission=user.username.startswith('coordinator'))
+                          for user in users])}
+        self.users = {user.username: user for user in users}
+        self.teachers = [user for user in users if user.username.startswith('teacher')]
+        zone_permissions = []
+        program_permissions = []
+        for zone_index, zone in enumerate(self.zones):
+            profile = self.profiles[self.users['coordinator%d' % (zone_index + 1)].id]
+            zone_permissions.append(UserProfile.zone_permission.through(userprofile=profile, zone=zone))
+            programs = [program for program in self.programs if program.zone_id == zone.id]
+            for index in range(2):
+                profile = self.profiles[self.users['manager%d' % (zone_index * 2 + index + 1)].id]
+                program_permissions.append(UserProfile.program_permission.through(
+                    userprofile=profile, program=self.random.choice(programs)))
+        UserProfile.zone_permission.through.objects.bulk_create(zone_permissions, batch_size=BATCH_SIZE)
+        UserProfile.program_permission.through.objects.bulk_create(program_permissions, batch_size=BATCH_SIZE)
+        self.progress('%d users with mixed permissions' % len(users))
+
+    def create_schedules(self):
+        weekdays = [weekday for weekday, label in WEEKDAYS_CHOICES if weekday not in ('Sat', 'Sun')]
+        schedules = []
+        for program_index, program in enumerate(self.programs):
+            teacher = self.teachers[program_index // 2 % len(self.teachers)]
+            for session in self.sessions:
+                schedules.append(Schedule(program=program, session=session, teacher=teacher,
+                                          address='%d Main Street' % self.random.randrange(1, 1000),
+                                          meeting_day=sorted(self.random.sample(weekdays, 2),
+                                                             key=weekdays.index)))
+        self.schedules = create_all(Schedule, schedules)
+        sessions = {session.id: session for session in self.sessions}
+        self.calendars = {}
+        canceled_dates = []
+        schedule_permissions = []
+        for schedule in self.schedules:
+            session = sessions[schedule.session_id]
+            calendar = SessionCalendar(session.start_date, session.end_date, schedule.meeting_day, [])
+            canceled = set(self.random.sample(calendar.meeting_dates(), self.counts['canceled_dates_per_schedule']))
+            canceled_dates.extend(CanceledDate(schedule=schedule, date=date, comment='Holiday')
+                                  for date in sorted(canceled))
+            self.calendars[schedule.id] = SessionCalendar(session.start_date, session.end_date,
+                                                          schedule.meeting_day, canceled)
+            schedule_permissions.append(UserProfile.schedule_permission.through(
+                userprofile=self.profiles[schedule.teacher_id], schedule=schedule))
+        CanceledDate.objects.bulk_create(canceled_dates, batch_size=BATCH_SIZE)
+        UserProfile.schedule_permission.through.objects.bulk_create(schedule_permissions, batch_size=BATCH_SIZE)
+        self.progress('%d schedules, %d canceled dates' % (len(self.schedules), len(canceled_dates)))
+
+    def create_enrollments(self):
+        enrollments = []
+        for schedule in self.schedules:
+            for student in self.random.sample(self.students, self.counts['students_per_schedule']):
+                enrollments.append(Enrollment(schedule=schedule, student=student))
+        self.enrollments = create_all(Enrollment, enrollments)
+        self.progress('%d enrollments' % len(self.enrollments))
+
+    def create_attendance(self):
+        # one row per enrollment and meeting date, written a batch at a time to keep memory flat
+        batch = []
+        total = 0
+        for enrollment in self.enrollments:
+            for date in self.calendars[enrollment.schedule_id].meeting_dates():
+                partner = self.random.choice(self.partners) if self.random.random() < 0.1 else None
+                batch.append(Attendance(enrollment_id=enrollment.id, date=date, partner=partner,
+                                        attendance_status=self.weighted_status()))
+                if len(batch) >= BATCH_SIZE:
+                    Attendance.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+                    if total % 100000 == 0:
+                        self.progress('%d attendance rows' % total)
+        Attendance.objects.bulk_create(batch)
+        total += len(batch)
+        self.progress('%d attendance rows' % total)
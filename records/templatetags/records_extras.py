@@ -3,6 +3,9 @@ from urllib.parse import quote
 import re
 from django import template
 from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from records.fragments import FRAGMENT_TIMEOUT
 
 register = template.Library()
 
@@ -13,3 +16,33 @@ register = template.Library()
 def url_quote(value):
     return quote(value, safe='')
 
+
+
+class RecordCacheNode(template.Node):
+
+    def __init__(self, nodelist, key_var):
+        self.nodelist = nodelist
+        self.key_var = key_var
+
+    def render(self, context):
+        key = self.key_var.resolve(context)
+        if not key:
+            return self.nodelist.render(context)
+        key = make_template_fragment_key('record_list', [key])
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, FRAGMENT_TIMEOUT)
+        return value
+
+
+@register.tag
+def record_cache(parser, token):
+    # {% record_cache key %}...{% endrecord_cache %} caches the content under key, see
+    # records/fragments.py, the content is rendered every time if key is empty
+    nodelist = parser.parse(('endrecord_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) != 2:
+        raise template.TemplateSyntaxError("'%s' tag requires a key" % tokens[0])
+    return RecordCacheNode(nodelist, parser.compile_filter(tokens[1]))
@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import Zone
+
+# the query budget tests of the apps request every url of their budget table as a superuser and as
+# a user with a narrower permission, first over a small dataset and then over one several times
+# larger. a view has to run the number of queries of its budget both times, whatever the number of
+# rows it shows. the users log in as 'admin' and 'coordinator' with the password 'password'.
+# a test case gives its budget table with get_budgets and adds the rows of a scale with grow, it is
+# called with the scales of budget_scales in order. a test case without budgets is skipped
+
+
+class QueryBudgetMixin(object):
+    budget_scales = (1, 3)
+    # (username, column of the budget table)
+    budget_users = (('admin', 1), ('coordinator', 2))
+
+    def grow(self, scale):
+        # add the rows of the given scale to the dataset, the urls are requested as they are otherwise
+        pass
+
+    def get_budgets(self):
+        # a list of (url, queries as the first user, queries as the second user)
+        return []
+
+    def test_query_budgets(self):
+        for scale in self.budget_scales:
+            self.grow(scale)
+            budgets = self.get_budgets()
+            if not budgets:
+                self.skipTest('no query budgets')
+            for username, column in self.budget_users:
+                self.client.login(username=username, password='password')
+                for budget in budgets:
+                    # the budgets are the ones of a warm cache, the first request fills it
+                    self.client.get(budget[0])
+                    with CaptureQueriesContext(connection) as captured:
+                        response = self.client.get(budget[0])
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    self.assertEqual(response.status_code, 200, budget[0])
+                    self.assertEqual(len(captured), budget[column], '%s as %s over %d zones' %
+                                     (budget[0], username, Zone.objects.count()))
+                self.client.logout()
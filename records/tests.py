@@ -1,3 +1,1109 @@
-from django.test import TestCase
+import ast
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import warnings
+from unittest import skipUnless
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.contrib.auth.models import User
+from accounts.models import get_user_profile
+from .permissions import get_permission_closure
+from .search import search_available
+from .models import School, Student, Zone, Program, Session, Schedule, Enrollment, Attendance, Partner, \
+    AttendanceRollup, CanceledDate, DeletionJob
+from .rollup import rebuild_rollups, get_rollup_summary, count_attendance
+from .importer import SchoolImporter, StudentImporter, EnrollmentImporter
+from .meeting_calendar import get_calendar
+from .listing import ListingPage, encode_cursor
+from .synthetic import DatasetGenerator
+from .deletion import run_deletion_job, claim_job
+from .roster import materialize_schedule, bulk_update_attendance
+from .benchmark import get_endpoints, percentile
+from .forms import crispy_form_factory, CSRF_PLACEHOLDER
+from .views import widgets_dict
+from .profiling import ProfilingMiddleware, get_profile
+from .testing import QueryBudgetMixin
 
-# Create your tests here.
+
+class RecordsTestCase(TestCase):
+    # a zone-program-schedule chain meeting on monday and wednesday with an empty roster,
+    # tests add the students they need with enroll()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'password')
+        cls.school = School.objects.create(school_code=1, district_id=1, name='School', address='Nashville')
+        cls.zone = Zone.objects.create(name='Zone A')
+        cls.program = Program.objects.create(name='Program 1', zone=cls.zone)
+        cls.session = Session.objects.create(name='Fall 2015', start_date=datetime.date(2015, 9, 1),
+                                             end_date=datetime.date(2015, 12, 15))
+        cls.schedule = Schedule.objects.create(program=cls.program, session=cls.session, teacher=cls.teacher,
+                                               address='Nashville', meeting_day=['Mon', 'Wed'])
+        Partner.objects.create(name='Partner 1')
+        Partner.objects.create(name='Partner 2')
+
+    def setUp(self):
+        # the rows behind cached values are rolled back after every test, the cache is not
+        cache.clear()
+
+    def enroll(self, count):
+        start = Student.objects.count()
+        for local_id in range(start, start + count):
+            student = Student.objects.create(local_id=local_id, school=self.school, last_name='Last%d' % local_id,
+                                             first_name='First%d' % local_id, dob=datetime.date(2005, 1, 1))
+            Enrollment.objects.create(schedule=self.schedule, student=student)
+
+    def attendance_url(self, date):
+        return '/records/zones/Zone%20A/programs/Program%201/schedules/Fall%202015/enrollments/' + date + '/'
+
+    def post_grid(self, url, rows):
+        # rows maps attendance ids to their submitted (status, partner, comment)
+        data = {'form-TOTAL_FORMS': len(rows), 'form-INITIAL_FORMS': len(rows), 'form-MAX_NUM_FORMS': 0}
+        for index, (pk, (status, partner, comment)) in enumerate(sorted(rows.items())):
+            data.update({'form-%d-id' % index: pk,
+                         'form-%d-attendance_status' % index: status,
+                         'form-%d-partner' % index: partner or '',
+                         'form-%d-attendance_comment' % index: comment})
+        return self.client.post(url, data)
+
+
+class AttendanceGridTest(RecordsTestCase):
+
+    def setUp(self):
+        super(AttendanceGridTest, self).setUp()
+        self.client.login(username='admin', password='password')
+
+    def count_queries(self, url):
+        # the first request materializes the roster, the second one only reads it
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_materializes_roster(self):
+        self.enroll(5)
+        self.client.get(self.attendance_url('2015-9-2'))
+        self.assertEqual(Attendance.objects.filter(date=datetime.date(2015, 9, 2)).count(), 5)
+
+    def test_query_count_does_not_grow_with_roster(self):
+        self.enroll(3)
+        small = self.count_queries(self.attendance_url('2015-9-2'))
+        self.enroll(30)
+        large = self.count_queries(self.attendance_url('2015-9-9'))
+        self.assertEqual(small, large)
+
+    def test_saves_only_changed_rows(self):
+        self.enroll(4)
+        url = self.attendance_url('2015-9-2')
+        self.client.get(url)
+        rows = {pk: ('', None, '') for pk in Attendance.objects.values_list('id', flat=True)}
+        first, second = sorted(rows)[:2]
+        partner = Partner.objects.get(name='Partner 2')
+        rows[first] = ('P', partner.pk, '')
+        rows[second] = ('E', None, 'sick')
+        response = self.post_grid(url, rows)
+        self.assertEqual(response.context['changed_count'], 2)
+        self.assertEqual(Attendance.objects.get(id=first).partner, partner)
+        self.assertEqual(Attendance.objects.get(id=second).attendance_comment, 'sick')
+        self.assertEqual(Attendance.objects.filter(attendance_status='').count(), 2)
+        response = self.post_grid(url, rows)
+        self.assertEqual(response.context['changed_count'], 0)
+
+
+class AttendanceBatchTest(RecordsTestCase):
+
+    def setUp(self):
+        super(AttendanceBatchTest, self).setUp()
+        self.client.login(username='admin', password='password')
+        self.url = self.attendance_url('2015-9-2') + 'json/'
+
+    def post_batch(self, changes, key='batch-1'):
+        response = self.client.post(self.url, json.dumps({'idempotency_key': key, 'changes': changes}),
+                                    content_type='application/json')
+        return json.loads(response.content.decode())
+
+    def test_roster(self):
+        self.enroll(3)
+        data = json.loads(self.client.get(self.url).content.decode())
+        self.assertEqual(len(data['rows']), 3)
+        row = dict(zip(data['columns'], data['rows'][0]))
+        self.assertEqual(row['status'], '')
+        self.assertEqual(len(data['partners']), 2)
+
+    def test_batch_is_applied_once(self):
+        self.enroll(3)
+        enrollment_ids = list(Enrollment.objects.order_by('id').values_list('id', flat=True))
+        partner = Partner.objects.get(name='Partner 1')
+        changes = [{'enrollment_id': enrollment_ids[0], 'status': 'P', 'partner_id': partner.id},
+                   {'enrollment_id': enrollment_ids[1], 'status': 'A', 'comment': 'sick'}]
+        self.assertEqual(self.post_batch(changes)['changed_count'], 2)
+        self.assertEqual(Attendance.objects.get(enrollment_id=enrollment_ids[0]).partner, partner)
+        self.assertEqual(get_rollup_summary(AttendanceRollup.objects.filter(schedule=self.schedule))['absent'], 1)
+        # a retry gets the first result back without writing
+        Attendance.objects.filter(enrollment_id=enrollment_ids[1]).update(attendance_status='E')
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.post_batch(changes)['changed_count'], 2)
+        self.assertFalse([query for query in captured if query['sql'].startswith('UPDATE')])
+        self.assertEqual(Attendance.objects.get(enrollment_id=enrollment_ids[1]).attendance_status, 'E')
+        # a new key with nothing to change writes nothing
+        self.assertEqual(self.post_batch(changes[:1], key='batch-2')['changed_count'], 0)
+        # the same key posted to another date is another batch
+        self.url = self.attendance_url('2015-9-7') + 'json/'
+        self.assertEqual(self.post_batch(changes)['changed_count'], 2)
+        self.assertEqual(Attendance.objects.get(enrollment_id=enrollment_ids[1], date=datetime.date(2015, 9, 7)).
+                         attendance_status, 'A')
+
+    def test_key_is_hashed_into_the_cache_key(self):
+        self.enroll(1)
+        enrollment_id = Enrollment.objects.values_list('id', flat=True)[0]
+        key = 'retry of batch \n' + 'x' * 300
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            self.assertEqual(self.post_batch([{'enrollment_id': enrollment_id, 'status': 'P'}], key=key)
+                             ['changed_count'], 1)
+            self.assertEqual(self.post_batch([{'enrollment_id': enrollment_id, 'status': 'A'}], key=key)
+                             ['changed_count'], 1)
+        self.assertEqual(Attendance.objects.get(enrollment_id=enrollment_id).attendance_status, 'P')
+
+    def test_invalid_batch_writes_nothing(self):
+        self.enroll(2)
+        enrollment_ids = list(Enrollment.objects.order_by('id').values_list('id', flat=True))
+        result = self.post_batch([{'enrollment_id': enrollment_ids[0], 'status': 'P'},
+                                  {'enrollment_id': enrollment_ids[1], 'status': 'X'},
+                                  {'enrollment_id': 0, 'status': 'P'}])
+        self.assertFalse(result['success'])
+        self.assertEqual([error['index'] for error in result['errors']], [1, 2])
+        self.assertEqual(Attendance.objects.filter(attendance_status='P').count(), 0)
+
+    def test_permission_and_date(self):
+        self.enroll(1)
+        # 2015-9-3 is a thursday and the schedule meets on mondays and wednesdays
+        response = self.client.get(self.attendance_url('2015-9-3') + 'json/')
+        self.assertEqual(json.loads(response.content.decode())['errors'], ['Selected date is invalid'])
+        self.client.login(username='teacher', password='password')
+        self.assertEqual(self.post_batch([]), {'success': False, 'permission': False})
+
+
+class SyncTest(RecordsTestCase):
+
+    def setUp(self):
+        super(SyncTest, self).setUp()
+        self.client.login(username='admin', password='password')
+        self.enroll(2)
+        self.enrollment_ids = list(Enrollment.objects.order_by('id').values_list('id', flat=True))
+
+    def sync(self, changes=(), cursor=None):
+        response = self.client.post('/records/sync/', json.dumps({
+            'cursor': cursor, 'schedules': [self.schedule.id], 'changes': list(changes)}),
+            content_type='application/json')
+        return json.loads(response.content.decode())
+
+    def test_changes_over_several_dates(self):
+        changes = [{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-02', 'version': 0, 'status': 'P'},
+                   {'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-09', 'version': 0, 'status': 'A'},
+                   {'enrollment_id': self.enrollment_ids[1], 'date': '2015-09-09', 'version': 0, 'comment': 'late'}]
+        result = self.sync(changes)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['applied'], 3)
+        rows = [dict(zip(result['columns'], row)) for row in result['rows']]
+        self.assertEqual(sorted((row['date'], row['status'], row['version']) for row in rows),
+                         [('2015-09-02', 'P', 1), ('2015-09-09', '', 1), ('2015-09-09', 'A', 1)])
+        self.assertEqual(get_rollup_summary(AttendanceRollup.objects.filter(schedule=self.schedule))['absent'], 1)
+
+    def test_stale_change_is_a_conflict(self):
+        self.sync([{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-02', 'version': 0, 'status': 'P'}])
+        # another device changed the row on version 0 as well
+        result = self.sync([{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-02', 'version': 0,
+                             'status': 'A'},
+                            {'enrollment_id': self.enrollment_ids[1], 'date': '2015-09-02', 'version': 0,
+                             'status': 'E'}])
+        self.assertFalse(result['success'])
+        self.assertEqual(result['applied'], 1)
+        conflict = dict(zip(result['columns'], result['conflicts'][0]))
+        self.assertEqual((conflict['status'], conflict['version']), ('P', 1))
+        self.assertEqual(Attendance.objects.get(enrollment_id=self.enrollment_ids[0]).attendance_status, 'P')
+        # changed on the version sent back it goes through
+        result = self.sync([{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-02', 'version': 1,
+                             'status': 'A'}])
+        self.assertEqual(result['applied'], 1)
+        self.assertEqual(Attendance.objects.get(enrollment_id=self.enrollment_ids[0]).version, 2)
+
+    def test_rows_changed_since_cursor(self):
+        self.sync([{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-02', 'version': 0, 'status': 'P'},
+                   {'enrollment_id': self.enrollment_ids[1], 'date': '2015-09-02', 'version': 0, 'status': 'P'}])
+        Attendance.objects.update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        cursor = self.sync()['cursor']
+        self.assertEqual(self.sync(cursor=cursor)['rows'], [])
+        attendance = Attendance.objects.get(enrollment_id=self.enrollment_ids[1])
+        attendance.attendance_status = 'A'
+        attendance.save()
+        rows = self.sync(cursor=cursor)['rows']
+        self.assertEqual([(row[0], row[3], row[6]) for row in rows], [(self.enrollment_ids[1], 'A', 2)])
+
+    def test_permission_and_date(self):
+        result = self.sync([{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-03', 'version': 0,
+                             'status': 'P'},
+                            {'enrollment_id': self.enrollment_ids[0], 'date': 'today', 'version': 0}])
+        self.assertEqual([error['message'] for error in result['errors']],
+                         ['Selected date is invalid', 'Date is invalid'])
+        self.client.login(username='teacher', password='password')
+        result = self.sync([{'enrollment_id': self.enrollment_ids[0], 'date': '2015-09-02', 'version': 0,
+                             'status': 'P'}])
+        self.assertEqual(result['errors'], [{'index': 0, 'message': "You don't have permission"}])
+        self.assertEqual(result['rows'], [])
+        self.assertFalse(Attendance.objects.exists())
+
+
+class DeletionJobTest(RecordsTestCase):
+
+    def setUp(self):
+        super(DeletionJobTest, self).setUp()
+        self.client.login(username='admin', password='password')
+        self.enroll(3)
+        CanceledDate.objects.create(schedule=self.schedule, date=datetime.date(2015, 9, 7))
+        materialize_schedule(self.schedule)
+        profile = get_user_profile(self.teacher)
+        profile.schedule_permission.add(self.schedule)
+        profile.program_permission.add(self.program)
+        profile.zone_permission.add(self.zone)
+
+    @override_settings(DELETION_INLINE_LIMIT=10, DELETION_CHUNK_SIZE=25, DELETION_JOBS_IN_THREAD=False)
+    def test_large_zone_is_deleted_by_job(self):
+        attendance_count = Attendance.objects.count()
+        self.assertGreater(attendance_count, 50)
+        data = json.loads(self.client.post('/records/zones/Zone%20A/delete/').content.decode())
+        self.assertTrue(data['success'])
+        # the subtree is hidden before the job runs
+        self.assertFalse(Zone.objects.exists())
+        self.assertFalse(Schedule.objects.exists())
+        self.assertEqual(self.client.get('/records/zones/Zone%20A/programs/').status_code, 404)
+        self.assertEqual(json.loads(self.client.get(data['job_url']).content.decode())['status'], 'pending')
+        with CaptureQueriesContext(connection) as captured:
+            job = run_deletion_job(data['job'])
+        attendance_deletes = [query for query in captured if 'DELETE FROM "records_attendance"' in query['sql']]
+        self.assertEqual(len(attendance_deletes), attendance_count // 25 + 1)
+        self.assertEqual((job.status, job.deleted), ('done', job.total))
+        self.assertFalse(Zone.all_objects.exists() or Program.all_objects.exists() or Schedule.all_objects.exists())
+        self.assertFalse(Attendance.objects.exists() or Enrollment.objects.exists() or CanceledDate.objects.exists())
+        self.assertFalse(AttendanceRollup.objects.exists())
+        self.assertEqual(get_user_profile(self.teacher).schedule_permission.count(), 0)
+        self.assertEqual(Student.objects.count(), 3)
+        self.assertEqual(Session.objects.count(), 1)
+        # the job is only shown to the user who started it
+        self.client.login(username='teacher', password='password')
+        self.assertFalse(json.loads(self.client.get(data['job_url']).content.decode())['permission'])
+
+    @override_settings(DELETION_INLINE_LIMIT=10, DELETION_JOBS_IN_THREAD=False)
+    def test_running_job_is_claimed_once(self):
+        data = json.loads(self.client.post('/records/zones/Zone%20A/delete/').content.decode())
+        job = DeletionJob.objects.get(id=data['job'])
+        self.assertTrue(claim_job(job))
+        # a process that read the job before it was claimed doesn't claim it again
+        self.assertFalse(claim_job(job))
+        call_command('run_deletion_jobs', stdout=io.StringIO())
+        self.assertEqual(DeletionJob.objects.get(id=job.id).status, 'running')
+        self.assertTrue(Attendance.objects.exists())
+        # a running job without progress for a while has lost its process
+        DeletionJob.objects.filter(id=job.id).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        call_command('run_deletion_jobs', stdout=io.StringIO())
+        self.assertEqual(DeletionJob.objects.get(id=job.id).status, 'done')
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_small_schedule_is_deleted_inline(self):
+        data = json.loads(self.client.post('/records/sessions/%d/delete/' % self.session.id).content.decode())
+        self.assertEqual(data, {'success': True, 'permission': True})
+        self.assertFalse(Schedule.all_objects.exists() or Attendance.objects.exists())
+        self.assertFalse(DeletionJob.objects.exists())
+
+
+class HierarchyTest(RecordsTestCase):
+
+    def setUp(self):
+        super(HierarchyTest, self).setUp()
+        self.enroll(2)
+        self.user = User.objects.create_user('coordinator', 'coordinator@example.com', 'password')
+        self.other_program = Program.objects.create(name='Program 2', zone=self.zone)
+        Schedule.objects.create(program=self.other_program, session=self.session, teacher=self.teacher,
+                                address='Nashville', meeting_day=['Tue'])
+        Zone.objects.create(name='Zone B')
+
+    def get_zones(self):
+        return json.loads(self.client.get('/records/hierarchy/').content.decode())['zones']
+
+    def test_superuser_tree(self):
+        self.client.login(username='admin', password='password')
+        # the tree is read with the same number of queries whatever its size
+        with self.assertNumQueries(5):
+            zones = self.get_zones()
+        self.assertEqual(zones, [
+            [self.zone.id, 'Zone A', True, 2, [
+                [self.program.id, 'Program 1', True, 2, [[self.schedule.id, 'Fall 2015', True, 2]]],
+                [self.other_program.id, 'Program 2', True, 0, [[self.other_program.schedule_set.get().id,
+                                                                 'Fall 2015', True, 0]]]]],
+            [Zone.objects.get(name='Zone B').id, 'Zone B', True, 0, []]])
+        # the payload comes from the cache until a record it shows changes
+        with self.assertNumQueries(2):
+            self.get_zones()
+        self.enroll(1)
+        self.assertEqual(self.get_zones()[0][3], 3)
+
+    def test_user_tree(self):
+        self.client.login(username='coordinator', password='password')
+        self.assertEqual(self.get_zones(), [])
+        get_user_profile(self.user).program_permission.add(self.program)
+        self.assertEqual(self.get_zones(), [
+            [self.zone.id, 'Zone A', False, 2, [
+                [self.program.id, 'Program 1', True, 2, [[self.schedule.id, 'Fall 2015', True, 2]]]]]])
+
+
+class PermissionClosureTest(RecordsTestCase):
+
+    def setUp(self):
+        super(PermissionClosureTest, self).setUp()
+        self.user = User.objects.create_user('coordinator', 'coordinator@example.com', 'password')
+        self.profile = get_user_profile(self.user)
+        self.other_program = Program.objects.create(name='Program 2', zone=self.zone)
+        self.client.login(username='coordinator', password='password')
+
+    def test_program_permission_closure(self):
+        self.profile.program_permission.add(self.program)
+        closure = get_permission_closure(User.objects.get(id=self.user.id))
+        self.assertFalse(closure.can_edit('zone', self.zone.id))
+        self.assertTrue(closure.can_see('zone', self.zone.id))
+        self.assertTrue(closure.can_edit('program', self.program.id))
+        self.assertFalse(closure.can_see('program', self.other_program.id))
+        self.assertTrue(closure.can_edit('schedule', self.schedule.id))
+
+    def test_closure_follows_changes(self):
+        response = self.client.get('/records/zones/')
+        self.assertEqual(list(response.context['query_set']), [])
+        self.profile.program_permission.add(self.program)
+        response = self.client.get('/records/zones/Zone%20A/programs/')
+        self.assertEqual(list(response.context['query_set']), [self.program])
+        self.assertFalse(response.context['perm'])
+        self.profile.zone_permission.add(self.zone)
+        response = self.client.get('/records/zones/Zone%20A/programs/')
+        self.assertEqual(len(response.context['query_set']), 2)
+        self.assertTrue(response.context['perm'])
+        Program.objects.create(name='Program 3', zone=self.zone)
+        response = self.client.get('/records/zones/Zone%20A/programs/')
+        self.assertEqual(len(response.context['query_set']), 3)
+
+
+class ListingTest(RecordsTestCase):
+
+    def setUp(self):
+        super(ListingTest, self).setUp()
+        self.client.login(username='admin', password='password')
+
+    def test_keyset_pages_cover_every_row_once(self):
+        self.enroll(12)
+        seen = []
+        after = ''
+        while True:
+            response = self.client.get('/records/students/search/', {'sort': '-school', 'size': 5, 'after': after})
+            data = json.loads(response.content.decode())
+            seen.extend(result['id'] for result in data['results'])
+            if data['next'] is None:
+                break
+            after = data['next']
+        self.assertEqual(sorted(seen), sorted(Student.objects.values_list('id', flat=True)))
+
+    def get_ids(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in json.loads(response.content.decode())['results']]
+
+    def test_size_is_clamped(self):
+        self.enroll(3)
+        self.assertEqual(len(self.get_ids('/records/students/search/', {'size': 0})), 1)
+        self.assertEqual(len(self.get_ids('/records/students/search/', {'size': -5})), 1)
+
+    def test_cursor_not_fitting_the_sort_starts_at_first_page(self):
+        self.enroll(3)
+        first_page = self.get_ids('/records/students/search/', {'sort': 'local_id'})
+        for values in (['abc', 1], [{'a': 1}, 1], [[1], None]):
+            self.assertEqual(self.get_ids('/records/students/search/', {'sort': 'local_id',
+                                                                         'after': encode_cursor(values)}),
+                             first_page)
+        self.assertEqual(self.get_ids('/records/sessions/search/', {'sort': 'start_date',
+                                                                     'after': encode_cursor(['abc', 1])}),
+                         [self.session.id])
+
+    def test_student_page_query_count(self):
+        self.enroll(3)
+        # the first request creates the user's profile
+        self.client.get('/records/students/')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/records/students/', {'q': 'last1'})
+        self.enroll(30)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/records/students/', {'q': 'last1'})
+        self.assertEqual(len(response.context['query_set']), 11)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class FragmentCacheTest(RecordsTestCase):
+
+    def get_table(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        content = response.content.decode()
+        return content[content.index("id='record_table'"):], len(captured)
+
+    def test_repeat_view_skips_the_table(self):
+        self.client.login(username='admin', password='password')
+        url = '/records/zones/Zone%20A/programs/Program%201/schedules/Fall%202015/enrollments/'
+        self.enroll(2)
+        first, first_count = self.get_table(url)
+        second, second_count = self.get_table(url)
+        self.assertEqual(first, second)
+        self.assertEqual(second_count, first_count - 1)
+        # an edit of a student shown in the table is visible right away
+        student = Student.objects.order_by('id')[0]
+        student.first_name = 'Renamed'
+        student.save()
+        third, third_count = self.get_table(url)
+        self.assertIn('Renamed', third)
+        self.assertEqual(third_count, first_count)
+
+    def test_users_without_permission_see_their_own_table(self):
+        Zone.objects.create(name='Zone B')
+        manager = User.objects.create_user('manager', 'manager@example.com', 'password')
+        get_user_profile(manager).program_permission.add(self.program)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        get_user_profile(other).zone_permission.add(Zone.objects.get(name='Zone B'))
+        self.client.login(username='manager', password='password')
+        table, count = self.get_table('/records/zones/')
+        self.assertIn('Zone A', table)
+        self.assertNotIn('Zone B', table)
+        self.client.login(username='other', password='password')
+        table, count = self.get_table('/records/zones/')
+        self.assertIn('Zone B', table)
+        self.assertNotIn('Zone A', table)
+        get_user_profile(other).zone_permission.add(self.zone)
+        table, count = self.get_table('/records/zones/')
+        self.assertIn('Zone A', table)
+
+    def test_listing_pages_are_cached_apart(self):
+        self.client.login(username='admin', password='password')
+        self.enroll(3)
+        table, count = self.get_table('/records/students/?q=last1')
+        self.assertIn('Last1', table)
+        self.assertNotIn('Last2', table)
+        table, count = self.get_table('/records/students/?q=last2')
+        self.assertIn('Last2', table)
+        self.assertNotIn('Last1', table)
+
+
+class AddFormTest(RecordsTestCase):
+
+    def get_form_html(self, url):
+        response = self.client.get(url)
+        return json.loads(response.content.decode())['form_html']
+
+    def test_form_classes_are_made_once(self):
+        form_class = crispy_form_factory(Enrollment, widgets_dict['enrollment'], ['schedule'], [])
+        self.assertIs(crispy_form_factory(Enrollment, widgets_dict['enrollment'], ['schedule'], []), form_class)
+        self.assertIsNot(crispy_form_factory(Enrollment, widgets_dict['enrollment'], [], []), form_class)
+
+    def test_cached_add_form(self):
+        self.client.login(username='admin', password='password')
+        url = '/records/zones/Zone%20A/programs/Program%201/schedules/add/'
+        first = self.get_form_html(url)
+        token = self.client.cookies['csrftoken'].value
+        self.assertIn("value='%s'" % token, first)
+        self.assertNotIn(CSRF_PLACEHOLDER, first)
+        # another user gets the same form with their own token
+        self.client.logout()
+        self.client.login(username='teacher', password='password')
+        with CaptureQueriesContext(connection) as captured:
+            second = self.get_form_html(url)
+        # the choices of the sessions are not read again
+        self.assertFalse([query for query in captured if 'FROM "records_session"' in query['sql']])
+        self.assertNotEqual(self.client.cookies['csrftoken'].value, token)
+        self.assertEqual(second.replace(self.client.cookies['csrftoken'].value, token), first)
+        # a new choice shows up right away
+        Session.objects.create(name='Spring 2016', start_date=datetime.date(2016, 1, 10),
+                               end_date=datetime.date(2016, 5, 15))
+        self.assertIn('Spring 2016', self.get_form_html(url))
+        self.assertNotIn('Spring 2016', self.get_form_html('/records/zones/Zone%20A/programs/add/'))
+
+
+class StudentSearchTest(RecordsTestCase):
+
+    def setUp(self):
+        super(StudentSearchTest, self).setUp()
+        self.client.login(username='admin', password='password')
+        for local_id, first_name, last_name in [(901, 'Maria', 'Gonzalez'), (902, 'Mario', 'Gomez'),
+                                                (903, 'Jamal', 'Washington')]:
+            Student.objects.create(local_id=local_id, school=self.school, first_name=first_name,
+                                   last_name=last_name, dob=datetime.date(2005, 1, 1))
+
+    def search(self, q):
+        response = self.client.get('/records/students/search/', {'q': q})
+        return [result['text'].split(' ')[0] for result in json.loads(response.content.decode())['results']]
+
+    def test_prefix_typo_and_sync(self):
+        if not search_available():
+            self.skipTest('sqlite without fts5')
+        self.assertEqual(sorted(self.search('go')), ['Gomez', 'Gonzalez'])
+        self.assertEqual(self.search('washingtin'), ['Washington'])
+        self.assertEqual(self.search('903'), ['Washington'])
+        self.school.name = 'Hillsboro'
+        self.school.save()
+        self.assertEqual(len(self.search('hills')), 3)
+        Student.objects.get(local_id=903).delete()
+        self.assertEqual(self.search('washington'), [])
+
+
+class AttendanceRollupTest(RecordsTestCase):
+
+    def setUp(self):
+        super(AttendanceRollupTest, self).setUp()
+        self.client.login(username='admin', password='password')
+
+    def rollup_counts(self, date):
+        rollup = AttendanceRollup.objects.get(schedule=self.schedule, date=date)
+        return rollup.present, rollup.excused, rollup.absent, rollup.unmarked
+
+    def test_rollup_follows_writes(self):
+        self.enroll(4)
+        date = datetime.date(2015, 9, 2)
+        url = self.attendance_url('2015-9-2')
+        self.client.get(url)
+        self.assertEqual(self.rollup_counts(date), (0, 0, 0, 4))
+        ids = sorted(Attendance.objects.values_list('id', flat=True))
+        self.post_grid(url, {ids[0]: ('P', None, ''), ids[1]: ('P', None, ''), ids[2]: ('A', None, ''),
+                             ids[3]: ('', None, 'late')})
+        self.assertEqual(self.rollup_counts(date), (2, 0, 1, 1))
+        attendance = Attendance.objects.get(id=ids[2])
+        attendance.attendance_status = 'E'
+        attendance.save()
+        self.assertEqual(self.rollup_counts(date), (2, 1, 0, 1))
+        attendance.enrollment.delete()
+        self.assertEqual(self.rollup_counts(date), (2, 0, 0, 1))
+        AttendanceRollup.objects.all().delete()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_counts(date), (2, 0, 0, 1))
+        self.assertEqual(get_rollup_summary(AttendanceRollup.objects.filter(schedule__program__zone=self.zone)),
+                         {'present': 2, 'excused': 0, 'absent': 0, 'unmarked': 1, 'attendance_rate': 1.0})
+
+    def test_stale_copies_are_counted_once(self):
+        self.enroll(2)
+        date = datetime.date(2015, 9, 2)
+        self.client.get(self.attendance_url('2015-9-2'))
+        attendance_id = Attendance.objects.order_by('id').values_list('id', flat=True)[0]
+        # two requests load the row before either of them writes it
+        first, second = Attendance.objects.get(id=attendance_id), Attendance.objects.get(id=attendance_id)
+        first.attendance_status = 'P'
+        first.save()
+        second.attendance_status = 'P'
+        bulk_update_attendance([second])
+        counts = count_attendance(self.schedule.id, date)
+        self.assertEqual(self.rollup_counts(date), (counts['present'], counts['excused'], counts['absent'],
+                                                    counts['unmarked']))
+        self.assertEqual(self.rollup_counts(date), (1, 0, 0, 1))
+        second = Attendance.objects.get(id=attendance_id)
+        first.attendance_status = 'A'
+        first.save()
+        second.attendance_status = 'E'
+        second.save()
+        self.assertEqual(self.rollup_counts(date), (0, 1, 0, 1))
+
+    def test_missing_rollup_is_counted_after_grid_write(self):
+        self.enroll(3)
+        date = datetime.date(2015, 9, 2)
+        url = self.attendance_url('2015-9-2')
+        self.client.get(url)
+        AttendanceRollup.objects.all().delete()
+        ids = sorted(Attendance.objects.values_list('id', flat=True))
+        self.post_grid(url, {ids[0]: ('P', None, ''), ids[1]: ('A', None, ''), ids[2]: ('', None, '')})
+        counts = count_attendance(self.schedule.id, date)
+        self.assertEqual(self.rollup_counts(date), (counts['present'], counts['excused'], counts['absent'],
+                                                    counts['unmarked']))
+        self.assertEqual(self.rollup_counts(date), (1, 0, 1, 1))
+
+
+class RosterImportTest(RecordsTestCase):
+
+    def run_import(self, importer, text):
+        return importer(batch_size=2).run(csv.DictReader(io.StringIO(text)))
+
+    def test_import_upserts_and_reports_errors(self):
+        self.enroll(1)
+        report = self.run_import(StudentImporter, 'district_id,school_code,local_id,last_name,first_name,dob\n'
+                                                  '1,1,0,Renamed,First0,2005-01-01\n'
+                                                  '1,1,7,Last7,First7,2005-02-01\n'
+                                                  '1,2,8,Last8,First8,2005-02-01\n'
+                                                  '1,1,9,Last9,First9,2005-13-01\n'
+                                                  '1,1,10,Last10,First10,2005-03-01\n')
+        self.assertEqual((report.read, report.created, report.updated), (5, 2, 1))
+        self.assertEqual([(line, column) for line, column, message in report.errors],
+                         [(4, 'school_code'), (5, 'dob')])
+        self.assertEqual(Student.objects.get(local_id=0).last_name, 'Renamed')
+        self.assertEqual(Student.objects.count(), 3)
+        # two preloads, then per batch a lookup, the insert and the lookup of the new ids in a savepoint
+        with self.assertNumQueries(7):
+            report = self.run_import(EnrollmentImporter, 'zone,program,session,district_id,school_code,local_id\n'
+                                                         'Zone A,Program 1,Fall 2015,1,1,0\n'
+                                                         'Zone A,Program 1,Fall 2015,1,1,7\n')
+        self.assertEqual((report.created, report.updated, report.errors), (1, 1, []))
+        self.assertEqual(Enrollment.objects.filter(schedule=self.schedule).count(), 2)
+
+    def test_short_rows_are_reported(self):
+        self.enroll(1)
+        report = self.run_import(EnrollmentImporter, 'zone,program,session,district_id,school_code,local_id\n'
+                                                     'Zone A,Program 1,Fall 2015,1,1\n'
+                                                     'Zone A\n')
+        self.assertEqual([(line, column) for line, column, message in report.errors],
+                         [(2, 'local_id'), (3, 'session')])
+        report = self.run_import(StudentImporter, 'district_id,school_code,local_id,last_name,first_name,dob\n'
+                                                  '1\n')
+        self.assertEqual([column for line, column, message in report.errors],
+                         ['local_id', 'last_name', 'first_name', 'dob', 'school_code'])
+
+    def test_school_rename_updates_student_search(self):
+        if not search_available():
+            self.skipTest('sqlite without fts5')
+        self.enroll(2)
+        self.client.login(username='admin', password='password')
+        report = self.run_import(SchoolImporter, 'district_id,school_code,name\n1,1,Hillsboro\n')
+        self.assertEqual((report.updated, report.errors), (1, []))
+        response = self.client.get('/records/students/search/', {'q': 'hills'})
+        self.assertEqual(len(json.loads(response.content.decode())['results']), 2)
+
+
+class SessionCalendarTest(RecordsTestCase):
+
+    def test_calendar(self):
+        CanceledDate.objects.create(schedule=self.schedule, date=datetime.date(2015, 9, 7))
+        calendar = get_calendar(Schedule.objects.get(id=self.schedule.id))
+        self.assertTrue(calendar.is_meeting_date(datetime.date(2015, 9, 2)))
+        # a tuesday, a canceled monday and a monday after the session
+        self.assertFalse(calendar.is_meeting_date(datetime.date(2015, 9, 1)))
+        self.assertFalse(calendar.is_meeting_date(datetime.date(2015, 9, 7)))
+        self.assertFalse(calendar.is_meeting_date(datetime.date(2015, 12, 21)))
+        self.assertEqual(calendar.next_meeting_date(datetime.date(2015, 9, 2)), datetime.date(2015, 9, 9))
+        self.assertEqual(calendar.previous_meeting_date(datetime.date(2015, 9, 9)), datetime.date(2015, 9, 2))
+        self.assertEqual(calendar.next_meeting_date(datetime.date(2015, 8, 1)), datetime.date(2015, 9, 2))
+        self.assertIsNone(calendar.previous_meeting_date(datetime.date(2015, 9, 2)))
+        self.assertIsNone(calendar.next_meeting_date(datetime.date(2015, 12, 14)))
+        self.assertEqual(calendar.count_meetings(datetime.date(2015, 9, 1), datetime.date(2015, 9, 30)), 8)
+        self.assertEqual(calendar.count_meetings(), 29)
+        self.assertEqual(calendar.week_disabled, '02456')
+
+        # the calendar comes from the cache until the canceled date is deleted
+        schedule = Schedule.objects.get(id=self.schedule.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_calendar(schedule).count_meetings(), 29)
+        CanceledDate.objects.filter(date=datetime.date(2015, 9, 7)).delete()
+        calendar = get_calendar(Schedule.objects.get(id=self.schedule.id))
+        self.assertTrue(calendar.is_meeting_date(datetime.date(2015, 9, 7)))
+
+
+class MultipleWeekdaysFieldTest(RecordsTestCase):
+
+    def test_weekdays_round_trip_and_lookup(self):
+        self.assertEqual(Schedule.objects.get(id=self.schedule.id).meeting_day, ['Mon', 'Wed'])
+        other_session = Session.objects.create(name='Spring 2016', start_date=datetime.date(2016, 1, 10),
+                                               end_date=datetime.date(2016, 5, 1))
+        Schedule.objects.create(program=self.program, session=other_session, teacher=self.teacher,
+                                address='Nashville', meeting_day=['Tue', 'Wed', 'Sun'])
+        self.assertEqual(Schedule.objects.filter(meeting_day__includes='Wed').count(), 2)
+        self.assertEqual(Schedule.objects.filter(meeting_day__includes='Sun').get().session, other_session)
+        self.assertEqual(Schedule.objects.filter(meeting_day__includes=['Mon', 'Wed']).get(), self.schedule)
+        self.assertFalse(Schedule.objects.filter(meeting_day__includes='Fri').exists())
+
+
+class TodaysClassesTest(RecordsTestCase):
+
+    def setUp(self):
+        super(TodaysClassesTest, self).setUp()
+        self.client.login(username='teacher', password='password')
+
+    def test_links_quote_names(self):
+        session = Session.objects.create(name='2015/16', start_date=datetime.date(2015, 9, 1),
+                                         end_date=datetime.date(2016, 5, 1))
+        Schedule.objects.create(program=self.program, session=session, teacher=self.teacher, address='Nashville',
+                                meeting_day=['Wed'])
+        response = self.client.get('/records/today/?date=2015-9-2')
+        self.assertEqual(response.status_code, 200)
+        url = '/records/zones/Zone%2520A/programs/Program%25201/schedules/2015%252F16/enrollments/2015-9-2/'
+        self.assertContains(response, 'href="%s"' % url)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_dashboard_lists_meeting_schedules_in_constant_queries(self):
+        self.enroll(3)
+        other_program = Program.objects.create(name='Program 2', zone=self.zone)
+        other_schedule = Schedule.objects.create(program=other_program, session=self.session, teacher=self.teacher,
+                                                 address='Nashville', meeting_day=['Wed'])
+        # the session and the user, then the schedules, the enrollment counts and the rollups
+        with self.assertNumQueries(2 + 3):
+            response = self.client.get('/records/today/?date=2015-9-2')
+        classes = response.context['classes']
+        self.assertEqual([(c.schedule, c.enrollment_count, c.marked_count) for c in classes],
+                         [(self.schedule, 3, 0), (other_schedule, 0, 0)])
+
+        # the schedules don't meet on tuesdays, nor on canceled dates
+        CanceledDate.objects.create(schedule=self.schedule, date=datetime.date(2015, 9, 9))
+        self.assertEqual(self.client.get('/records/today/?date=2015-9-1').context['classes'], [])
+        self.assertEqual([c.schedule for c in self.client.get('/records/today/?date=2015-9-9').context['classes']],
+                         [other_schedule])
+
+        self.client.logout()
+        self.client.login(username='admin', password='password')
+        url = self.attendance_url('2015-9-2')
+        self.client.get(url)
+        pk = Attendance.objects.values_list('id', flat=True)[0]
+        self.post_grid(url, {pk: ('P', None, '')})
+        self.client.logout()
+        self.client.login(username='teacher', password='password')
+        classes = self.client.get('/records/today/?date=2015-9-2').context['classes']
+        self.assertEqual((classes[0].marked_count, classes[0].unmarked_count), (1, 2))
+
+
+# a query scanning one of these tables from start to end fails the query plan test
+PLAN_GUARDED_TABLES = ('records_attendance', 'records_enrollment', 'records_student')
+
+
+def find_full_scans(captured_queries):
+    # explain the captured selects and return the (table, plan detail, sql) of every full scan of a
+    # guarded table. walking an index in order is fine when the query stops at a limit, as the keyset
+    # pages do, unless the rows have to be sorted again afterwards
+    scans = []
+    with connection.cursor() as cursor:
+        for query in captured_queries:
+            # the sqlite backend of django 1.8 logs queries as "QUERY = '...' - PARAMS = (...)"
+            sql, params = query['sql'][len('QUERY = '):].rsplit(' - PARAMS = ', 1)
+            sql, params = ast.literal_eval(sql), ast.literal_eval(params)
+            if not sql.startswith('SELECT'):
+                continue
+            aliases = {alias: table for table, alias in re.findall(r'"(\w+)" ([UT]\d+)\b', sql)}
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+            ordered_walk = ' LIMIT ' in sql and not any('TEMP B-TREE FOR ORDER BY' in detail for detail in details)
+            for detail in details:
+                match = re.match(r'SCAN (?:TABLE )?(\w+)( USING (?:COVERING )?INDEX)?', detail)
+                if match is None:
+                    continue
+                table = aliases.get(match.group(1), match.group(1))
+                if table in PLAN_GUARDED_TABLES and not (match.group(2) and ordered_walk):
+                    scans.append((table, detail, sql))
+    return scans
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the plans are read with sqlite\'s EXPLAIN QUERY PLAN')
+class QueryPlanTest(RecordsTestCase):
+
+    def setUp(self):
+        super(QueryPlanTest, self).setUp()
+        self.client.login(username='admin', password='password')
+        self.enroll(5)
+        CanceledDate.objects.create(schedule=self.schedule, date=datetime.date(2015, 9, 7))
+        self.client.get(self.attendance_url('2015-9-2'))
+
+    def assert_no_full_scans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url, data or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(find_full_scans(captured.captured_queries), [], url)
+
+    def test_views_use_indexes(self):
+        schedule_url = '/records/zones/Zone%20A/programs/Program%201/schedules/'
+        # the school sort and the search of the student list are left out, they sort and match on
+        # the name of the joined school and on name prefixes, the autocomplete uses the fts index
+        for url in ['/records/zones/', '/records/zones/Zone%20A/programs/', schedule_url,
+                    schedule_url + 'Fall%202015/enrollments/', schedule_url + 'Fall%202015/canceled_dates/',
+                    self.attendance_url('2015-9-2'), self.attendance_url('2015-9-9'),
+                    '/records/students/', '/records/students/?sort=local_id', '/records/students/?size=2',
+                    '/records/schools/', '/records/sessions/', '/records/partners/',
+                    '/records/students/search/?q=last', '/records/today/?date=2015-9-2',
+                    '/records/export/?start_date=2015-9-1&end_date=2015-9-30']:
+            self.assert_no_full_scans('get', url)
+        next_page = ListingPage('student', {'size': '2'}).next_query
+        self.assert_no_full_scans('get', '/records/students/?' + next_page)
+        pk = Attendance.objects.values_list('id', flat=True)[0]
+        self.assert_no_full_scans('post', self.attendance_url('2015-9-2'), {
+            'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1, 'form-MAX_NUM_FORMS': 0,
+            'form-0-id': pk, 'form-0-attendance_status': 'P', 'form-0-partner': '', 'form-0-attendance_comment': ''})
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    # every url of records is requested by a superuser and by a user with the permission of one
+    # program, see QueryBudgetMixin. the budgets are the ones of a materialized roster, the tables
+    # of the list pages and the empty add forms come from the cache
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.coordinator = User.objects.create_user('coordinator', 'coordinator@example.com', 'password')
+        cls.session = Session.objects.create(name='Fall 2015', start_date=datetime.date(2015, 9, 1),
+                                             end_date=datetime.date(2015, 12, 15))
+        cls.school = School.objects.create(school_code=1, district_id=1, name='School', address='Nashville')
+
+    def setUp(self):
+        cache.clear()
+        self.scale = 0
+
+    def add_schedule(self, zone, name, students):
+        program = Program.objects.create(name=name, zone=zone)
+        schedule = Schedule.objects.create(program=program, session=self.session, teacher=self.coordinator,
+                                           address='Nashville', meeting_day=['Mon', 'Wed'])
+        self.add_students(schedule, students)
+        return schedule
+
+    def add_students(self, schedule, count):
+        for index in range(count):
+            local_id = Student.objects.count()
+            student = Student.objects.create(local_id=local_id, school=self.school, last_name='Last%d' % local_id,
+                                             first_name='First%d' % local_id, dob=datetime.date(2005, 1, 1))
+            enrollment = Enrollment.objects.create(schedule=schedule, student=student)
+            Attendance.objects.create(enrollment=enrollment, date=datetime.date(2015, 9, 2), attendance_status='P')
+
+    def grow(self, scale):
+        # every step adds a zone of two programs, a program to the first zone the coordinator gets the
+        # schedule of, and students, canceled dates, schools, sessions and partners. the pages under
+        # test are the ones of the first zone and its first program, so they show more rows each time
+        if self.scale == 0:
+            zone = Zone.objects.create(name='Zone 0')
+            self.schedule = self.add_schedule(zone, 'Program 0', 0)
+            CanceledDate.objects.create(schedule=self.schedule, date=datetime.date(2015, 9, 7))
+            self.profile = get_user_profile(self.coordinator)
+            self.profile.program_permission.add(self.schedule.program)
+        first_zone = self.schedule.program.zone
+        for index in range(self.scale, scale):
+            zone = Zone.objects.create(name='Zone %d' % (index + 1))
+            self.add_schedule(zone, 'Program 0', 5)
+            self.add_schedule(zone, 'Program 1', 5)
+            self.profile.schedule_permission.add(self.add_schedule(first_zone, 'Extra %d' % index, 5))
+            self.add_students(self.schedule, 5)
+            CanceledDate.objects.create(schedule=self.schedule, date=datetime.date(2015, 10, 5 + 7 * index))
+            School.objects.create(school_code=index + 2, district_id=1, name='School %d' % index,
+                                  address='Nashville')
+            session = Session.objects.create(name='Session %d' % index, start_date=datetime.date(2016, 1, 1),
+                                             end_date=datetime.date(2016, 5, 1))
+            Schedule.objects.create(program=self.schedule.program, session=session, teacher=self.coordinator,
+                                    address='Nashville', meeting_day=['Tue'])
+            Partner.objects.create(name='Partner %d' % index)
+        self.scale = scale
+
+    def get_budgets(self):
+        # (url, queries as superuser, queries as coordinator)
+        zone_url = '/records/zones/Zone%200/'
+        schedule_url = zone_url + 'programs/Program%200/schedules/'
+        enrollment_url = schedule_url + 'Fall%202015/enrollments/'
+        canceled_date_url = schedule_url + 'Fall%202015/canceled_dates/'
+        student_id = self.schedule.enrollment_set.order_by('id')[0].student_id
+        return [
+            ('/records/zones/', 2, 2), ('/records/zones/add/', 2, 2), (zone_url + 'edit/', 3, 3),
+            (zone_url + 'delete/', 3, 3),
+            (zone_url + 'programs/', 3, 3), (zone_url + 'programs/add/', 3, 3),
+            (zone_url + 'programs/Program%200/edit/', 4, 4), (zone_url + 'programs/Program%200/delete/', 3, 3),
+            (schedule_url, 3, 3), (schedule_url + 'add/', 3, 3), (schedule_url + 'Fall%202015/edit/', 6, 6),
+            (schedule_url + 'Fall%202015/delete/', 3, 3),
+            (enrollment_url, 3, 3), (enrollment_url + 'add/', 3, 3), (enrollment_url + '%d/edit/' % student_id, 5, 5),
+            (enrollment_url + '%d/delete/' % student_id, 4, 4),
+            (enrollment_url + '2015-9-2/', 5, 5), (enrollment_url + '2015-9-9/', 5, 5),
+            (enrollment_url + '2015-9-2/json/', 6, 6),
+            (canceled_date_url, 3, 3), (canceled_date_url + 'add/', 3, 3), (canceled_date_url + '2015-9-7/edit/', 4, 4),
+            (canceled_date_url + '2015-9-7/delete/', 3, 3),
+            ('/records/students/', 3, 3), ('/records/students/add/', 3, 3), ('/records/students/search/?q=last', 5, 5),
+            ('/records/students/%d/edit/' % student_id, 5, 5), ('/records/students/%d/delete/' % student_id, 5, 5),
+            ('/records/schools/', 3, 3), ('/records/schools/add/', 3, 3), ('/records/schools/search/', 3, 3),
+            ('/records/schools/%d/edit/' % self.school.id, 4, 4), ('/records/schools/%d/delete/' % self.school.id, 4, 4),
+            ('/records/sessions/', 3, 3), ('/records/sessions/add/', 3, 3), ('/records/sessions/search/', 3, 3),
+            ('/records/sessions/%d/edit/' % self.session.id, 4, 4),
+            ('/records/sessions/%d/delete/' % self.session.id, 4, 4),
+            ('/records/partners/', 3, 3), ('/records/partners/add/', 3, 3), ('/records/partners/search/', 3, 3),
+            ('/records/hierarchy/', 2, 2),
+            # the coordinator teaches every schedule so the dashboard counts their enrollments and rollups
+            ('/records/today/?date=2015-9-2', 3, 5),
+            # the coordinator doesn't have the permission of a zone and is turned away
+            ('/records/export/', 3, 2),
+        ]
+
+
+class ExportTest(RecordsTestCase):
+
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        self.enroll(2)
+        zone = Zone.objects.create(name='Zone B')
+        program = Program.objects.create(name='Program 2', zone=zone)
+        schedule = Schedule.objects.create(program=program, session=self.session, teacher=self.admin,
+                                           address='Memphis', meeting_day=['Tue'])
+        Enrollment.objects.create(schedule=schedule, student=Student.objects.order_by('id')[0])
+        materialize_schedule(self.schedule)
+        materialize_schedule(schedule)
+        Attendance.objects.filter(enrollment__schedule=self.schedule, date=datetime.date(2015, 9, 2)). \
+            update(attendance_status='P', attendance_comment='on time, early')
+        get_user_profile(self.teacher).zone_permission.add(self.zone)
+
+    def export(self, **params):
+        response = self.client.get('/records/export/', params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def read_csv(self, content):
+        return list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+
+    def test_csv_and_jsonl(self):
+        self.client.login(username='admin', password='password')
+        rows = self.read_csv(self.export())
+        self.assertEqual(len(rows), Attendance.objects.count())
+        self.assertEqual(list(rows[0]), ['date', 'status', 'comment', 'partner', 'local_id', 'school_code',
+                                         'district_id', 'program', 'zone', 'session'])
+        self.assertIn({'date': '2015-09-02', 'status': 'P', 'comment': 'on time, early', 'partner': '',
+                       'local_id': '0', 'school_code': '1', 'district_id': '1', 'program': 'Program 1',
+                       'zone': 'Zone A', 'session': 'Fall 2015'}, [dict(row) for row in rows])
+        lines = self.export(format='jsonl').decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [dict(row, local_id=int(row['local_id']), school_code=int(row['school_code']),
+                               district_id=int(row['district_id']), partner=None) for row in rows])
+        self.assertEqual(self.client.get('/records/export/', {'format': 'xml'}).content,
+                         b'Export format is invalid')
+
+    def test_date_and_zone_filters(self):
+        self.client.login(username='admin', password='password')
+        rows = self.read_csv(self.export(start_date='2015-09-02', end_date='2015-09-09'))
+        self.assertEqual(sorted({row['date'] for row in rows}),
+                         ['2015-09-02', '2015-09-07', '2015-09-08', '2015-09-09'])
+        rows = self.read_csv(self.export(zone='Zone B'))
+        self.assertEqual({row['zone'] for row in rows}, {'Zone B'})
+        self.assertEqual(len(rows), Attendance.objects.filter(enrollment__schedule__program__zone__name='Zone B').
+                         count())
+        self.assertEqual(self.client.get('/records/export/', {'start_date': '2015-13-01'}).content,
+                         b'Selected date is invalid')
+
+    def test_permission(self):
+        self.client.login(username='teacher', password='password')
+        # users other than superusers export the zones they edit, and only those
+        self.assertEqual({row['zone'] for row in self.read_csv(self.export())}, {'Zone A'})
+        self.assertEqual(self.client.get('/records/export/', {'zone': 'Zone B'}).content,
+                         b"You don't have permission")
+        get_user_profile(self.teacher).zone_permission.clear()
+        self.assertEqual(self.client.get('/records/export/').content, b"You don't have permission")
+
+    def test_gzip_response_and_command(self):
+        self.client.login(username='admin', password='password')
+        response = self.client.get('/records/export/', {'format': 'jsonl', 'gzip': '1', 'zone': 'Zone A'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="attendance.jsonl.gz"')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(content, self.export(format='jsonl', zone='Zone A'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'attendance.jsonl.gz')
+            call_command('export_attendance', format='jsonl', zone=['Zone A'], gzip=True, output=path)
+            with open(path, 'rb') as output:
+                self.assertEqual(gzip.decompress(output.read()), content)
+            path = os.path.join(directory, 'attendance.csv')
+            call_command('export_attendance', start_date='2015-09-02', end_date='2015-09-02', output=path)
+            with open(path, 'rb') as output:
+                self.assertEqual(output.read(), self.export(start_date='2015-09-02', end_date='2015-09-02'))
+
+
+class ProfilingTest(RecordsTestCase):
+
+    def timings(self, response):
+        return {timing.split(';')[0]: timing for timing in response['Server-Timing'].split(', ')}
+
+    @override_settings(PROFILING_SERVER_TIMING=True)
+    def test_server_timing(self):
+        self.enroll(3)
+        self.client.login(username='admin', password='password')
+        url = '/records/zones/Zone%20A/programs/Program%201/schedules/Fall%202015/enrollments/add/'
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'sql', 'crispy', 'template', 'total'})
+        self.assertIn('desc="%d queries"' % len(captured), timings['sql'])
+        # the add form is rendered by crispy alone, the list by its template
+        self.assertNotEqual(timings['crispy'], 'crispy;dur=0.0')
+        timings = self.timings(self.client.get(url[:-len('add/')]))
+        self.assertEqual(timings['crispy'], 'crispy;dur=0.0')
+        self.assertNotEqual(timings['template'], 'template;dur=0.0')
+
+    @override_settings(PROFILING_SERVER_TIMING=False, PROFILING_SAMPLE_RATE=0)
+    def test_unprofiled_request(self):
+        self.client.login(username='admin', password='password')
+        ProfilingMiddleware().process_request(RequestFactory().get('/records/zones/'))
+        self.assertIsNone(get_profile())
+        self.assertFalse(connection.force_debug_cursor)
+        self.assertNotIn('Server-Timing', self.client.get('/records/zones/'))
+
+    @override_settings(PROFILING_SLOW_REQUEST_MS=0, PROFILING_SAMPLE_RATE=1)
+    def test_slow_request_log(self):
+        self.client.login(username='admin', password='password')
+        with self.assertLogs('records.profiling', 'WARNING') as logs:
+            self.client.get('/records/zones/Zone%20A/programs/Program%201/schedules/Fall%202015/enrollments/add/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'add_view[enrollment]')
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(len(entry['slowest_queries']), 3)
+        with self.settings(PROFILING_SAMPLE_RATE=0), self.assertRaises(AssertionError):
+            with self.assertLogs('records.profiling', 'WARNING'):
+                self.client.get('/records/zones/')
+
+
+class DatasetGeneratorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cache.clear()
+        DatasetGenerator(scale=1, seed=7).generate()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generated_data(self):
+        self.assertEqual(Zone.objects.count(), 1)
+        self.assertEqual(Program.objects.count(), 10)
+        self.assertEqual(Schedule.objects.count(), 40)
+        self.assertEqual(Student.objects.count(), 1000)
+        self.assertEqual(Enrollment.objects.count(), 1000)
+        # every enrollment has a row per meeting of its schedule
+        schedule = Schedule.objects.order_by('id')[0]
+        self.assertEqual(Attendance.objects.filter(enrollment__schedule=schedule).count(),
+                         25 * get_calendar(schedule).count_meetings())
+        self.assertTrue(get_permission_closure(User.objects.get(username='coordinator1')).can_edit(
+            'zone', Zone.objects.get().id))
+        teacher = User.objects.get(username='teacher1')
+        self.assertEqual(set(get_user_profile(teacher).schedule_permission.all()),
+                         set(Schedule.objects.filter(teacher=teacher)))
+        self.assertTrue(User.objects.get(username='admin').is_superuser)
+        self.assertEqual(User.objects.count(), len(DatasetGenerator(scale=1).get_usernames()))
+
+    def test_benchmark_endpoints(self):
+        self.client.login(username='admin', password='password')
+        for name, url in get_endpoints():
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200, name)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+
+
+class GenerateDataCommandTest(TestCase):
+
+    def test_existing_users_are_refused(self):
+        User.objects.create_user('teacher2', 'teacher2@example.com', 'password')
+        with self.assertRaisesRegex(CommandError, 'users named teacher2'):
+            call_command('generate_data', stdout=io.StringIO())
+        self.assertFalse(Zone.objects.exists() or Student.objects.exists())
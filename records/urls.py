@@ -1,7 +1,8 @@
 from django.conf.urls import url, include
 from .views import zone_view, program_view, schedule_view, enrollment_view, add_view, edit_view, delete_view, \
     attendance_view, canceled_date_view, school_view, session_view, student_view, others_add_view, others_delete_view, \
-    others_edit_view, partner_view
+    others_edit_view, partner_view, listing_json_view, student_search_view, \
+    export_view, today_view, attendance_json_view, sync_view, deletion_job_view, hierarchy_json_view
 
 enrollment_url_patterns = [
     url(r'^$', enrollment_view, {'model_name': 'enrollment'}, name='enrollment_view'),
@@ -9,6 +10,7 @@ enrollment_url_patterns = [
     url(r'^(?P<student_id>[0-9]+)/edit/$', edit_view, {'model_name': 'enrollment'}, name='enrollment_edit_view'),
     url(r'^(?P<student_id>[0-9]+)/delete/$', delete_view, {'model_name': 'enrollment'}, name='enrollment_delete_view'),
     url(r'^(?P<date>(\d{4}-\d+-\d+))/$', attendance_view, name='attendance_view'),
+    url(r'^(?P<date>(\d{4}-\d+-\d+))/json/$', attendance_json_view, name='attendance_json_view'),
 ]
 
 canceled_date_url_patterns = [
@@ -45,24 +47,28 @@ zone_url_patterns = [
 student_url_patterns = [
     url(r'^$', student_view, {'model_name': 'student'}, name='student_view'),
     url(r'^add/$', others_add_view, {'model_name': 'student'}, name='student_add_view'),
+    url(r'^search/$', student_search_view, {'model_name': 'student'}, name='student_search_view'),
     url(r'^(?P<id>[^/]+)/edit/$', others_edit_view, {'model_name': 'student'}, name='student_add_view'),
     url(r'^(?P<id>[^/]+)/delete/$', others_delete_view, {'model_name': 'student'}, name='student_delete_view'),
 ]
 school_url_patterns = [
     url(r'^$', school_view, {'model_name': 'school'}, name='school_view'),
     url(r'^add/$', others_add_view, {'model_name': 'school'}, name='school_add_view'),
+    url(r'^search/$', listing_json_view, {'model_name': 'school'}, name='school_search_view'),
     url(r'^(?P<id>[^/]+)/edit/$', others_edit_view, {'model_name': 'school'}, name='school_add_view'),
     url(r'^(?P<id>[^/]+)/delete/$', others_delete_view, {'model_name': 'school'}, name='school_delete_view'),
 ]
 session_url_patterns = [
     url(r'^$', session_view, {'model_name': 'session'}, name='session_view'),
     url(r'^add/$', others_add_view, {'model_name': 'session'}, name='session_add_view'),
+    url(r'^search/$', listing_json_view, {'model_name': 'session'}, name='session_search_view'),
     url(r'^(?P<id>[^/]+)/edit/$', others_edit_view, {'model_name': 'session'}, name='session_add_view'),
     url(r'^(?P<id>[^/]+)/delete/$', others_delete_view, {'model_name': 'session'}, name='session_delete_view'),
 ]
 partner_url_patterns = [
     url(r'^$', partner_view, {'model_name': 'partner'}, name='partner_view'),
     url(r'^add/$', others_add_view, {'model_name': 'partner'}, name='partner_add_view'),
+    url(r'^search/$', listing_json_view, {'model_name': 'partner'}, name='partner_search_view'),
     url(r'^(?P<id>[^/]+)/edit/$', others_edit_view, {'model_name': 'partner'}, name='partner_add_view'),
     url(r'^(?P<id>[^/]+)/delete/$', others_delete_view, {'model_name': 'partner'}, name='partner_delete_view'),
 ]
@@ -71,5 +77,10 @@ urlpatterns = [
     url(r'^schools/', include(school_url_patterns)),
     url(r'^sessions/', include(session_url_patterns)),
     url(r'^students/', include(student_url_patterns)),
-    url(r'^partners/', include(partner_url_patterns))
+    url(r'^partners/', include(partner_url_patterns)),
+    url(r'^export/$', export_view, name='export_view'),
+    url(r'^today/$', today_view, name='today_view'),
+    url(r'^sync/$', sync_view, name='sync_view'),
+    url(r'^hierarchy/$', hierarchy_json_view, name='hierarchy_json_view'),
+    url(r'^deletion_jobs/(?P<job_id>[0-9]+)/$', deletion_job_view, name='deletion_job_view'),
 ]
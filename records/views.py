@@ -1,18 +1,35 @@
 from django.shortcuts import render, get_object_or_404
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
-from .models import Zone, Program, Schedule, Enrollment, Attendance, CanceledDate, Student, Session, School, Partner
-from django.db.models import Q
+from .models import Zone, Program, Schedule, Enrollment, Attendance, CanceledDate, Student, Session, School, \
+    Partner, DeletionJob
 from urllib.parse import unquote
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.utils import timezone
 import json
-from crispy_forms.utils import render_crispy_form
-from .forms import DeleteForm, crispy_form_factory
+from .profiling import render_crispy_form
+from .forms import DeleteForm, crispy_form_factory, AttendanceGridFormSet, AjaxSelect, render_add_form
+from django.core.urlresolvers import reverse, reverse_lazy
 from django.core.context_processors import csrf
 import datetime
-from django.forms import modelformset_factory
+import hashlib
 from django import forms
 from accounts.models import get_user_profile
+from .permissions import get_permission_closure
+from .listing import ListingPage
+from .search import search_available, search_students
+from .export import EXPORT_FORMATS, export_attendance
+from .roster import get_roster, materialize_roster, apply_attendance_batch
+from .sync import SYNC_COLUMNS, MAX_SYNC_CHANGES, MAX_SYNC_SCHEDULES, get_sync_cursor, parse_sync_cursor, \
+    apply_sync_changes, get_changed_rows
+from .meeting_calendar import get_calendar
+from .dashboard import get_todays_classes
+from .fragments import get_fragment_key
+from .deletion import deletion_model_dict, is_large, start_deletion_job
+from .hierarchy import HIERARCHY_COLUMNS, get_hierarchy
+from django.utils.functional import SimpleLazyObject
+from django.core.cache import cache
 model_name_dict = {
     'zone': Zone,
     'program': Program,
@@ -25,6 +42,8 @@ model_name_dict = {
     'partner': Partner
 }
 
+SEARCH_PAGE_SIZE = 20
+
 higher_model_name_dict = {
     'zone': None,
     'program': 'zone',
@@ -44,45 +63,66 @@ def get_objs_and_perm(user, **kwargs):
     # if zone1 has another program called program2, he is not able to see it.
 
     res_map = {}
+    closure = get_permission_closure(user)
     perm = user.is_superuser
-    profile = get_user_profile(user)
 
     # depending the page user is requesting, we will have a list of obj as argument
-
-    if 'zone_name' in kwargs:
+    # the deepest record of the url is fetched with all of its parents in one joined query
+    # the permission of a level includes the permissions of the levels above it, see permissions.py
+
+    if 'session_name' in kwargs:
+        # user is requesting enrollment page or canceled_date page
+        schedule_lookup = {'program__zone__name': unquote(kwargs['zone_name']),
+                           'program__name': unquote(kwargs['program_name']),
+                           'session__name': unquote(kwargs['session_name']),
+                           # the enrollments and canceled dates of a schedule being deleted are hidden with it
+                           'deleting': False}
+        if 'student_id' in kwargs:
+            enrollment = get_object_or_404(
+                Enrollment.objects.select_related('student', 'schedule__program__zone', 'schedule__session'),
+                student__id=kwargs['student_id'],
+                **{'schedule__' + key: value for key, value in schedule_lookup.items()})
+            schedule = enrollment.schedule
+            res_map.update({'enrollment': enrollment})
+        elif 'canceled_date' in kwargs:
+            canceled_date = get_object_or_404(
+                CanceledDate.objects.select_related('schedule__program__zone', 'schedule__session'),
+                date=kwargs['canceled_date'],
+                **{'schedule__' + key: value for key, value in schedule_lookup.items()})
+            schedule = canceled_date.schedule
+            res_map.update({'canceled_date': canceled_date})
+        else:
+            schedule = get_object_or_404(Schedule.objects.select_related('program__zone', 'session'),
+                                         **schedule_lookup)
+        res_map.update({'zone': schedule.program.zone, 'program': schedule.program, 'schedule': schedule})
+        perm = closure.can_edit('schedule', schedule.id)
+    elif 'program_name' in kwargs:
+        # user is requesting schedule page
+        program = get_object_or_404(Program.objects.select_related('zone'),
+                                    zone__name=unquote(kwargs['zone_name']),
+                                    name=unquote(kwargs['program_name']))
+        res_map.update({'zone': program.zone, 'program': program})
+        perm = closure.can_edit('program', program.id)
+    elif 'zone_name' in kwargs:
         # user is requesting program page
-        zone_name = unquote(kwargs['zone_name'])
-        zone = Zone.objects.get(name=zone_name)
-        perm = perm or profile.zone_permission.filter(id=zone.id).exists()
+        zone = get_object_or_404(Zone.objects, name=unquote(kwargs['zone_name']))
         res_map.update({'zone': zone})
-        if 'program_name' in kwargs:
-            # user is requesting schedule page
-            program_name = unquote(kwargs['program_name'])
-            program = Program.objects.get(name=program_name, zone=zone)
-            perm = perm or profile.program_permission.filter(id=program.id).exists()
-            res_map.update({'program': program})
-            if 'session_name' in kwargs:
-                # user is requesting enrollment page or canceled_date page
-                session_name = unquote(kwargs['session_name'])
-                schedule = Schedule.objects.get(program=program, session__name=session_name)
-                perm = perm or profile.schedule_permission.filter(id=schedule.id).exists()
-                res_map.update({'schedule': schedule})
-                if 'student_id' in kwargs:
-                    student_id = kwargs['student_id']
-                    enrollment = get_object_or_404(Enrollment, schedule=schedule, student__id=student_id)
-                    res_map.update({'enrollment': enrollment})
-                if 'canceled_date' in kwargs:
-                    canceled_date = kwargs['canceled_date']
-                    canceled_date = get_object_or_404(CanceledDate, schedule=schedule, date=canceled_date)
-                    res_map.update({'canceled_date': canceled_date})
+        perm = closure.can_edit('zone', zone.id)
 
     # we return a dict of objects representing this page. i.e. user is requesting a schedule page,
     # we will return the zone and program of these schedules we are about to show
 
-    res_map.update({'perm': perm})
+    res_map.update({'perm': perm, 'closure': closure})
     return res_map
 
 
+def resolve_objs_and_perm(request, **kwargs):
+    # the records of the url and the permission are resolved once per request and kept on it
+    if not hasattr(request, 'objs_and_perm'):
+        request.objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    return request.objs_and_perm
+
+
 def update_context(query_set, perm, **kwargs):
     context = {'query_set': query_set, 'perm': perm}
     context.update(kwargs)
@@ -95,73 +135,77 @@ def update_context(query_set, perm, **kwargs):
 @require_http_methods(["GET"])
 @login_required
 def zone_view(request, **kwargs):
-    objs_and_perm = get_objs_and_perm(request.user)
-    profile = get_user_profile(request.user)
+    objs_and_perm = resolve_objs_and_perm(request)
+    closure = objs_and_perm['closure']
     if objs_and_perm['perm']:
         query_set = Zone.objects.all()
     else:
-        query_set = Zone.objects.filter(
-            Q(id__in=profile.zone_permission.all().values('id')) |
-            Q(program__in=profile.program_permission.all()) |
-            Q(program__schedule__in=profile.schedule_permission.all())
-        ).distinct()
+        # lazy so a cached table doesn't read the zones
+        query_set = SimpleLazyObject(lambda: [zone for zone in Zone.objects.all()
+                                              if closure.can_see('zone', zone.id)])
 
     context = update_context(query_set, objs_and_perm['perm'], **kwargs)
+    context['fragment_key'] = get_fragment_key('zone', objs_and_perm['perm'], visible_ids=closure.visible['zone'])
     return render(request, "records_zone.html", context)
 
 
 @require_http_methods(["GET"])
 @login_required
 def program_view(request, **kwargs):
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
-    profile = get_user_profile(request.user)
-    if objs_and_perm['perm']:
-        query_set = Program.objects.filter(zone=objs_and_perm['zone'])
-    else:
-        query_set = Program.objects.filter(
-            Q(id__in=profile.program_permission.filter(zone=objs_and_perm['zone']).values('id')) |
-            Q(schedule__in=profile.schedule_permission.filter(program__zone=objs_and_perm['zone']))
-        ).distinct()
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
+    closure = objs_and_perm['closure']
+    programs = Program.objects.filter(zone=objs_and_perm['zone'])
+    query_set = programs
+    if not objs_and_perm['perm']:
+        query_set = SimpleLazyObject(lambda: [program for program in programs
+                                              if closure.can_see('program', program.id)])
     context = update_context(query_set, objs_and_perm['perm'], **kwargs)
+    context['fragment_key'] = get_fragment_key('program', objs_and_perm['perm'], objs_and_perm['zone'],
+                                               closure.visible['program'])
     return render(request, "records_program.html", context)
 
 
 @require_http_methods(["GET"])
 @login_required
 def schedule_view(request, **kwargs):
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
-    profile = get_user_profile(request.user)
-    if objs_and_perm['perm']:
-        query_set = Schedule.objects.filter(program=objs_and_perm['program'])
-    else:
-        query_set = profile.schedule_permission.filter(program=objs_and_perm['program'])
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
+    closure = objs_and_perm['closure']
+    schedules = Schedule.objects.filter(program=objs_and_perm['program']).select_related('session', 'teacher')
+    query_set = schedules
+    if not objs_and_perm['perm']:
+        query_set = SimpleLazyObject(lambda: [schedule for schedule in schedules
+                                              if closure.can_see('schedule', schedule.id)])
     context = update_context(query_set, objs_and_perm['perm'], **kwargs)
+    context['fragment_key'] = get_fragment_key('schedule', objs_and_perm['perm'], objs_and_perm['program'],
+                                               closure.visible['schedule'])
     return render(request, "records_schedule.html", context)
 
 
 @require_http_methods(["GET"])
 @login_required
 def enrollment_view(request, **kwargs):
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
     if objs_and_perm['perm']:
-        query_set = Enrollment.objects.filter(schedule=objs_and_perm['schedule'])
+        query_set = Enrollment.objects.filter(schedule=objs_and_perm['schedule']).select_related('student')
     else:
         query_set = Enrollment.objects.none()
     today = datetime.date.today().strftime('%Y-%m-%d')
     context = update_context(query_set, objs_and_perm['perm'], **kwargs)
-    context.update({'today': today})
+    context.update({'today': today,
+                    'fragment_key': get_fragment_key('enrollment', objs_and_perm['perm'], objs_and_perm['schedule'])})
     return render(request, "records_enrollment.html", context)
 
 
 @require_http_methods(["GET"])
 @login_required
 def canceled_date_view(request, **kwargs):
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
     if objs_and_perm['perm']:
         query_set = CanceledDate.objects.filter(schedule=objs_and_perm['schedule'])
     else:
         query_set = CanceledDate.objects.none()
     context = update_context(query_set, objs_and_perm['perm'], **kwargs)
+    context['fragment_key'] = get_fragment_key('canceled_date', objs_and_perm['perm'], objs_and_perm['schedule'])
     return render(request, "records_canceled_date.html", context)
 
 
@@ -172,52 +216,34 @@ def attendance_view(request, **kwargs):
     # attendance view return a formset of all attendance of the enrollment of
     # a certain schedule and a certain date, user will be able to submit this formset
 
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
     schedule = objs_and_perm['schedule']
     date = kwargs['date']
     date = date.split('-')
     date = datetime.date(int(date[0]), int(date[1]), int(date[2]))
 
-    # in the date picker we only enable the dates that are not in invalid dates,
-    # these invalid dates include the canceled date, the weekdays not in the schedule
-    # and the date are out of schedule's start end date range
-
-    canceled_dates = CanceledDate.objects.filter(schedule=schedule).values_list('date', flat=True)
-    date_valid = date not in canceled_dates
-    start_date = schedule.session.start_date
-    end_date = schedule.session.end_date
-    date_valid = date_valid and date >= start_date and date <= end_date
-    meeting_days = schedule.meeting_day
-    week_days = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-    date_valid = date_valid and (week_days[date.weekday()] in meeting_days)
-    week_disabled = ""
-    for idx, weekday in enumerate(week_days):
-        if weekday not in meeting_days:
-            week_disabled += str(idx)
+    # in the date picker we only enable the meeting dates of the schedule's calendar, the
+    # dates out of the session, the weekdays not in the schedule and the canceled dates are
+    # disabled. the calendar is cached so checking the date doesn't query anything
+
+    calendar = get_calendar(schedule)
+    date_valid = calendar.is_meeting_date(date)
 
     if request.method == "GET":
         # we only get the enrollment list if user has permission and the date is valid
         if objs_and_perm['perm'] and date_valid:
-            enrollment_query_set = Enrollment.objects.filter(schedule=schedule). \
-                exclude(start_date__gt=date). \
-                exclude(end_date__lt=date)
-            for enroll in enrollment_query_set:
-                Attendance.objects.get_or_create(enrollment=enroll, date=date)
-            attendance_set = Attendance.objects.filter(enrollment__in=enrollment_query_set, date=date)
+            # missing rows are created in one insert, rosters materialized ahead by the
+            # materialize_roster command don't write at all
+            materialize_roster(schedule, date)
+            attendance_set = get_roster(schedule, date)
         else:
             attendance_set = Attendance.objects.none()
 
-        formset_class = modelformset_factory(Attendance,
-                                             fields="__all__",
-                                             widgets={'attendance_status':
-                                                      forms.widgets.Select()},
-                                             max_num=0)
-        formset = formset_class(queryset=attendance_set)
+        formset = AttendanceGridFormSet(queryset=attendance_set)
         context = {'formset': formset,
-                   'canceled_dates': canceled_dates,
-                   'start_date': start_date,
-                   'end_date': end_date,
-                   'week_disabled': week_disabled
+                   'calendar': calendar,
+                   'previous_date': calendar.previous_meeting_date(date),
+                   'next_date': calendar.next_meeting_date(date)
                    }
         context.update(kwargs)
 
@@ -225,19 +251,16 @@ def attendance_view(request, **kwargs):
 
     if request.method == "POST":
         if objs_and_perm['perm'] and date_valid:
-            formset_class = modelformset_factory(Attendance,
-                                                 fields="__all__",
-                                                 widgets={'attendance_status':
-                                                          forms.widgets.Select(choices=Attendance.STATUS_TYPE)},
-                                                 max_num=0)
-            formset = formset_class(request.POST)
+            # the posted rows are only matched against the roster of this schedule and date
+            formset = AttendanceGridFormSet(request.POST, queryset=get_roster(schedule, date))
+            changed_count = None
             if formset.is_valid():
-                formset.save()
+                changed_count = formset.save_changed()
             context = {'formset': formset,
-                       'canceled_dates': canceled_dates,
-                       'start_date': start_date,
-                       'end_date': end_date,
-                       'week_disabled': week_disabled
+                       'changed_count': changed_count,
+                       'calendar': calendar,
+                       'previous_date': calendar.previous_meeting_date(date),
+                       'next_date': calendar.next_meeting_date(date)
                        }
             context.update(kwargs)
 
@@ -249,10 +272,86 @@ def attendance_view(request, **kwargs):
                 return HttpResponse("Selected date is invalid")
 
 
+# the results of attendance batches by user, schedule, date and idempotency key, a batch posted
+# again with the same key to the same roster gets the stored result back instead of being applied
+# twice, the same key posted to another roster is another batch. the key of the client is hashed,
+# memcached doesn't take spaces, control characters or keys longer than 250 characters
+ATTENDANCE_BATCH_KEY = 'attendance_batch:%d:%d:%s:%s'
+ATTENDANCE_BATCH_TIMEOUT = 24 * 60 * 60
+ATTENDANCE_ROSTER_COLUMNS = ['enrollment_id', 'student', 'local_id', 'status', 'partner_id', 'comment']
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+def attendance_json_view(request, **kwargs):
+
+    # this view is a compact version of attendance_view for phones, GET returns the roster as
+    # arrays in the order of columns and POST takes a json batch of changes like
+    # {"idempotency_key": "...", "changes": [{"enrollment_id": 1, "status": "P", "partner_id": null,
+    # "comment": ""}]} and applies it in one transaction. the permission and the date are checked
+    # the same way as in attendance_view
+
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
+    schedule = objs_and_perm['schedule']
+    try:
+        date = parse_date(kwargs['date'])
+    except ValueError:
+        date = None
+    if not objs_and_perm['perm']:
+        return HttpResponse(json.dumps({'success': False, 'permission': False}), content_type='application/json')
+    if date is None or not get_calendar(schedule).is_meeting_date(date):
+        return HttpResponse(json.dumps({'success': False, 'permission': True,
+                                        'errors': ['Selected date is invalid']}),
+                            content_type='application/json')
+
+    if request.method == 'GET':
+        materialize_roster(schedule, date)
+        rows = [[attendance.enrollment_id,
+                 '%s %s' % (attendance.enrollment.student.first_name, attendance.enrollment.student.last_name),
+                 attendance.enrollment.student.local_id,
+                 attendance.attendance_status, attendance.partner_id, attendance.attendance_comment]
+                for attendance in get_roster(schedule, date).order_by('enrollment__student__last_name',
+                                                                      'enrollment__student__first_name')]
+        return HttpResponse(json.dumps({'success': True, 'date': date.isoformat(),
+                                        'columns': ATTENDANCE_ROSTER_COLUMNS, 'rows': rows,
+                                        'partners': list(Partner.objects.values_list('id', 'name'))}),
+                            content_type='application/json')
+
+    try:
+        batch = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        batch = None
+    if not isinstance(batch, dict) or not isinstance(batch.get('changes'), list) or \
+            not isinstance(batch.get('idempotency_key'), str) or not batch['idempotency_key']:
+        return HttpResponse(json.dumps({'success': False, 'permission': True,
+                                        'errors': ['A batch needs an idempotency_key and a list of changes']}),
+                            content_type='application/json', status=400)
+    key = ATTENDANCE_BATCH_KEY % (request.user.id, schedule.id, date.isoformat(),
+                                  hashlib.md5(batch['idempotency_key'].encode('utf-8')).hexdigest())
+    # the key is claimed before the batch is applied so a retry arriving meanwhile isn't applied too
+    if not cache.add(key, 'pending', ATTENDANCE_BATCH_TIMEOUT):
+        result = cache.get(key)
+        if result == 'pending':
+            return HttpResponse(json.dumps({'success': False, 'permission': True,
+                                            'errors': ['The batch is being applied']}),
+                                content_type='application/json', status=409)
+        return HttpResponse(json.dumps(result), content_type='application/json')
+    try:
+        changed_count, errors = apply_attendance_batch(schedule, date, batch['changes'])
+    except Exception:
+        cache.delete(key)
+        raise
+    result = {'success': not errors, 'permission': True, 'changed_count': changed_count,
+              'errors': [{'index': index, 'message': message} for index, message in errors]}
+    cache.set(key, result, ATTENDANCE_BATCH_TIMEOUT)
+    return HttpResponse(json.dumps(result), content_type='application/json')
+
+
 widgets_dict = {'zone': {},
                 'program': {},
                 'schedule': {},
-                'enrollment': {'start_date': forms.DateInput(attrs={'placeholder': 'yyyy-mm-dd'}),
+                'enrollment': {'student': AjaxSelect(attrs={'data-ajax-url': reverse_lazy('student_search_view')}),
+                               'start_date': forms.DateInput(attrs={'placeholder': 'yyyy-mm-dd'}),
                                'end_date': forms.DateInput(attrs={'placeholder': 'yyyy-mm-dd'})
                                },
                 'canceled_date': {'date': forms.DateInput(attrs={'placeholder': 'yyyy-mm-dd'})},
@@ -271,7 +370,7 @@ def add_view(request, model_name, **kwargs):
 
     # this view is for ajax to fetch add_form of a certain leveled model
 
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
     higher_model_name = higher_model_name_dict[model_name]
     if higher_model_name is None:
         disabled = []
@@ -283,9 +382,8 @@ def add_view(request, model_name, **kwargs):
                                      exclude=[],
                                      )
     if request.method == 'GET':
-        add_form = form_class(initial={higher_model_name: objs_and_perm.get(higher_model_name)})
-        request_context = csrf(request)
-        form_html = render_crispy_form(add_form, context=request_context)
+        form_html = render_add_form(request, model_name, form_class, higher_model_name,
+                                    objs_and_perm.get(higher_model_name))
         return HttpResponse(json.dumps({'form_html': form_html}))
 
     if request.method == 'POST':
@@ -308,7 +406,7 @@ def add_view(request, model_name, **kwargs):
 @require_http_methods(["GET", "POST"])
 @login_required
 def edit_view(request, model_name, **kwargs):
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
     higher_model_name = higher_model_name_dict[model_name]
     if higher_model_name is None:
         disabled = []
@@ -343,12 +441,22 @@ def edit_view(request, model_name, **kwargs):
             return HttpResponse(json.dumps({'success': False, 'permission': False}))
 
 
+def delete_record(request, model_name, obj):
+    # a record with a large subtree is hidden and left to a deletion job, see deletion.py
+    if model_name in deletion_model_dict and is_large(model_name, obj):
+        job = start_deletion_job(model_name, obj, request.user)
+        return HttpResponse(json.dumps({'success': True, 'permission': True, 'job': job.id,
+                                        'job_url': reverse('deletion_job_view', args=[job.id])}))
+    obj.delete()
+    return HttpResponse(json.dumps({'success': True, 'permission': True}))
+
+
 @require_http_methods(["GET", "POST"])
 @login_required
 def delete_view(request, model_name, **kwargs):
 
     # deleting uses the cascading
-    objs_and_perm = get_objs_and_perm(request.user, **kwargs)
+    objs_and_perm = resolve_objs_and_perm(request, **kwargs)
     if request.method == 'GET':
         delete_form = DeleteForm()
         request_context = csrf(request)
@@ -359,8 +467,7 @@ def delete_view(request, model_name, **kwargs):
         if objs_and_perm['perm']:
             delete_form = DeleteForm(request.POST)
             if delete_form.is_valid():
-                objs_and_perm[model_name].delete()
-                return HttpResponse(json.dumps({'success': True, 'permission': True}))
+                return delete_record(request, model_name, objs_and_perm[model_name])
         else:
             return HttpResponse(json.dumps({'success': False, 'permission': False}))
 
@@ -370,8 +477,11 @@ def delete_view(request, model_name, **kwargs):
 def session_view(request, **kwargs):
     profile = get_user_profile(request.user)
     perm = profile.session_permission or request.user.is_superuser
-    query_set = Session.objects.all()
-    return render(request, "records_session.html", {'perm': perm, 'query_set': query_set})
+    listing = ListingPage('session', request.GET)
+    # the page is read lazily so a cached table doesn't read it
+    context = {'perm': perm, 'query_set': SimpleLazyObject(lambda: listing.items), 'listing': listing,
+               'fragment_key': get_fragment_key('session', perm, params=listing.params)}
+    return render(request, "records_session.html", context)
 
 
 @require_http_methods(["GET"])
@@ -379,8 +489,11 @@ def session_view(request, **kwargs):
 def student_view(request, **kwargs):
     profile = get_user_profile(request.user)
     perm = profile.student_permission or request.user.is_superuser
-    query_set = Student.objects.all()
-    return render(request, "records_student.html", {'perm': perm, 'query_set': query_set})
+    listing = ListingPage('student', request.GET)
+    # the page is read lazily so a cached table doesn't read it
+    context = {'perm': perm, 'query_set': SimpleLazyObject(lambda: listing.items), 'listing': listing,
+               'fragment_key': get_fragment_key('student', perm, params=listing.params)}
+    return render(request, "records_student.html", context)
 
 
 @require_http_methods(["GET"])
@@ -388,8 +501,11 @@ def student_view(request, **kwargs):
 def school_view(request, **kwargs):
     profile = get_user_profile(request.user)
     perm = profile.school_permission or request.user.is_superuser
-    query_set = School.objects.all()
-    return render(request, "records_school.html", {'perm': perm, 'query_set': query_set})
+    listing = ListingPage('school', request.GET)
+    # the page is read lazily so a cached table doesn't read it
+    context = {'perm': perm, 'query_set': SimpleLazyObject(lambda: listing.items), 'listing': listing,
+               'fragment_key': get_fragment_key('school', perm, params=listing.params)}
+    return render(request, "records_school.html", context)
 
 
 @require_http_methods(["GET"])
@@ -397,8 +513,44 @@ def school_view(request, **kwargs):
 def partner_view(request, **kwargs):
     profile = get_user_profile(request.user)
     perm = profile.partner_permission or request.user.is_superuser
-    query_set = Partner.objects.all()
-    return render(request, "records_partner.html", {'perm': perm, 'query_set': query_set})
+    listing = ListingPage('partner', request.GET)
+    # the page is read lazily so a cached table doesn't read it
+    context = {'perm': perm, 'query_set': SimpleLazyObject(lambda: listing.items), 'listing': listing,
+               'fragment_key': get_fragment_key('partner', perm, params=listing.params)}
+    return render(request, "records_partner.html", context)
+
+
+@require_http_methods(["GET"])
+@login_required
+def listing_json_view(request, model_name):
+
+    # this view is for select2 to fetch a page of non-leveled records, the cursor of the
+    # next page is returned as next and is null on the last page
+
+    listing = ListingPage(model_name, request.GET)
+    results = [{'id': item.id, 'text': str(item)} for item in listing.items]
+    return HttpResponse(json.dumps({'results': results, 'next': listing.next_cursor}),
+                        content_type='application/json')
+
+
+@require_http_methods(["GET"])
+@login_required
+def student_search_view(request, model_name='student'):
+
+    # this view is for the student autocomplete of the enrollment form, a search is ranked by the
+    # full text index and paged by offset, without a search or an index it is a plain listing
+
+    q = request.GET.get('q', '').strip()
+    if not q or not search_available():
+        return listing_json_view(request, model_name)
+    try:
+        offset = max(int(request.GET.get('after') or 0), 0)
+    except ValueError:
+        offset = 0
+    students = search_students(q, offset=offset, limit=SEARCH_PAGE_SIZE + 1)
+    next_offset = str(offset + SEARCH_PAGE_SIZE) if len(students) > SEARCH_PAGE_SIZE else None
+    results = [{'id': student.id, 'text': str(student)} for student in students[:SEARCH_PAGE_SIZE]]
+    return HttpResponse(json.dumps({'results': results, 'next': next_offset}), content_type='application/json')
 
 
 @require_http_methods(["GET", "POST"])
@@ -414,9 +566,7 @@ def others_add_view(request, model_name):
                                      exclude=[],
                                      )
     if request.method == 'GET':
-        add_form = form_class()
-        request_context = csrf(request)
-        form_html = render_crispy_form(add_form, context=request_context)
+        form_html = render_add_form(request, model_name, form_class)
         return HttpResponse(json.dumps({'form_html': form_html}))
 
     if request.method == 'POST':
@@ -445,14 +595,14 @@ def others_edit_view(request, model_name, **kwargs):
                                      )
 
     if request.method == 'GET':
-        edit_form = form_class(instance=get_object_or_404(model_name_dict[model_name], id=kwargs['id']))
+        edit_form = form_class(instance=get_object_or_404(model_name_dict[model_name].objects, id=kwargs['id']))
         request_context = csrf(request)
         form_html = render_crispy_form(edit_form, context=request_context)
         return HttpResponse(json.dumps({'form_html': form_html}))
 
     if request.method == 'POST':
         if perm:
-            edit_form = form_class(request.POST, instance=get_object_or_404(model_name_dict[model_name],
+            edit_form = form_class(request.POST, instance=get_object_or_404(model_name_dict[model_name].objects,
                                                                             id=kwargs['id']))
             if edit_form.is_valid():
                 edit_form.save()
@@ -470,7 +620,7 @@ def others_edit_view(request, model_name, **kwargs):
 def others_delete_view(request, model_name, **kwargs):
 
     perm = getattr(get_user_profile(request.user), model_name + '_permission') or request.user.is_superuser
-    obj = get_object_or_404(model_name_dict[model_name], id=kwargs['id'])
+    obj = get_object_or_404(model_name_dict[model_name].objects, id=kwargs['id'])
     if request.method == 'GET':
         delete_form = DeleteForm()
         request_context = csrf(request)
@@ -481,7 +631,130 @@ def others_delete_view(request, model_name, **kwargs):
         if perm:
             delete_form = DeleteForm(request.POST)
             if delete_form.is_valid():
-                obj.delete()
-                return HttpResponse(json.dumps({'success': True, 'permission': True}))
+                return delete_record(request, model_name, obj)
         else:
             return HttpResponse(json.dumps({'success': False, 'permission': False}))
+
+
+@require_http_methods(["GET"])
+@login_required
+def export_view(request):
+
+    # this view streams the attendance for the data warehouse as csv or json lines, optionally
+    # gzipped, users other than superusers are only able to export the zones they can edit
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse("Export format is invalid")
+    try:
+        start_date = parse_date(request.GET.get('start_date', '')) if request.GET.get('start_date') else None
+        end_date = parse_date(request.GET.get('end_date', '')) if request.GET.get('end_date') else None
+    except ValueError:
+        start_date = end_date = None
+    if (request.GET.get('start_date') and start_date is None) or (request.GET.get('end_date') and end_date is None):
+        return HttpResponse("Selected date is invalid")
+    zones = request.GET.getlist('zone') or None
+    closure = get_permission_closure(request.user)
+    if not closure.is_superuser:
+        editable_zones = set(Zone.objects.filter(id__in=closure.editable['zone']).values_list('name', flat=True))
+        if zones is None:
+            zones = list(editable_zones)
+        if not zones or not editable_zones.issuperset(zones):
+            return HttpResponse("You don't have permission")
+    compress = request.GET.get('gzip') == '1'
+    response = StreamingHttpResponse(export_attendance(export_format, start_date, end_date, zones, compress))
+    filename = 'attendance.' + export_format
+    if compress:
+        filename += '.gz'
+        response['Content-Type'] = 'application/gzip'
+    else:
+        response['Content-Type'] = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    return response
+
+
+@require_http_methods(["GET"])
+@login_required
+def today_view(request):
+
+    # the landing page of teachers, it lists the schedules the user teaches that meet today
+    # with links to their attendance, a date parameter shows another day
+
+    date = None
+    if request.GET.get('date'):
+        try:
+            date = parse_date(request.GET['date'])
+        except ValueError:
+            pass
+        if date is None:
+            return HttpResponse("Selected date is invalid")
+    date = date or timezone.localtime(timezone.now()).date()
+    context = {'classes': get_todays_classes(request.user, date),
+               'date': date,
+               'is_today': date == timezone.localtime(timezone.now()).date()}
+    return render(request, "records_today.html", context)
+
+
+@require_http_methods(["POST"])
+@login_required
+def sync_view(request):
+
+    # offline devices sync with one request like {"cursor": "...", "schedules": [1, 2], "changes":
+    # [{"enrollment_id": 1, "date": "2015-09-02", "version": 3, "status": "P"}]}, the changes are
+    # applied, the stale ones sent back as conflicts, and the rows of the schedules changed since
+    # the cursor returned with the cursor of the next sync, see sync.py
+
+    try:
+        batch = json.loads(request.body.decode('utf-8'))
+    except ValueError:
+        batch = None
+    if not isinstance(batch, dict) or not isinstance(batch.get('changes', []), list) or \
+            not isinstance(batch.get('schedules', []), list) or \
+            not all(isinstance(schedule_id, int) for schedule_id in batch.get('schedules', [])):
+        return HttpResponse(json.dumps({'success': False, 'permission': True,
+                                        'errors': ['A sync needs a list of schedule ids and a list of changes']}),
+                            content_type='application/json', status=400)
+    changes = batch.get('changes', [])
+    schedule_ids = batch.get('schedules', [])
+    if len(changes) > MAX_SYNC_CHANGES or len(schedule_ids) > MAX_SYNC_SCHEDULES:
+        return HttpResponse(json.dumps({'success': False, 'permission': True,
+                                        'errors': ['A sync takes at most %d changes and %d schedules' % (
+                                            MAX_SYNC_CHANGES, MAX_SYNC_SCHEDULES)]}),
+                            content_type='application/json', status=400)
+    since = parse_sync_cursor(batch.get('cursor'))
+    # the next cursor is taken before anything is read so no write falls between two syncs
+    cursor = get_sync_cursor()
+    applied, conflicts, errors = apply_sync_changes(request.user, changes)
+    return HttpResponse(json.dumps({'success': not errors and not conflicts, 'permission': True,
+                                    'cursor': cursor, 'columns': SYNC_COLUMNS,
+                                    'rows': get_changed_rows(request.user, schedule_ids, since),
+                                    'applied': applied, 'conflicts': conflicts,
+                                    'errors': [{'index': index, 'message': message} for index, message in errors]}),
+                        content_type='application/json')
+
+
+@require_http_methods(["GET"])
+@login_required
+def deletion_job_view(request, job_id):
+
+    # the progress of a deletion job, for the user who started it
+
+    job = get_object_or_404(DeletionJob, id=job_id)
+    if not request.user.is_superuser and job.requested_by_id != request.user.id:
+        return HttpResponse(json.dumps({'success': False, 'permission': False}), content_type='application/json')
+    return HttpResponse(json.dumps({'success': True, 'permission': True, 'status': job.status,
+                                    'record': job.object_name, 'deleted': job.deleted, 'total': job.total,
+                                    'error': job.error}),
+                        content_type='application/json')
+
+
+@require_http_methods(["GET"])
+@login_required
+def hierarchy_json_view(request):
+
+    # the zones, programs and schedules the user is able to see as one nested payload, with the
+    # permission to edit and the enrollment count of every node, see hierarchy.py
+
+    return HttpResponse(json.dumps({'success': True, 'columns': HIERARCHY_COLUMNS,
+                                    'zones': get_hierarchy(request.user)}),
+                        content_type='application/json')